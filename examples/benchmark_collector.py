@@ -0,0 +1,47 @@
+"""Usage example: python3 benchmark_collector.py
+"""
+
+from upb.util.UPCollector import UPRolloutCollector
+import numpy as np
+import multiprocessing as mp
+import time
+
+# Benchmark parameters
+n_steps_per_worker = 2000
+episode_length = 500
+final_stage = 2
+
+class RandomAgent(object):
+    def act(self, stochastic, ob, ac_avail):
+        return np.random.choice(np.flatnonzero(ac_avail)), 0.0
+
+def agents_fn():
+    # One agent per stage, created separately in each worker
+    return [RandomAgent() for stage in range(final_stage+1)]
+
+def benchmark_collector(n_workers):
+    collector = UPRolloutCollector(n_workers, agents_fn,
+                                   episode_length=episode_length,
+                                   final_stage=final_stage)
+    collector.start()
+
+    # Exclude worker start up from the timing
+    collector.collect(1)
+
+    start_time = time.perf_counter()
+    collector.collect(n_steps_per_worker)
+    rate = n_workers*n_steps_per_worker/(time.perf_counter()-start_time)
+    collector.stop()
+    return rate
+
+def main():
+    n_cpus = mp.cpu_count()
+    single_rate = benchmark_collector(1)
+    print("Steps/s with 1 worker: {:1.4g}".format(single_rate))
+    if n_cpus > 1:
+        pool_rate = benchmark_collector(n_cpus)
+        print("Steps/s with {} workers: {:1.4g}".format(n_cpus, pool_rate))
+        print("Speedup: {:1.3g}x".format(pool_rate/single_rate))
+
+if __name__ == "__main__":
+    main()
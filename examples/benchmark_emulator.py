@@ -0,0 +1,93 @@
+"""Usage example: python3 benchmark_emulator.py
+
+Fused steps only save the calls into the JS context that a step used to
+make. The game advancing time costs the same either way, so the steps per
+second of advancing time alone, in a loop inside the JS context, are
+printed as a bound on what fusing can reach.
+"""
+
+from upb.emu.UPEmulator import UPEmulator
+from upb.envs.UPEnv import UPEnv
+import numpy as np
+import time
+
+# Benchmark parameters
+n_resets = 200
+n_steps = 500
+benchmark_stages = [0, 5]
+
+def benchmark_reset(fast_reset):
+    emulator = UPEmulator(fast_reset=fast_reset)
+
+    # The first reset always does the full source load
+    emulator.reset()
+
+    start_time = time.perf_counter()
+    for i in range(n_resets):
+        emulator.reset()
+    return (time.perf_counter()-start_time)/n_resets
+
+def step_unfused(emulator, action_name, dt_s, stage):
+    """The handler calls made by one emulator step before they were fused.
+    """
+    emulator.takeAction(action_name)
+    emulator.advanceTime(dt_s)
+    emulator.makeObservation(['Paperclips'])
+    emulator.makeObservation(UPEnv._observation_names_stages[stage])
+    acs_avail = emulator.getAvailableActions(UPEnv._action_names_stages[stage])
+    emulator.makeObservation(UPEnv._observation_names_stages[stage])
+    emulator.makeObservation([proj+" Activated" for proj, wire in UPEnv._wire_per_spool_projects])
+    emulator.advanceTime(dt_s)
+    return acs_avail
+
+def step_fused(emulator, action_name, dt_s, stage):
+    observation, acs_avail = emulator.stepFused(action_name, dt_s, 
+                                                UPEnv._step_observation_names, 
+                                                UPEnv._action_names_stages[stage])
+    return acs_avail
+
+def benchmark_advance(stage):
+    """Steps per second of only advancing time by the action interval of the
+    given stage, in a loop inside the JS context.
+    """
+    emulator = UPEmulator()
+    emulator.reset()
+    dt_cs = max(int(100.0*UPEnv._action_intervals_stages[stage]/2.0),1)
+    loop_js = "(function(){{var t = Date.now(); for (var i = 0; i < {}; i++) {{emuAdvanceTime({}); emuAdvanceTime({});}} return Date.now()-t;}})()"
+    elapsed_ms = emulator._intp.eval(loop_js.format(n_steps, dt_cs, dt_cs))
+    return n_steps/(1e-3*max(elapsed_ms,1))
+
+def benchmark_steps(step_fn, stage):
+    """Steps per second taking random available actions with the 
+    observations, actions and action interval of the given stage.
+    """
+    emulator = UPEmulator()
+    emulator.reset()
+    action_names = UPEnv._action_names_stages[stage]
+    dt_s = UPEnv._action_intervals_stages[stage]/2.0
+    acs_avail = emulator.getAvailableActions(action_names)
+    
+    rng = np.random.RandomState(0)
+    start_time = time.perf_counter()
+    for i in range(n_steps):
+        action = rng.choice(np.flatnonzero(acs_avail))
+        acs_avail = step_fn(emulator, action_names[action], dt_s, stage)
+    return n_steps/(time.perf_counter()-start_time)
+
+def main():
+    slow_reset_time = benchmark_reset(fast_reset=False)
+    fast_reset_time = benchmark_reset(fast_reset=True)
+    print("Reset latency with full source reload: {:1.3g} ms".format(1e3*slow_reset_time))
+    print("Reset latency with snapshot restore: {:1.3g} ms".format(1e3*fast_reset_time))
+    print("Speedup: {:1.3g}x".format(slow_reset_time/fast_reset_time))
+    
+    for stage in benchmark_stages:
+        unfused_rate = benchmark_steps(step_unfused, stage)
+        fused_rate = benchmark_steps(step_fused, stage)
+        advance_rate = benchmark_advance(stage)
+        print("Stage {} steps/s with separate handler calls: {:1.4g}".format(stage, unfused_rate))
+        print("Stage {} steps/s with fused steps: {:1.4g} ({:1.3g}x)".format(stage, fused_rate, fused_rate/unfused_rate))
+        print("Stage {} steps/s advancing time alone: {:1.4g}".format(stage, advance_rate))
+
+if __name__ == "__main__":
+    main()
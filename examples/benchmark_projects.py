@@ -0,0 +1,93 @@
+"""Usage example: python3 benchmark_projects.py
+
+Checks that the emulator's project scheduler activates exactly the same
+projects as the full scan of manageProjects over fixed-seed trajectories,
+and times manageProjects with each in an early and a late game.
+"""
+
+from upb.emu.UPEmulator import UPEmulator
+from upb.envs.UPEnv import UPEnv
+from upb.game.UPGameHandler import UP_PROJECT_IDS
+import numpy as np
+
+# Validation parameters
+n_steps = 300
+seeds = [0, 1, 2]
+
+# Benchmark parameters, with the best of n_repeats timings kept
+n_calls = 100000
+n_repeats = 5
+
+# Late game economy reached without playing through the early stages, with
+# the projects of stages 1-6 done
+late_game_projects = []
+for names in UPEnv._action_names_stages[1:]:
+    late_game_projects += [name[len("Activate "):] for name in names if name.startswith("Activate ")]
+late_game_js = """
+funds = 1e7; wire = 1e7; clipmakerLevel = 150;
+megaClipperFlag = 1; megaClipperLevel = 40; megaClipperBoost = 5;
+compFlag = 1; projectsFlag = 1; processors = 30; memory = 60;
+creativityOn = 1; creativitySpeed = Math.log10(processors)*Math.pow(processors,1.1)+processors-1;
+qFlag = 1; qChips[0].active = 1; qChips[1].active = 1;
+"""
+for name in sorted(set(late_game_projects)):
+    late_game_js += "project{0}.uses = 0; project{0}.flag = 1;\n".format(UP_PROJECT_IDS[name])
+
+def run_trajectory(emulator, seed, stage, late_game):
+    """The save after each step of a trajectory of random available
+    actions.
+    """
+    emulator.reset()
+    emulator.seed(seed)
+    if late_game:
+        emulator._intp.eval(late_game_js)
+
+    action_names = UPEnv._action_names_stages[stage]
+    dt_s = UPEnv._action_intervals_stages[stage]/2.0
+    acs_avail = emulator.getAvailableActions(action_names)
+
+    rng = np.random.RandomState(seed)
+    saves = []
+    for i in range(n_steps):
+        action = rng.choice(np.flatnonzero(acs_avail))
+        observation, acs_avail = emulator.stepFused(action_names[action], dt_s, [], action_names)
+        saves.append(emulator.getStateAsString())
+    return saves
+
+def manage_projects_time(emulator, late_game):
+    """Mean time of a call to manageProjects, once the JIT has warmed up."""
+    emulator.reset()
+    if late_game:
+        emulator._intp.eval(late_game_js)
+    emulator.advanceTime(10.0)
+    bench_js = "(function(){{var t = Date.now(); for (var k = 0; k < {}; k++) {{manageProjects();}} return Date.now()-t;}})()"
+    emulator._intp.eval(bench_js.format(n_calls))
+    return min(1e-3*emulator._intp.eval(bench_js.format(n_calls))/n_calls for i in range(n_repeats))
+
+def main():
+    # Seeded before their first resets, so that both keep the same reset 
+    # snapshot
+    scan_emulator = UPEmulator(project_scheduler=False)
+    scheduled_emulator = UPEmulator(project_scheduler=True)
+    scan_emulator.seed(0)
+    scheduled_emulator.seed(0)
+    passed = True
+    for stage, late_game in [(0, False), (1, False), (5, True)]:
+        for seed in seeds:
+            scan_saves = run_trajectory(scan_emulator, seed, stage, late_game)
+            scheduled_saves = run_trajectory(scheduled_emulator, seed, stage, late_game)
+            n_differing = sum(scan != scheduled for scan, scheduled in zip(scan_saves, scheduled_saves))
+            print("Stage {} seed {}: {} of {} saves differ.".format(stage, seed, n_differing, n_steps))
+            if n_differing > 0:
+                passed = False
+
+    for late_game in [False, True]:
+        scan_time = manage_projects_time(scan_emulator, late_game)
+        scheduled_time = manage_projects_time(scheduled_emulator, late_game)
+        print("{} game manageProjects time, full scan: {:1.3g} us, scheduler: {:1.3g} us, speedup: {:1.3g}x".format(
+            "Late" if late_game else "Early", 1e6*scan_time, 1e6*scheduled_time, scan_time/scheduled_time))
+
+    print("PASSED" if passed else "FAILED")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Usage example: python3 benchmark_state.py
+
+Checks that the emulator's state stack restores games exactly, and that
+clones play on as the game they were made from, over fixed-seed
+trajectories. Times pushing, restoring and popping states against
+snapshots, and cloning against making a new emulator, in an early game and
+in a late game reached by play.
+
+Pushes and pops are timed from Python between steps, as a search would use
+them, and in a tight loop in the JS context. V8 only optimizes the compiled
+state plan after some thousands of pushes, so the loop is timed both over
+the first n_cold_calls of a new plan and at its best once warmed up.
+Clones are timed with their JS context already built in the background.
+"""
+
+from upb.emu.UPEmulator import UPEmulator
+from upb.envs.UPEnv import UPEnv
+import numpy as np
+import time
+
+# Validation parameters
+n_warmup_steps = 300
+n_branches = 20
+n_branch_steps = 50
+seeds = [0, 1, 2]
+
+# Benchmark parameters, with the best of n_repeats timings kept
+n_calls = 10000
+n_cold_calls = 200
+n_snapshots = 10
+n_clones = 10
+n_repeats = 3
+
+# Search-like use, with n_search_steps between each push and pop
+n_search_nodes = 1000
+n_search_steps = 5
+
+# The late game is played into by a scripted player, and played on in its
+# stage for n_late_steps
+late_game_stage = 6
+max_play_steps = 20000
+n_late_steps = 1000
+
+# Conditions for advancing from each stage, as applied by UPEnv
+required_projects_stages = [UPEnv._stage_2_required_projects, UPEnv._stage_3_required_projects,
+                            UPEnv._stage_4_required_projects, UPEnv._stage_5_required_projects,
+                            UPEnv._stage_6_required_projects]
+
+# Observations the scripted player acts on
+player_fields = ['Wire Inches', 'Available Funds', 'Unsold Inventory', 'Wire Cost',
+                 'Autoclipper Cost', 'MegaClipper Cost', 'Marketing Cost',
+                 'Manufacturing Clips per Second', 'Processors', 'Memory', 'Investment Bankroll']
+
+def stage_complete(emulator, stage):
+    """Whether the conditions for advancing from stage are met."""
+    if stage == 0:
+        return emulator.makeObservation(['Paperclips'])['Paperclips'] >= 2000
+    fields = [name+" Activated" for name in required_projects_stages[stage-1]]
+    return all(value == 1 for value in emulator.makeObservation(fields).values())
+
+def scripted_action(observation, available, rng):
+    """An action of a simple player that activates projects as soon as it
+    can, spends trust on memory and processors, keeps wire in stock and
+    unsold inventory low, invests funds it doesn't need for wire, and
+    otherwise buys clippers and marketing with them.
+    """
+    projects = [name for name in available if name.startswith("Activate ")]
+    if len(projects) > 0:
+        return projects[rng.randint(len(projects))]
+    if 'Add Memory' in available and observation['Memory'] < 2*observation['Processors']+2:
+        return 'Add Memory'
+    if 'Add Processor' in available:
+        return 'Add Processor'
+    if 'Buy Wire' in available and observation['Wire Inches'] < 1500:
+        return 'Buy Wire'
+    clip_rate = max(observation['Manufacturing Clips per Second'], 1)
+    if 'Lower Price' in available and observation['Unsold Inventory'] > 10*clip_rate+50 and rng.rand() < 0.5:
+        return 'Lower Price'
+    if ('Raise Price' in available and observation['Unsold Inventory'] < 2*clip_rate
+            and observation['Wire Inches'] >= 1 and rng.rand() < 0.2):
+        return 'Raise Price'
+    if 'Quantum Compute' in available and rng.rand() < 0.3:
+        return 'Quantum Compute'
+    if 'Run New Tournament' in available and rng.rand() < 0.2:
+        return 'Run New Tournament'
+    spare_funds = observation['Available Funds'] - 2*observation['Wire Cost']
+    if 'Withdraw' in available and spare_funds < 0 and observation['Investment Bankroll'] > 0:
+        return 'Withdraw'
+    if 'Deposit' in available and spare_funds > 10*observation['Wire Cost'] and rng.rand() < 0.05:
+        return 'Deposit'
+    for name in ['Set Investment Medium', 'Upgrade Investment Engine']:
+        if name in available and rng.rand() < 0.05:
+            return name
+    for name, cost, p in [('Buy MegaClipper', 'MegaClipper Cost', 0.5), ('Buy Autoclipper', 'Autoclipper Cost', 0.5),
+                          ('Expand Marketing', 'Marketing Cost', 0.3)]:
+        if name in available and spare_funds > observation[cost] and rng.rand() < p:
+            return name
+    if 'Make Paperclip' in available and observation['Wire Inches'] >= 1:
+        return 'Make Paperclip'
+    return 'Do Nothing'
+
+def play_scripted(emulator, rng, stage, n_steps):
+    """Play n_steps as the scripted player from stage, advancing through
+    the stages as their conditions are met.
+
+    :returns: stage -- The stage reached.
+    """
+    for i in range(n_steps):
+        action_names = UPEnv._action_names_stages[stage]
+        acs_avail = emulator.getAvailableActions(action_names)
+        available = [name for name, avail in zip(action_names, acs_avail) if avail]
+        action = scripted_action(emulator.makeObservation(player_fields), available, rng)
+        emulator.stepFused(action, UPEnv._action_intervals_stages[stage]/2.0, [], action_names)
+        if stage <= len(required_projects_stages) and stage_complete(emulator, stage):
+            stage += 1
+    return stage
+
+def start_game(emulator, seed, late_game):
+    emulator.seed(seed)
+    emulator.reset()
+    rng = np.random.RandomState(seed)
+    if late_game:
+        stage = 0
+        n_steps = 0
+        while stage < late_game_stage:
+            if n_steps >= max_play_steps:
+                raise Exception("Scripted player didn't reach stage {} in {} steps.".format(late_game_stage, max_play_steps))
+            stage = play_scripted(emulator, rng, stage, 1)
+            n_steps += 1
+        play_scripted(emulator, rng, late_game_stage, n_late_steps)
+    play(emulator, rng, late_game_stage if late_game else 0, n_warmup_steps)
+
+def play(emulator, rng, stage, n_steps):
+    """The save after each step of a trajectory of random available
+    actions.
+    """
+    action_names = UPEnv._action_names_stages[stage]
+    dt_s = UPEnv._action_intervals_stages[stage]/2.0
+    acs_avail = emulator.getAvailableActions(action_names)
+    saves = []
+    for i in range(n_steps):
+        action = rng.choice(np.flatnonzero(acs_avail))
+        observation, acs_avail = emulator.stepFused(action_names[action], dt_s, [], action_names)
+        saves.append(emulator.getStateAsString())
+    return saves
+
+def check_branches(emulator, stage):
+    """Number of branches that don't replay the same after restoring."""
+    n_differing = 0
+    for branch in range(n_branches):
+        emulator.pushState()
+        saves = play(emulator, np.random.RandomState(branch), stage, n_branch_steps)
+        emulator.restoreState()
+        if play(emulator, np.random.RandomState(branch), stage, n_branch_steps) != saves:
+            n_differing += 1
+        emulator.popState()
+        play(emulator, np.random.RandomState(n_branches+branch), stage, n_branch_steps)
+    return n_differing
+
+def check_clone(emulator, stage, seed):
+    """Whether a clone plays on as the emulator it was made from."""
+    clone = emulator.clone()
+    if clone.getStateAsString() != emulator.getStateAsString():
+        return False
+    saves = play(emulator, np.random.RandomState(seed), stage, n_branch_steps)
+    return play(clone, np.random.RandomState(seed), stage, n_branch_steps) == saves
+
+def best_time(fn, n):
+    """Best mean time of n calls of fn."""
+    times = []
+    for r in range(n_repeats):
+        start_time = time.perf_counter()
+        for i in range(n):
+            fn()
+        times.append((time.perf_counter()-start_time)/n)
+    return min(times)
+
+def search_times(emulator, stage):
+    """Median times of pushing and popping a state from Python, with
+    random steps between, from a state plan made afresh.
+    """
+    emulator._intp.eval("emuStatePlan = null;")
+    rng = np.random.RandomState(0)
+    push_times = []
+    pop_times = []
+    for node in range(n_search_nodes):
+        start_time = time.perf_counter()
+        emulator.pushState()
+        push_times.append(time.perf_counter()-start_time)
+        play(emulator, rng, stage, n_search_steps)
+        start_time = time.perf_counter()
+        emulator.popState()
+        pop_times.append(time.perf_counter()-start_time)
+    return np.median(push_times), np.median(pop_times)
+
+def state_times(emulator):
+    """Mean times of pushing and popping a state in the JS context, over
+    the first n_cold_calls from a state plan made afresh and at best once
+    the JIT has warmed up, of restoring one, and of saving and loading a
+    snapshot.
+    """
+    bench_js = "(function(){{var t = Date.now(); for (var k = 0; k < {}; k++) {{{}}} return Date.now()-t;}})()"
+    push_pop_js = "emuPushState(); emuPopState(true);"
+    emulator._intp.eval("emuStatePlan = null; emuPushState(); emuPopState(true);")
+    js_cold_push_pop = 1e-3*emulator._intp.eval(bench_js.format(n_cold_calls, push_pop_js))/n_cold_calls
+    js_push_pop = min(1e-3*emulator._intp.eval(bench_js.format(n_calls, push_pop_js))/n_calls for i in range(n_repeats))
+    restore_js = bench_js.format(n_calls, "emuRestoreState();")
+    emulator.pushState()
+    js_restore = min(1e-3*emulator._intp.eval(restore_js)/n_calls for i in range(n_repeats))
+    emulator.popState()
+
+    def snapshot():
+        emulator._loadSnapshot(emulator._saveSnapshot())
+    snapshot_time = best_time(snapshot, n_snapshots)
+    return js_cold_push_pop, js_push_pop, js_restore, snapshot_time
+
+def clone_times(emulator):
+    """Median times of cloning, with each clone's context built ahead, and
+    of making a new emulator.
+    """
+    times = []
+    emulator.clone()
+    for i in range(n_clones):
+        emulator._spare_thread.join()
+        start_time = time.perf_counter()
+        emulator.clone()
+        times.append(time.perf_counter()-start_time)
+    new_times = []
+    for i in range(n_clones):
+        start_time = time.perf_counter()
+        UPEmulator()
+        new_times.append(time.perf_counter()-start_time)
+    return np.median(times), np.median(new_times)
+
+def main():
+    emulator = UPEmulator()
+    passed = True
+    for late_game in [False, True]:
+        stage = late_game_stage if late_game else 0
+        for seed in seeds:
+            start_game(emulator, seed, late_game)
+            n_differing = check_branches(emulator, stage)
+            clone_matches = check_clone(emulator, stage, seed)
+            print("Stage {} seed {}: {} of {} branches differ, clone {}.".format(
+                stage, seed, n_differing, n_branches, "matches" if clone_matches else "differs"))
+            if n_differing > 0 or not clone_matches:
+                passed = False
+
+    for late_game in [False, True]:
+        stage = late_game_stage if late_game else 0
+        start_game(emulator, 0, late_game)
+        push_time, pop_time = search_times(emulator, stage)
+        n_slots = emulator._intp.eval("emuStatePlan.nSlots")
+        cold_push_pop, best_push_pop, js_restore, snapshot_time = state_times(emulator)
+        print("{} game, {} slots: push {:1.3g} us and pop {:1.3g} us from Python between steps".format(
+            "Late" if late_game else "Early", n_slots, 1e6*push_time, 1e6*pop_time))
+        print("    Push and pop in JS: {:1.3g} us at first, {:1.3g} us at best, restore: {:1.3g} us".format(
+            1e6*cold_push_pop, 1e6*best_push_pop, 1e6*js_restore))
+        print("    Snapshot save and load: {:1.3g} ms".format(1e3*snapshot_time))
+        clone_time, new_time = clone_times(emulator)
+        print("    Clone: {:1.3g} ms, new emulator: {:1.3g} ms".format(1e3*clone_time, 1e3*new_time))
+
+    print("PASSED" if passed else "FAILED")
+
+if __name__ == "__main__":
+    main()
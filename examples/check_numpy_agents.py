@@ -0,0 +1,77 @@
+"""Usage example: python3 check_numpy_agents.py
+
+Checks that the NumPy agents give the same action probabilities, greedy
+actions and value predictions as the TensorFlow agents they're loaded from,
+and compares the time each takes to act.
+"""
+
+from upb.envs.UPEnv import UPEnv
+from upb.util.UPUtil import load_agents
+from baselines.common import tf_util
+import numpy as np
+import os
+import time
+
+# Files
+agents_dir = "agents"
+final_stage = 6
+agent_filenames = [os.path.join(agents_dir,"stage{}.pickle".format(i)) for i in range(final_stage+1)]
+
+# Observations to check on, drawn from around each agent's observation means
+n_obs = 1024
+batch_size = 64
+seed = 0
+
+# Largest differences allowed
+prob_tol = 1e-5
+vpred_tol = 1e-4
+
+def main():
+    sess = tf_util.single_threaded_session()
+    sess.__enter__()
+    tf_agents = load_agents(final_stage+1, agent_filenames, base_name="tf_agent")
+    np_agents = load_agents(final_stage+1, agent_filenames, base_name="np_agent", engine='numpy')
+    rng = np.random.RandomState(seed)
+
+    for stage, (tf_agent, np_agent) in enumerate(zip(tf_agents, np_agents)):
+        means = np_agent.getObservationMeans()
+        n_actions = UPEnv._action_spaces_stages[stage].n
+        obs = (means*(1.0+rng.normal(size=(n_obs, len(means))))).astype(np.float32)
+        acs_avail = (rng.rand(n_obs, n_actions) < 0.7).astype(np.float32)
+        acs_avail[:,0] = 1.0
+
+        # Agreement
+        max_prob_diff = 0.0
+        max_vpred_diff = 0.0
+        n_ac_diff = 0
+        tf_time = 0.0
+        for i in range(n_obs):
+            tf_probs = tf_agent.getActionProbabilities(obs[i], acs_avail[i])
+            np_probs = np_agent.getActionProbabilities(obs[i], acs_avail[i])
+            max_prob_diff = max(max_prob_diff, np.max(np.abs(tf_probs-np_probs)))
+            start_time = time.perf_counter()
+            tf_ac, tf_vpred = tf_agent.act(False, obs[i], acs_avail[i])
+            tf_time += time.perf_counter()-start_time
+            np_ac, np_vpred = np_agent.act(False, obs[i], acs_avail[i])
+            max_vpred_diff = max(max_vpred_diff, abs(tf_vpred-np_vpred))
+            if tf_ac != np_ac:
+                n_ac_diff += 1
+
+        # Timing, one at a time and in batches
+        start_time = time.perf_counter()
+        for i in range(n_obs):
+            np_agent.act(True, obs[i], acs_avail[i])
+        np_time = time.perf_counter()-start_time
+        start_time = time.perf_counter()
+        for i in range(0, n_obs, batch_size):
+            np_agent.act(True, obs[i:i+batch_size], acs_avail[i:i+batch_size])
+        np_batch_time = time.perf_counter()-start_time
+
+        ok = max_prob_diff < prob_tol and max_vpred_diff < vpred_tol
+        print("Stage {}: {}, max probability difference {:1.3g}, max value difference {:1.3g}, {} greedy actions differ.".format(
+              stage, "OK" if ok else "MISMATCH", max_prob_diff, max_vpred_diff, n_ac_diff))
+        print("    Per observation: TF {:1.3g}us, NumPy {:1.3g}us, NumPy batched {:1.3g}us.".format(
+              1e6*tf_time/n_obs, 1e6*np_time/n_obs, 1e6*np_batch_time/n_obs))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Usage example: python3 create_init_states.py
+
+Creates initial states for each stage in parallel with the emulator. Can be
+interrupted and run again to carry on where it left off.
+"""
+
+from upb.util.UPUtil import load_agents, create_states_parallel
+from baselines.common import tf_util
+import multiprocessing as mp
+import os
+
+# Files
+agents_dir = "agents"
+inits_dir = "inits"
+
+# Stages to create initial states for, and how many of each
+stages = [1, 2, 3, 4, 5, 6]
+n_init_states = 128
+
+# Parallelism
+n_workers = mp.cpu_count()
+
+# Agents, including that of the final stage for the single step each
+# rollout takes after reaching its stage
+agent_filenames = [os.path.join(agents_dir,"stage{}.pickle".format(i)) for i in range(max(stages)+1)]
+
+def agents_fn():
+    sess = tf_util.single_threaded_session()
+    sess.__enter__()
+    return load_agents(len(agent_filenames), agent_filenames, base_name="agent")
+
+def main():
+    if not os.path.exists(inits_dir):
+        os.makedirs(inits_dir)
+    create_states_parallel(n_workers, agents_fn, n_init_states,
+                           os.path.join(inits_dir,"stage{}.states"), stages)
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@
 
 from upb.envs.UPEnv import *
 from upb.util.UPUtil import *
+from upb.util.UPStateStore import UPStateStore
 from upb.agents.mlp import MLPAgent, load_mlp_agent
 from baselines.common import tf_util
 from mpi4py import MPI
@@ -17,6 +18,9 @@ webdriver_path = None
 url = LOCAL_GAME_URL_STANDARD
 action_rate_speedup = 1.0
 
+# With the emulator, whether resetter agents play inside it
+native_resetters = False
+
 # Files
 agents_dir = "agents"
 inits_dir = "inits"
@@ -33,14 +37,18 @@ agent_filenames = [os.path.join(agents_dir,"stage{}.pickle".format(i)) for i in
 # Loading initial states
 do_load_init_states = False
 if do_load_init_states:
-    init_states_loading_filename = os.path.join(inits_dir,"stage{}.pickle".format(initial_stage))
+    init_states_loading_filename = os.path.join(inits_dir,"stage{}.states".format(initial_stage))
+    init_states_loading_filename_old = os.path.join(inits_dir,"stage{}.pickle".format(initial_stage))
+    if not UPStateStore.isStore(init_states_loading_filename) and os.path.exists(init_states_loading_filename_old):
+        # A pickled list, as saved before state stores
+        init_states_loading_filename = init_states_loading_filename_old
 else:
     init_states_loading_filename = None
 
 # Creating initial states
 do_create_init_states = False
 n_init_states = 128
-init_states_creation_filename = os.path.join(inits_dir,"stage{}.pickle".format(initial_stage))
+init_states_creation_filename = os.path.join(inits_dir,"stage{}.states".format(initial_stage))
 if do_create_init_states:
     assert episode_length == 0
     
@@ -73,6 +81,7 @@ def main():
                 final_stage=final_stage,
                 resetter_agents=resetter_agents,
                 use_emulator=use_emulator,
+                native_resetters=use_emulator and native_resetters,
                 episode_length=episode_length,
                 action_rate_speedup=action_rate_speedup,
                 webdriver_name=webdriver_name,
@@ -0,0 +1,57 @@
+"""Usage example: python3 rollout_async.py
+
+Plays several live games in the browser at once from a single process, and
+reports how well each kept to its action deadlines.
+"""
+
+from upb.envs.UPEnv import UPEnv
+from upb.util.UPUtil import load_agents, arollout
+from upb.game.UPGameHandler import LOCAL_GAME_URL_STANDARD
+from baselines.common import tf_util
+import asyncio
+import os
+
+# Game handler
+webdriver_name = 'Chrome'
+url = LOCAL_GAME_URL_STANDARD
+n_games = 4
+
+# Files
+agents_dir = "agents"
+
+# Environment parameters
+final_stage = 6
+episode_length = 5000
+
+# Agents
+agent_filenames = [os.path.join(agents_dir,"stage{}.pickle".format(i)) for i in range(final_stage+1)]
+
+async def run_games(envs, agents):
+    await asyncio.gather(*[arollout(env, agents) for env in envs])
+
+def main():
+    sess = tf_util.single_threaded_session()
+    sess.__enter__()
+    agents = load_agents(final_stage+1, agent_filenames, base_name="agent")
+    
+    # Scripted state extraction, availability and actions keep each step to 
+    # a single call to the browser
+    envs = [UPEnv(url,
+                  final_stage=final_stage,
+                  episode_length=episode_length,
+                  webdriver_name=webdriver_name,
+                  headless=True,
+                  state_extraction='js',
+                  availability='js',
+                  action_dispatch='js') for k in range(n_games)]
+    
+    asyncio.get_event_loop().run_until_complete(run_games(envs, agents))
+    
+    for k, env in enumerate(envs):
+        stats = env.deadlineStats()
+        print("Game {}: missed {} of {} deadlines, by {:1.3g} s on average and {:1.3g} s at most.".format(
+            k, stats['n_missed'], stats['n_deadlines'], stats['mean_lateness'], stats['max_lateness']))
+        env._close()
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,9 @@ from baselines.common import tf_util
 
 from upb.game.UPGameHandler import LOCAL_GAME_URL_TRAIN
 from upb.envs.UPEnv import *
+from upb.envs.UPVecEnv import UPVecEnv
+from upb.envs.UPStageCache import UPStageCache
+from upb.util.UPStateStore import UPStateStore
 from upb.util.UPUtil import *
 from upb.agents.mlp import MLPAgent, load_mlp_agent_topology
 import os
@@ -30,6 +33,7 @@ import numpy as np
 # Game emulator
 use_emulator = True
 action_rate_speedup = 1.0
+n_vec_envs = 1 # Emulated games stepped together in each process, e.g. 64, with timesteps_per_batch a multiple of n_vec_envs*episode_length
 
 # Game handler
 webdriver_name_training = 'PhantomJS'
@@ -41,6 +45,8 @@ url_training = LOCAL_GAME_URL_TRAIN
 initial_stage = 5
 final_stage = 5 # Stage past which not to actually advance
 resetter_agent_filenames = [os.path.join("agents","stage{}.pickle".format(i)) for i in range(initial_stage)]
+stage_cache_size = 0 # States kept per stage to start resets from with the emulator, e.g. 32, or 0 to always replay from the start
+stage_cache_refresh_prob = 0.1 # Probability of replaying a stage that has cached states, to refresh them
 
 # Training parameters
 do_load_latest_agent = True
@@ -68,7 +74,11 @@ data_dir = "data"
 init_states_dir = "inits"
 policy_filename_latest = os.path.join(data_dir,"policy_stage{}_latest.pickle".format(initial_stage))
 policy_filename_latest_old = os.path.join(data_dir,"policy_stage{}_latest_old.pickle".format(initial_stage))
-initial_states_filename = os.path.join(init_states_dir, "stage{}.pickle".format(initial_stage))
+initial_states_filename = os.path.join(init_states_dir, "stage{}.states".format(initial_stage))
+initial_states_filename_old = os.path.join(init_states_dir, "stage{}.pickle".format(initial_stage))
+if not UPStateStore.isStore(initial_states_filename) and os.path.exists(initial_states_filename_old):
+    # A pickled list, as saved before state stores, which UPStateStore.fromPickle converts
+    initial_states_filename = initial_states_filename_old
 #~ initial_states_filename = None
 rewards_history = []
 obs_means_history = []
@@ -92,19 +102,40 @@ def train():
     # For resetting to a fixed stage
     resetter_agents = load_resetter_agents(initial_stage, resetter_agent_filenames)
     
+    # Shared by all of this process's games
+    if use_emulator and stage_cache_size > 0:
+        stage_cache = UPStageCache(stage_cache_size, refresh_prob=stage_cache_refresh_prob)
+    else:
+        stage_cache = None
+    
     # The training environment
-    env = UPEnv(url_training,
-                initial_states_filename=initial_states_filename,
-                initial_stage=initial_stage,
-                final_stage=final_stage,
-                resetter_agents=resetter_agents,
-                episode_length=episode_length,
-                action_rate_speedup=action_rate_speedup,
-                use_emulator=use_emulator,
-                webdriver_name=webdriver_name_training,
-                webdriver_path=webdriver_path_training,
-                headless=True                    
-                )
+    if use_emulator and n_vec_envs > 1:
+        env = UPVecEnv(n_vec_envs,
+                       initial_states_filename=initial_states_filename,
+                       initial_stage=initial_stage,
+                       final_stage=final_stage,
+                       resetter_agents=resetter_agents,
+                       episode_length=episode_length,
+                       action_rate_speedup=action_rate_speedup,
+                       stage_cache=stage_cache
+                       )
+        
+        # Sample each batch from all games at once
+        pposgd_simple.traj_segment_generator = vec_traj_segment_generator
+    else:
+        env = UPEnv(url_training,
+                    initial_states_filename=initial_states_filename,
+                    initial_stage=initial_stage,
+                    final_stage=final_stage,
+                    resetter_agents=resetter_agents,
+                    episode_length=episode_length,
+                    action_rate_speedup=action_rate_speedup,
+                    use_emulator=use_emulator,
+                    webdriver_name=webdriver_name_training,
+                    webdriver_path=webdriver_path_training,
+                    headless=True,
+                    stage_cache=stage_cache
+                    )
     
     # Callbacks to execute inside the trainer
     def save_callback(loc, glob):
@@ -126,6 +157,8 @@ def train():
         if iters_so_far % iters_per_render == 0 and iters_so_far > 0:
             policy = loc['pi']
             env = loc['env']
+            if isinstance(env, UPVecEnv):
+                env = env.envs[0]
             rollout(env, policy)
             env.save_screenshot("data/iter_{:05d}.png".format(iters_so_far))
         
@@ -186,8 +219,8 @@ def train():
     
     # Policy generating function
     def policy_fn(name, ob_space, ac_space):
-        ob_space = UPObservationSpace(UPEnv._observation_names_stages[initial_stage])
-        ac_space = UPActionSpace(UPEnv._action_names_stages[initial_stage])
+        ob_space = UPEnv._observation_spaces_stages[initial_stage]
+        ac_space = UPEnv._action_spaces_stages[initial_stage]
         
         if do_load_latest_agent:
             hid_size, num_hid_layers = load_mlp_agent_topology(policy_filename_latest)
@@ -0,0 +1,104 @@
+"""Usage example: python3 validate_coarse_ticks.py
+
+Compares the coarse-tick mode of the emulator against the exact per-tick
+path over fixed-seed trajectories, and reports the speedup in simulated game
+seconds per wall second, both stepping and fast forwarding a late game.
+
+Fast forwarding a late game exceeds 10x, but stepping doesn't: each 2.5 s
+late stage step only has 250 ticks of intervalLoop3 to batch, and the rest
+of the step, the call into the JS context, the action, the other loops and
+the observation, costs the same in either mode, so stepping gets about 3-5x.
+"""
+
+from upb.emu.UPEmulator import UPEmulator
+from upb.envs.UPEnv import UPEnv
+import numpy as np
+import time
+
+# Validation parameters
+coarse_ticks = 100
+n_steps = 200
+seeds = [0, 1, 2]
+max_rel_divergence = 0.05
+fast_forward_s = 600.0
+
+# Late game economy reached without playing through the early stages
+late_game_js = """
+funds = 1e7; wire = 1e7; clipmakerLevel = 150;
+megaClipperFlag = 1; megaClipperLevel = 40; megaClipperBoost = 5;
+compFlag = 1; projectsFlag = 1; processors = 30; memory = 60;
+creativityOn = 1; creativitySpeed = Math.log10(processors)*Math.pow(processors,1.1)+processors-1;
+qFlag = 1; qChips[0].active = 1; qChips[1].active = 1;
+"""
+
+def run_trajectory(emulator, seed, stage, late_game):
+    emulator.seed(seed)
+    emulator.reset()
+    if late_game:
+        emulator._intp.eval(late_game_js)
+
+    fields = UPEnv._observation_names_stages[stage]
+    action_names = UPEnv._action_names_stages[stage]
+    dt_s = UPEnv._action_intervals_stages[stage]/2.0
+    acs_avail = emulator.getAvailableActions(action_names)
+
+    rng = np.random.RandomState(seed)
+    observations = []
+    start_time = time.perf_counter()
+    for i in range(n_steps):
+        action = rng.choice(np.flatnonzero(acs_avail))
+        observation, acs_avail = emulator.stepFused(action_names[action], dt_s, fields, action_names)
+        observations.append(list(observation.values()))
+    wall_time = time.perf_counter()-start_time
+    return np.array(observations), 2.0*dt_s*n_steps/wall_time
+
+def fast_forward_rate(emulator):
+    """Game seconds per wall second advancing a late game without acting.
+    """
+    emulator.reset()
+    emulator._intp.eval(late_game_js)
+    emulator.advanceTime(fast_forward_s)
+    emulator.reset()
+    emulator._intp.eval(late_game_js)
+    start_time = time.perf_counter()
+    emulator.advanceTime(fast_forward_s)
+    return fast_forward_s/(time.perf_counter()-start_time)
+
+def main():
+    exact_emulator = UPEmulator()
+    coarse_emulator = UPEmulator(coarse_ticks=coarse_ticks)
+    passed = True
+    for stage, late_game in [(0, False), (5, True)]:
+        # Warm up the JIT so that only steady state speed is compared
+        run_trajectory(exact_emulator, len(seeds), stage, late_game)
+        run_trajectory(coarse_emulator, len(seeds), stage, late_game)
+
+        exact_rates, coarse_rates = [], []
+        for seed in seeds:
+            exact_obs, exact_rate = run_trajectory(exact_emulator, seed, stage, late_game)
+            coarse_obs, coarse_rate = run_trajectory(coarse_emulator, seed, stage, late_game)
+            exact_rates.append(exact_rate)
+            coarse_rates.append(coarse_rate)
+
+            # Divergence of the final observations, relative to their scale
+            # over the trajectory
+            scale = np.maximum(np.abs(exact_obs).max(axis=0), 1.0)
+            divergence = np.abs(coarse_obs[-1]-exact_obs[-1])/scale
+            worst = np.argmax(divergence)
+            print("Stage {} seed {}: max relative divergence {:1.3g} ({})".format(
+                stage, seed, divergence[worst], UPEnv._observation_names_stages[stage][worst]))
+            if divergence[worst] > max_rel_divergence:
+                passed = False
+
+        print("Stage {} game s per wall s, exact: {:1.4g}, coarse: {:1.4g}, speedup: {:1.3g}x".format(
+            stage, np.mean(exact_rates), np.mean(coarse_rates), np.mean(coarse_rates)/np.mean(exact_rates)))
+
+    exact_rate = fast_forward_rate(exact_emulator)
+    coarse_rate = fast_forward_rate(coarse_emulator)
+    print("Fast forward game s per wall s, exact: {:1.4g}, coarse: {:1.4g}, speedup: {:1.3g}x".format(
+        exact_rate, coarse_rate, coarse_rate/exact_rate))
+
+    print("PASSED" if passed else "FAILED")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Usage example: python3 validate_fast_reset.py
+
+Compares the game in the browser after a fast reset, which loads the save
+captured after the page was first loaded, against the game after a reset
+that reloads the page with driver.get.
+
+Each game plays the same random available actions and is then reset, and
+the page's scalar globals and project flags are compared. Some globals are
+random on every load, so two reloads are compared with each other as well,
+and only the globals that differ after a fast reset but not between reloads
+are reported as not being reset.
+"""
+
+from upb.envs.UPEnv import UPEnv
+from upb.game.UPGameHandler import UPGameHandler, LOCAL_GAME_URL_STANDARD
+import numpy as np
+
+# Validation parameters
+stage = 0
+n_runs = 4
+n_steps = 200
+
+# Browser, for which Chrome is needed for the virtual clock, so that no
+# game time passes between the reset and reading the globals
+webdriver_name = 'Chrome'
+webdriver_path = None
+url = LOCAL_GAME_URL_STANDARD
+
+# The page's scalar globals and the flags of its projects
+page_state_js = """
+    var state = {};
+    Object.keys(window).forEach(function(name) {
+        var value = window[name];
+        if (typeof value == "number" || typeof value == "string" || typeof value == "boolean") {
+            state[name] = value;
+        }
+    });
+    state["project flags"] = projects.map(function(project) {return project.flag;}).join(",");
+    return state;
+"""
+
+def create_handler(fast_reset):
+    return UPGameHandler(url,
+                         webdriver_name=webdriver_name,
+                         webdriver_path=webdriver_path,
+                         headless=True,
+                         state_extraction='js',
+                         availability='js',
+                         action_dispatch='js',
+                         fast_reset=fast_reset,
+                         virtual_clock=True)
+
+def play_and_reset(handler, seed):
+    """The page state after a reset that follows a run of random available
+    actions.
+    """
+    action_names = UPEnv._action_names_stages[stage]
+    dt_s = UPEnv._action_intervals_stages[stage]/2.0
+    acs_avail = handler.getAvailableActions(action_names)
+    rng = np.random.RandomState(seed)
+    for i in range(n_steps):
+        action = rng.choice(np.flatnonzero(acs_avail))
+        observation, acs_avail = handler.stepFused(action_names[action], dt_s, [], action_names)
+    handler.reset()
+    return handler._driver.execute_script(page_state_js)
+
+def differing_names(state_a, state_b):
+    names = set(state_a.keys()) | set(state_b.keys())
+    return {name for name in names if state_a.get(name) != state_b.get(name)}
+
+def main():
+    fast_handler = create_handler(fast_reset=True)
+    reload_handler = create_handler(fast_reset=False)
+    other_reload_handler = create_handler(fast_reset=False)
+
+    not_reset = {}
+    random_on_load = set()
+    for run in range(n_runs):
+        fast_state = play_and_reset(fast_handler, run)
+        reload_state = play_and_reset(reload_handler, run)
+        other_reload_state = play_and_reset(other_reload_handler, run)
+        random_on_load |= differing_names(reload_state, other_reload_state)
+        for name in differing_names(fast_state, reload_state):
+            not_reset.setdefault(name, []).append((fast_state.get(name), reload_state.get(name)))
+
+    for handler in [fast_handler, reload_handler, other_reload_handler]:
+        handler.quit()
+
+    not_reset = {name: values for name, values in not_reset.items() if name not in random_on_load}
+    print("{} globals differ between reloads and were left out.".format(len(random_on_load)))
+    for name in sorted(not_reset.keys()):
+        fast_value, reload_value = not_reset[name][0]
+        print("{}: differs in {} of {} runs, e.g. {} after a fast reset against {} after a reload.".format(
+            name, len(not_reset[name]), n_runs, fast_value, reload_value))
+    print("PASSED" if len(not_reset) == 0 else "FAILED")
+
+if __name__ == "__main__":
+    main()
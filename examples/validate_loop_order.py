@@ -0,0 +1,110 @@
+"""Usage example: python3 validate_loop_order.py
+
+Compares the emulator's interval loops run in the order their ticks are due
+against running them one loop after another, and, if a browser is
+available, against the game itself in the browser with a virtual clock,
+which runs its intervals in the order they're due.
+
+Sales are random, so games are compared by the mean and spread of their
+observations over many fixed-seed runs of random available actions, and
+each emulator mode is scored by how far its means are from the browser's in
+units of the browser's standard error.
+"""
+
+from upb.emu.UPEmulator import UPEmulator
+from upb.envs.UPEnv import UPEnv
+from upb.game.UPGameHandler import UPGameHandler, LOCAL_GAME_URL_STANDARD
+import numpy as np
+import time
+
+# Validation parameters
+stage = 0
+n_runs = 32
+n_steps = 200
+fast_forward_s = 600.0
+
+# Browser, for which Chrome is needed for the virtual clock
+use_browser = True
+webdriver_name = 'Chrome'
+webdriver_path = None
+url = LOCAL_GAME_URL_STANDARD
+
+def run_trajectory(handler, seed):
+    """The final observation of a run of random available actions."""
+    fields = UPEnv._observation_names_stages[stage]
+    action_names = UPEnv._action_names_stages[stage]
+    dt_s = UPEnv._action_intervals_stages[stage]/2.0
+    acs_avail = handler.getAvailableActions(action_names)
+
+    rng = np.random.RandomState(seed)
+    for i in range(n_steps):
+        action = rng.choice(np.flatnonzero(acs_avail))
+        observation, acs_avail = handler.stepFused(action_names[action], dt_s, fields, action_names)
+    return np.array(list(observation.values()))
+
+def emulator_runs(loop_order):
+    emulator = UPEmulator(loop_order=loop_order)
+    finals = []
+    for run in range(n_runs):
+        emulator.seed(run)
+        emulator.reset()
+        emulator.seed(run)
+        finals.append(run_trajectory(emulator, run))
+    return np.array(finals)
+
+def browser_runs():
+    handler = UPGameHandler(url,
+                            webdriver_name=webdriver_name,
+                            webdriver_path=webdriver_path,
+                            headless=True,
+                            state_extraction='js',
+                            availability='js',
+                            action_dispatch='js',
+                            virtual_clock=True)
+    finals = []
+    for run in range(n_runs):
+        handler.reset()
+        finals.append(run_trajectory(handler, run))
+    handler.quit()
+    return np.array(finals)
+
+def fast_forward_rate(loop_order):
+    """Game seconds per wall second advancing without acting."""
+    emulator = UPEmulator(loop_order=loop_order)
+    emulator.reset()
+    emulator.advanceTime(fast_forward_s)
+    emulator.reset()
+    start_time = time.perf_counter()
+    emulator.advanceTime(fast_forward_s)
+    return fast_forward_s/(time.perf_counter()-start_time)
+
+def main():
+    fields = UPEnv._observation_names_stages[stage]
+    results = {order: emulator_runs(order) for order in UPEmulator._loop_orders}
+    reference = None
+    if use_browser:
+        try:
+            reference = browser_runs()
+        except Exception as e:
+            print("WARNING: No browser comparison ({}).".format(e))
+
+    for i, field in enumerate(fields):
+        line = "{}:".format(field)
+        for order in UPEmulator._loop_orders:
+            line += " {} {:1.4g} +/- {:1.3g},".format(order, results[order][:,i].mean(), results[order][:,i].std())
+        if reference is not None:
+            line += " browser {:1.4g} +/- {:1.3g}".format(reference[:,i].mean(), reference[:,i].std())
+        print(line)
+
+    if reference is not None:
+        std_err = np.maximum(reference.std(axis=0)/np.sqrt(n_runs), 1e-9)
+        for order in UPEmulator._loop_orders:
+            scores = np.abs(results[order].mean(axis=0)-reference.mean(axis=0))/std_err
+            print("Loop order {}: mean distance from browser {:1.3g} standard errors, worst {:1.3g} ({}).".format(
+                order, scores.mean(), scores.max(), fields[np.argmax(scores)]))
+
+    for order in UPEmulator._loop_orders:
+        print("Loop order {}: fast forward at {:1.4g} game s per wall s.".format(order, fast_forward_rate(order)))
+
+if __name__ == "__main__":
+    main()
@@ -129,6 +129,14 @@ class MLPAgent(MlpPolicy):
         counts = self.getVarNp("obfilter/count", dtype=tf.float64)
         means = sums/counts
         return means
+    
+    def getObservationStds(self):
+        sums = self.getVarNp("obfilter/runningsum", dtype=tf.float64)
+        sumsqs = self.getVarNp("obfilter/runningsumsq", dtype=tf.float64)
+        counts = self.getVarNp("obfilter/count", dtype=tf.float64)
+        means = sums/counts
+        stds = np.sqrt(np.maximum(sumsqs/counts - np.square(means), 1e-2))
+        return stds
         
     def getActionProbabilities(self, ob, ac_avail):
         with tf.variable_scope(self.scope):
@@ -139,6 +147,15 @@ class MLPAgent(MlpPolicy):
             logits = self.pd.logits.eval(feed_dict={ob_tfvar:ob[None], ac_avail_tfvar:ac_avail[None]})
             probs = np.exp(logits)/np.sum(np.exp(logits))
             return probs[0]
+    
+    def actBatch(self, stochastic, obs, acs_avail):
+        """As act, for a (B, obs_dim) batch of observations and their 
+        (B, n_actions) availabilities, in a single session run.
+        
+        :returns: (acs, vpreds) -- The (B,) actions and value predictions.
+        """
+        acs, vpreds = self._act(stochastic, obs, acs_avail)
+        return acs, vpreds
             
     @property
     def name(self):
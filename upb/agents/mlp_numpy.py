@@ -0,0 +1,142 @@
+import pickle
+import numpy as np
+
+class MLPAgentNumpy(object):
+    """An MLPAgent evaluated with NumPy alone, loaded from a pickle written by
+    MLPAgent.save, so that acting needs neither TensorFlow nor a session.
+
+    The network is that of baselines.ppo1.mlp_policy.MlpPolicy: observations
+    are normalised by the running statistics of the obfilter and clipped to
+    [-5,5], then passed through num_hid_layers tanh layers for each of the
+    policy and value function. Unavailable actions are masked out of the
+    policy logits before sampling.
+
+    Observations may be a single observation or an (B, obs_dim) batch.
+    """
+    # Clip range and minimum variance of the observation normalisation
+    _ob_clip = 5.0
+    _ob_min_var = 1e-2
+
+    def __init__(self, py_vars, name, seed=None):
+        self._name = name
+        self._hid_size = py_vars['hid_size']
+        self._num_hid_layers = py_vars['num_hid_layers']
+        self._rng = np.random.RandomState(seed)
+
+        # Observation normalisation, in single precision like the graph
+        sums = self._getVar(py_vars, "obfilter/runningsum").astype(np.float64)
+        sumsqs = self._getVar(py_vars, "obfilter/runningsumsq").astype(np.float64)
+        count = self._getVar(py_vars, "obfilter/count").astype(np.float64)
+        mean = (sums/count).astype(np.float32)
+        var = (sumsqs/count).astype(np.float32) - np.square(mean)
+        self._ob_mean = mean
+        self._ob_std = np.sqrt(np.maximum(var, self._ob_min_var)).astype(np.float32)
+
+        # Policy and value function layers
+        self._pol_weights, self._pol_biases = self._getLayers(py_vars, "pol")
+        self._vf_weights, self._vf_biases = self._getLayers(py_vars, "vf")
+
+    @property
+    def name(self):
+        return self._name
+
+    def seed(self, seed=None):
+        self._rng = np.random.RandomState(seed)
+
+    def act(self, stochastic, ob, ac_avail):
+        """As with MlpPolicy.act.
+
+        :returns: (ac, vpred) -- The action and value prediction, or arrays
+            of them if ob is an (B, obs_dim) batch.
+        """
+        batched = np.ndim(ob) == 2
+        obs = np.atleast_2d(np.asarray(ob, dtype=np.float32))
+        acs_avail = np.atleast_2d(np.asarray(ac_avail, dtype=np.float32))
+        logits = self._maskedLogits(obs, acs_avail)
+        if stochastic:
+            # Gumbel-max sampling, as with CategoricalPd.sample
+            u = self._rng.uniform(size=logits.shape)
+            acs = np.argmax(logits - np.log(-np.log(u)), axis=-1)
+        else:
+            acs = np.argmax(logits, axis=-1)
+        vpreds = self._forward(self._normalise(obs), self._vf_weights, self._vf_biases)[:,0]
+        if batched:
+            return acs, vpreds
+        else:
+            return acs[0], vpreds[0]
+
+    def actBatch(self, stochastic, obs, acs_avail):
+        """As with MLPAgent.actBatch."""
+        return self.act(stochastic, np.atleast_2d(obs), np.atleast_2d(acs_avail))
+
+    def getActionProbabilities(self, ob, ac_avail):
+        """As with MLPAgent.getActionProbabilities, for a single observation
+        or an (B, obs_dim) batch.
+        """
+        batched = np.ndim(ob) == 2
+        obs = np.atleast_2d(np.asarray(ob, dtype=np.float32))
+        acs_avail = np.atleast_2d(np.asarray(ac_avail, dtype=np.float32))
+        logits = self._maskedLogits(obs, acs_avail)
+        exps = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
+        probs = exps/np.sum(exps, axis=-1, keepdims=True)
+        if batched:
+            return probs
+        else:
+            return probs[0]
+
+    def getPolicyNetwork(self):
+        """Return policy network as numpy arrays.
+        """
+        return {'weights': list(self._pol_weights), 'biases': list(self._pol_biases)}
+
+    def getObservationMeans(self):
+        return self._ob_mean
+
+    def getObservationStds(self):
+        return self._ob_std
+
+    def _getVar(self, py_vars, var_name):
+        # Variables are found ignoring the scope of the agent that saved them
+        for name in py_vars.keys():
+            if name.endswith("/"+var_name+":0"):
+                return np.asarray(py_vars[name])
+        raise Exception("Could not find {}.".format(var_name))
+
+    def _getLayers(self, py_vars, prefix):
+        weights = []
+        biases = []
+        for i in range(self._num_hid_layers+1):
+            if i == self._num_hid_layers:
+                layer_name = "{}final".format(prefix)
+            else:
+                layer_name = "{}fc{}".format(prefix, i+1)
+            weights.append(self._getVar(py_vars, layer_name+"/w").astype(np.float32))
+            biases.append(self._getVar(py_vars, layer_name+"/b").astype(np.float32).reshape(1,-1))
+        return weights, biases
+
+    def _normalise(self, obs):
+        return np.clip((obs-self._ob_mean)/self._ob_std, -self._ob_clip, self._ob_clip)
+
+    def _forward(self, x, weights, biases):
+        for i in range(len(weights)-1):
+            x = np.tanh(np.dot(x, weights[i]) + biases[i])
+        return np.dot(x, weights[-1]) + biases[-1]
+
+    def _maskedLogits(self, obs, acs_avail):
+        logits = self._forward(self._normalise(obs), self._pol_weights, self._pol_biases)
+
+        # A batch may hold the actions of several stages, so availabilities
+        # are padded to the full number of actions
+        n_actions = logits.shape[1]
+        if acs_avail.shape[1] < n_actions:
+            acs_avail = np.pad(acs_avail, ((0,0),(0,n_actions-acs_avail.shape[1])), 'constant')
+
+        # Unavailable actions can never be chosen, unless none are available
+        avail = acs_avail[:,:n_actions] > 0
+        none_avail = ~np.any(avail, axis=-1, keepdims=True)
+        return np.where(avail | none_avail, logits, -np.inf)
+
+def load_mlp_agent_numpy(filename, agent_name, seed=None):
+    with open(filename, 'rb') as f:
+        py_vars = pickle.load(f)
+    return MLPAgentNumpy(py_vars, agent_name, seed=seed)
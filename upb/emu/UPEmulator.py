@@ -1,224 +1,395 @@
 from py_mini_racer import py_mini_racer
 from os.path import abspath, dirname, join
 from collections import OrderedDict
-from upb.game.UPGameHandler import UP_PROJECT_IDS
+import threading
+import json
+import copy
+import numpy as np
+from upb.game.UPGameHandler import UP_OBS_TO_JS, UP_ACTION_TO_JS, UP_ACTION_AVAIL_TO_JS
 
 class UPEmulator(object):
-    # Names and centisecond intervals of interval loops that run over the full game
-    _interval_loops_cs = {
-        'intervalLoop1()': 100,
-        'intervalLoop2()': 250,
-        'intervalLoop3()': 1,
-        'intervalLoop4()': 10
-    }
+    # Interval loops that run over the full game are scheduled by the 
+    # emulator clock in main_pre_drones.js, either in the order their ticks
+    # are due, as in the browser, or caught up one loop after another. 
+    # Loops are caught up in turn by default, until the time order has been
+    # compared against the browser with examples/validate_loop_order.py.
+    _loop_orders = ['time', 'sequential']
+    
+    # The warmup after a reset is played under a fixed seed, so that the 
+    # reset state is the same whether or not the game is seeded first
+    _warmup_seed = 0
     
     # Observations
-    _obs_to_js = {
-        'Paperclips': 'clips',
-        'Available Funds': 'funds',
-        'Unsold Inventory': 'unsoldClips',
-        'Price per Clip': 'margin',
-        'Public Demand': 'demand',
-        'Marketing Level': 'marketingLvl',
-        'Marketing Cost': 'adCost',
-        'Manufacturing Clips per Second': 'clipRateTracker',
-        'Wire Inches': 'wire',
-        'Wire Cost': 'wireCost',
-        'Autoclipper Cost': 'clipperCost',
-        'Number of Autoclippers': 'clipmakerLevel',
-        'Trust': 'trust',
-        'Next Trust': 'nextTrust',
-        'Processors': 'processors',
-        'Memory': 'memory',
-        'Operations': 'operations',
-        'Creativity': 'creativity',
-        'Investment Bankroll': 'bankroll',
-        'Stocks': 'secTotal',
-        'Investment Engine Level': 'investLevel',
-        'Investment Engine Upgrade Cost': 'investUpgradeCost',
-        'Number of Photonic Chips': 'nextQchip',
-        'Latest QOps': 'latestQops',
-        'Photonic Chip 0 Level': 'qChips[0].value',
-        'Riskiness': 'riskiness',
-        'MegaClipper Cost': 'megaClipperCost',
-        'Number of MegaClippers': 'megaClipperLevel',
-        'Yomi': 'yomi',
-        'Tournament Cost': 'tourneyCost'
-    }
-    for pname, pid in UP_PROJECT_IDS.items():
-        _obs_to_js[pname+' Activated'] = 'project{}.flag'.format(pid)
+    _obs_to_js = UP_OBS_TO_JS
     
     # Actions and their availability
-    _action_to_js = {
-        'Do Nothing': '',
-        'Make Paperclip': 'if (wire>=1) {clipClick(1);}',
-        'Lower Price': 'if (margin>.01) {lowerPrice();}',
-        'Raise Price': 'raisePrice();',
-        'Expand Marketing': 'if (funds>=adCost) {buyAds();}',
-        'Buy Wire': 'if (funds>=wireCost) {buyWire();}',
-        'Buy Autoclipper': 'if (funds>=clipperCost) {makeClipper();}',
-        'Add Processor': 'if (trust>processors+memory || swarmGifts > 0) {addProc();}',
-        'Add Memory': 'if (trust>processors+memory || swarmGifts > 0) {addMem();}',
-        'Set Investment Low': 'if (investmentEngineFlag == 1) {riskiness = 7;}',
-        'Set Investment Medium': 'if (investmentEngineFlag == 1) {riskiness = 5;}',
-        'Set Investment High': 'if (investmentEngineFlag == 1) {riskiness = 1;}',
-        'Withdraw': 'if (investmentEngineFlag == 1) {investWithdraw();}',
-        'Deposit': 'if (investmentEngineFlag == 1) {investDeposit();}',
-        'Upgrade Investment Engine': 'if (investmentEngineFlag == 1 && yomi>=investUpgradeCost) {investUpgrade();}',
-        'Quantum Compute': 'if (qFlag == 1) {qComp();}',
-        'Buy MegaClipper': 'if (funds>=megaClipperCost && megaClipperFlag == 1) {makeMegaClipper();}'
-    }
-    _action_avail_to_js = {
-        'Do Nothing': 'true',
-        'Make Paperclip': 'wire>=1',
-        'Lower Price': 'margin>.01',
-        'Raise Price': 'true',
-        'Expand Marketing': 'funds>=adCost',
-        'Buy Wire': 'funds>=wireCost',
-        'Buy Autoclipper': 'funds>=clipperCost',
-        'Add Processor': 'trust>processors+memory || swarmGifts > 0',
-        'Add Memory': 'trust>processors+memory || swarmGifts > 0',
-        'Set Investment Low': 'investmentEngineFlag == 1 && riskiness != 7',
-        'Set Investment Medium': 'investmentEngineFlag == 1 && riskiness != 5',
-        'Set Investment High': 'investmentEngineFlag == 1 && riskiness != 1',
-        'Withdraw': 'investmentEngineFlag == 1',
-        'Deposit': 'investmentEngineFlag == 1',
-        'Upgrade Investment Engine': 'investmentEngineFlag == 1 && yomi>=investUpgradeCost',
-        'Quantum Compute': 'qFlag == 1 && qChips[0].active != 0',
-        'Buy MegaClipper': 'funds>=megaClipperCost && megaClipperFlag == 1',
-        'Run New Tournament': 'strategyEngineFlag == 1 && operations>=tourneyCost && tourneyInProg == 0'
-    }
-    
-    for pname, pid in UP_PROJECT_IDS.items():
-        _action_to_js['Activate '+pname] = 'if (activeProjects.indexOf(project{0}) >= 0 && project{0}.cost() && !project{0}.flag) {{project{0}.effect();}}'.format(pid)
-        _action_avail_to_js['Activate '+pname] = 'activeProjects.indexOf(project{0}) >= 0 && project{0}.cost() && !project{0}.flag'.format(pid)
+    _action_to_js = dict(UP_ACTION_TO_JS)
+    _action_to_js['Run New Tournament'] = 'emuRunNewTournament();'
+    _action_avail_to_js = UP_ACTION_AVAIL_TO_JS
+    
+    
+    # Indices of observations and actions in the JS-side registries
+    _obs_names = list(_obs_to_js.keys())
+    _obs_ids = {name: i for i, name in enumerate(_obs_names)}
+    _action_names = list(_action_avail_to_js.keys())
+    _action_ids = {name: i for i, name in enumerate(_action_names)}
 
     def __init__(self, 
                  combat_filename=join(dirname(abspath(__file__)),"combat.js"),
                  globals_filename=join(dirname(abspath(__file__)),"globals.js"),
                  projects_filename=join(dirname(abspath(__file__)),"projects.js"),
-                 main_filename=join(dirname(abspath(__file__)),"main_pre_drones.js")):
+                 main_filename=join(dirname(abspath(__file__)),"main_pre_drones.js"),
+                 rng_filename=join(dirname(abspath(__file__)),"rng.js"),
+                 fast_reset=True,
+                 coarse_ticks=1,
+                 project_scheduler=True,
+                 loop_order='sequential'):
 
-        # Source file list
-        self._js_filenames = [combat_filename, globals_filename, projects_filename, main_filename]
+        # Source file list, with the seedable generator loaded first so that
+        # the game sources only ever draw from it
+        self._js_filenames = [rng_filename, combat_filename, globals_filename, projects_filename, main_filename]
+        
+        # Number of 10 ms ticks of the fast main loop to run at once. Above 1,
+        # the per-tick economics are batched and milestone, button and 
+        # project checks only run once per batch. This speeds up advancing
+        # time far more than stepping, whose other costs aren't batched.
+        self._coarse_ticks = coarse_ticks
+        
+        # Order that the ticks of the interval loops are run in
+        if loop_order not in self._loop_orders:
+            raise NotImplementedError("No loop order {}.".format(loop_order))
+        self._loop_order = loop_order
+        
+        # Whether manageProjects only checks the triggers of projects with 
+        # uses left, rather than every project
+        self._project_scheduler = project_scheduler
+        
+        # Resetter agents loaded into the JS context, which are reloaded 
+        # whenever it's rebuilt
+        self._resetter_js = None
         self._init()
+        
+        # With fast resets, the post-warmup state is captured on the first
+        # reset and restored in place on every reset after that
+        self._fast_reset = fast_reset
+        self._reset_snapshot = None
+        
+        # JS context for the next clone, built once the first clone is made
+        self._spare_thread = None
+        self._spare_context = None
+        self._spare_resetter_js = None
     
     def _init(self):
         # Set up interpreter
-        self._intp = py_mini_racer.MiniRacer()
-        self._time_cs = 0
+        self._intp = self._newContext(self._resetter_js)
+        self._accessors = {}
+    
+    def _newContext(self, resetter_js):
+        """A JS context with the game sources, registries, modes and 
+        resetter agents loaded, before the warmup of a reset.
+        """
+        intp = py_mini_racer.MiniRacer()
         
-        # Make initial source read
-        for fname in self._js_filenames:            
+        # Make initial source read. The game sources randomise some of their
+        # globals as they're loaded, so they're loaded under the warmup seed,
+        # and the generator then carries on from its unseeded state.
+        for i, fname in enumerate(self._js_filenames):
             with open(fname, "r") as f:
-                self._intp.eval(f.read())
+                intp.eval(f.read())
+            if i == 0:
+                rng_state = intp.eval("JSON.stringify(emuRngState);")
+                intp.eval("emuSeed({});".format(self._warmup_seed))
+        intp.eval("emuSetRngState({});".format(rng_state))
+        
+        # Populate the registries used by stepFused
+        intp.eval(self._registriesJs())
+        intp.eval("emuCoarseTicks = {};".format(int(self._coarse_ticks)))
+        intp.eval("emuProjectScheduler = {};".format("true" if self._project_scheduler else "false"))
+        intp.eval("emuLoopOrder = \"{}\";".format(self._loop_order))
+        if resetter_js != None:
+            intp.eval(resetter_js)
+        return intp
+    
+    def _startSpareContext(self):
+        """Build the JS context of the next clone on a background thread. 
+        V8 runs without the GIL, so the emulator can be used meanwhile.
+        """
+        self._spare_context = None
+        self._spare_resetter_js = self._resetter_js
+        self._spare_thread = threading.Thread(target=self._buildSpareContext, args=(self._resetter_js,))
+        self._spare_thread.daemon = True
+        self._spare_thread.start()
+    
+    def _buildSpareContext(self, resetter_js):
+        self._spare_context = self._newContext(resetter_js)
+    
+    @classmethod
+    def _registriesJs(cls):
+        """JS that populates the action, observation and availability 
+        registries in the order of their indices.
+        """
+        actions_js = ",".join("function(){{{}}}".format(cls._action_to_js[name]) for name in cls._action_names)
+        observers_js = ",".join("function(){{return {};}}".format(cls._obs_to_js[name]) for name in cls._obs_names)
+        avail_js = ",".join("function(){{return {};}}".format(cls._action_avail_to_js[name]) for name in cls._action_names)
+        return "emuActions = [{}]; emuObservers = [{}]; emuAvailability = [{}];".format(actions_js, observers_js, avail_js)
+    
+    def _saveSnapshot(self):
+        """Capture the game globals in the JS context, including the 
+        emulator clock.
+        """
+        return self._intp.eval("emuSaveSnapshot();")
+    
+    def _loadSnapshot(self, snapshot):
+        self._intp.eval("emuLoadSnapshot({});".format(snapshot))
+    
+    def _getRngState(self):
+        return json.loads(self._intp.eval("JSON.stringify(emuRngState);"))
+    
+    def _setRngState(self, rng_state):
+        self._intp.eval("emuSetRngState({});".format(rng_state))
     
     # "Public" members
     def reset(self):
-        self._init()
-        self._loop_counters = {}
-        for loop_name in self._interval_loops_cs.keys():
-            self._loop_counters[loop_name] = 0
+        # The random number generator carries on from where it was, rather 
+        # than being reset with the rest of the game
+        rng_state = self._getRngState()
+        if self._fast_reset and self._reset_snapshot != None:
+            self._loadSnapshot(self._reset_snapshot)
+            self._setRngState(rng_state)
+            return
         
-        # Other init
-        self._tourney_running = False
+        self._init()
         
         # Allow primary main loops to resolve at least once
+        self.seed(self._warmup_seed)
         self.advanceTime(0.5)
+        self._setRngState(rng_state)
+        
+        if self._fast_reset:
+            self._reset_snapshot = self._saveSnapshot()
+    
+    def seed(self, seed):
+        """Seed the game's random number generator."""
+        self._intp.eval("emuSeed({});".format(int(seed)))
     
     def quit(self):
         # Nothing needs to be done here
         pass
     
+    def _accessor(self, kind, names):
+        """Handle of a compiled JS function that returns the observations 
+        (kind='obs') or action availabilities (kind='avail') with the given 
+        names as a JSON array.
+        """
+        key = (kind, tuple(names))
+        handle = self._accessors.get(key)
+        if handle == None:
+            if kind == 'obs':
+                exprs_js = [self._obs_to_js[name] for name in names]
+            elif kind == 'avail':
+                exprs_js = ["+({})".format(self._action_avail_to_js[name]) for name in names]
+            else:
+                raise NotImplementedError("No accessor for {}.".format(kind))
+            accessor_js = "emuAccessors.push(function(){{return JSON.stringify([{}]);}})-1;".format(",".join(exprs_js))
+            handle = self._intp.eval(accessor_js)
+            self._accessors[key] = handle
+        return handle
+    
+    def _callAccessor(self, kind, names):
+        return json.loads(self._intp.eval("emuAccessors[{}]();".format(self._accessor(kind, names))))
+    
     def makeObservation(self, fields):
-        obs = OrderedDict()
-        
-        # Package as a javascript array
-        fields_js = "["
-        for i in range(len(fields)-1):
-            fields_js += self._obs_to_js[fields[i]]+","
-        fields_js += self._obs_to_js[fields[-1]]
-        fields_js += "]"
-        
-        # Fetch array of values
-        vals = self._intp.eval(fields_js)
-        
-        # Populate our array        
-        for i in range(len(fields)):
-            field = fields[i]
-            val = vals[i]
-            
-            # Any additional scaling that's made before being displayed to webpage
-            if field == 'Public Demand':
-                val *= 10.0
-                
-            obs[field] = val
+        vals = self._callAccessor('obs', fields)
+        return self._packageObservation(fields, vals)
+    
+    @staticmethod
+    def _packageObservation(fields, vals):
+        obs = OrderedDict(zip(fields, vals))
+        
+        # Any additional scaling that's made before being displayed to webpage
+        if 'Public Demand' in obs:
+            obs['Public Demand'] *= 10.0
         return obs
     
     def getAvailableActions(self, ac_names):
-        # Package as a javascript array
-        acs_js = "["
-        for i in range(len(ac_names)-1):
-            ac_name = ac_names[i]
-            acs_js += self._action_avail_to_js[ac_name]+","
-        acs_js += self._action_avail_to_js[ac_names[-1]]
-        acs_js += "]"
-        
-        # Fetch array of availability
-        acs_avail = self._intp.eval(acs_js)
-        acs_avail = [float(ac) for ac in acs_avail]
-        return acs_avail
+        acs_avail = self._callAccessor('avail', ac_names)
+        return [float(ac) for ac in acs_avail]
     
     def runNewTournament(self):
-        tourney_possible = self._intp.eval("strategyEngineFlag == 1 && operations>=tourneyCost && tourneyInProg == 0")
-        if tourney_possible:
-            # Check we haven't messed something up
-            if self._tourney_running:
-                raise Exception("Python and JS tournament logic have become incompatible somehow.")             
-            
-            # Create new tournament
-            self._intp.eval("newTourney();")
-            
-            # Make a pick
-            # For the moment, just pick 0, but can be made random or selected in future
-            self._intp.eval("pick=0;")
-            
-            # The tournament takes 100 ms per round. 
-            # See the setTimeout arguments in "function round(roundNum)".
-            tourney_run_time_cs = 10*self._intp.eval("rounds") 
-            self._tourney_end_time_cs = self._time_cs+tourney_run_time_cs
-            self._tourney_running = True
+        self._intp.eval("emuRunNewTournament();")
     
     def takeAction(self, action_name):
-        if action_name == "Run New Tournament":
-            self.runNewTournament()
-        else:
-            self._intp.eval(self._action_to_js[action_name])
+        self._intp.eval(self._action_to_js[action_name])
         
     def advanceTime(self, dt_s):
         dt_cs = max(int(100.0*dt_s),1)
-        time_cs_next = self._time_cs + dt_cs
-        for loop_name, loop_interval in self._interval_loops_cs.items():
-            # Determine how many iterations of the loop to perform
-            loop_time_cs = self._loop_counters[loop_name]*self._interval_loops_cs[loop_name]
-            time_to_advance_cs = time_cs_next - loop_time_cs
-            iters_to_advance = int(time_to_advance_cs/self._interval_loops_cs[loop_name])
+        self._intp.eval("emuAdvanceTime({});".format(dt_cs))
+    
+    def stepFused(self, action_name, dt_s, fields, ac_names):
+        """Take an action, then observe and determine action availability
+        half way through a step of length 2*dt_s, in a single call to the 
+        JS context. This only saves the other calls a step would make, 
+        about 10 us each, so steps are only about 1.1-1.4x faster. The rest
+        of a step, the game acting and advancing time, costs the same 
+        either way.
+        
+        :returns: (observation, acs_avail) -- The observation as from 
+            makeObservation(fields) and availability as from 
+            getAvailableActions(ac_names).
+        """
+        dt_cs = max(int(100.0*dt_s),1)
+        step_js = "emuAccessors[{}]({}, {});".format(self._stepAccessor(fields, ac_names), self._action_ids[action_name], dt_cs)
+        packed = json.loads(self._intp.eval(step_js))
+        observation = self._packageObservation(fields, packed[:len(fields)])
+        acs_avail = [float(ac) for ac in packed[len(fields):]]
+        return observation, acs_avail
+    
+    def _stepAccessor(self, fields, ac_names):
+        """Handle of a compiled JS function that takes an action index and
+        half step length in cs, and steps as with stepFused, so that each step
+        only sends the action and step length to the JS context.
+        """
+        key = ('step', tuple(fields), tuple(ac_names))
+        handle = self._accessors.get(key)
+        if handle == None:
+            obs_ids = [self._obs_ids[field] for field in fields]
+            ac_ids = [self._action_ids[ac_name] for ac_name in ac_names]
             
-            # Perform the iterations
-            if iters_to_advance > 0:
-                loop_js = "for (var i = 0; i < {}; i++) {{ {} ;}}".format(iters_to_advance, loop_name)
-                self._intp.eval(loop_js)
+            # Large arrays are much slower to convert than their JSON, so the
+            # packed array is returned as a string
+            accessor_js = "emuAccessors.push(function(actionIndex, dtCs){{return JSON.stringify(stepFused(actionIndex, dtCs, {}, {}));}})-1;".format(obs_ids, ac_ids)
+            handle = self._intp.eval(accessor_js)
+            self._accessors[key] = handle
+        return handle
+    
+    def loadResetterAgents(self, agents, stages):
+        """Load the policy networks of agents into the JS context, for 
+        playStages to play stages with.
+        
+        :param agents: the agent of each of the first len(agents) stages, 
+            with getPolicyNetwork, getObservationMeans and 
+            getObservationStds, as MLPAgent
+        :param stages: a dict for every stage, including those without 
+            agents whose conditions for advancing may still be met, with its 'observations' and 
+            their 'scales', its 'actions', its 'action_interval' in seconds, 
+            and its conditions for advancing to the next stage in 'advance', 
+            a list of (field, value, at_least) requiring field to be at least
+            value if at_least, otherwise equal to it, or None if it's the last
+        """
+        stages_js = []
+        for i, stage in enumerate(stages):
+            if i < len(agents):
+                network = agents[i].getPolicyNetwork()
+                policy = {
+                    'weights': [np.asarray(w, dtype=np.float64).tolist() for w in network['weights']],
+                    'biases': [np.asarray(b, dtype=np.float64).ravel().tolist() for b in network['biases']],
+                    'mean': np.asarray(agents[i].getObservationMeans(), dtype=np.float64).tolist(),
+                    'std': np.asarray(agents[i].getObservationStds(), dtype=np.float64).tolist()
+                }
+            else:
+                policy = None
             
-            # Update the execution count for the loop
-            self._loop_counters[loop_name] += iters_to_advance
-        self._time_cs = time_cs_next
+            # Observations are scaled as by _packageObservation, then 
+            # normalised as by UPObservationSpace
+            obs_factors = [(10.0 if field == 'Public Demand' else 1.0)/scale 
+                           for field, scale in zip(stage['observations'], stage['scales'])]
+            if stage['advance'] == None:
+                advance = None
+            else:
+                advance = {
+                    'ids': [self._obs_ids[field] for field, value, at_least in stage['advance']],
+                    'values': [value for field, value, at_least in stage['advance']],
+                    'atLeast': [at_least for field, value, at_least in stage['advance']]
+                }
+            stages_js.append({
+                'policy': policy,
+                'obsIds': [self._obs_ids[field] for field in stage['observations']],
+                'obsFactors': obs_factors,
+                'acIds': [self._action_ids[name] for name in stage['actions']],
+                'actionInterval': stage['action_interval'],
+                'dtCs': max(int(100.0*stage['action_interval']/2.0),1),
+                'advance': advance
+            })
+        self._resetter_js = "emuLoadResetter({});".format(json.dumps(stages_js))
+        self._intp.eval(self._resetter_js)
+    
+    def playStages(self, stage, target_stage, final_stage, game_time, max_game_time, 
+                   stop_on_stage_change=False, seed=0):
+        """Play from stage with the resetter agents until target_stage is 
+        reached, the game time passes max_game_time, or, if 
+        stop_on_stage_change, the stage changes, in a single call to the JS
+        context.
+        
+        :returns: (stage, game_time, stage_times) -- The stage and game time
+            reached, and the (stage, game_time) of each stage change.
+        """
+        self._intp.eval("emuSeedResetter({});".format(int(seed)))
+        play_js = "JSON.stringify(emuPlayStages({}, {}, {}, {}, {}, {}));".format(
+            stage, target_stage, -1 if final_stage == None else final_stage,
+            float(game_time), float(max_game_time), "true" if stop_on_stage_change else "false")
+        result = json.loads(self._intp.eval(play_js))
+        return result['stage'], float(result['gameTime']), [(stage, float(game_time)) for stage, game_time in result['stageTimes']]
+    
+    def pushState(self):
+        """Push the full state of the game, including the emulator clock,
+        any running tournament and the random number generator, onto a
+        stack in the JS context, for lookahead and tree search. In a late
+        game, pushing and popping from Python take about 100 microseconds
+        each, and the first push after the plan is remade up to a 
+        millisecond, rather than the milliseconds of a snapshot or clone, 
+        so a search should branch on the stack rather than on clones.
+
+        :returns: depth -- The number of states on the stack.
+        """
+        return self._intp.eval("emuPushState();")
+
+    def restoreState(self):
+        """Restore the state on top of the stack, leaving it there to be
+        restored again.
+        """
+        self._intp.eval("emuRestoreState();")
+
+    def popState(self, restore=True):
+        """Pop the state on top of the stack, restoring it if restore.
+
+        :returns: depth -- The number of states left on the stack.
+        """
+        return self._intp.eval("emuPopState({});".format("true" if restore else "false"))
+
+    def clone(self):
+        """A new emulator with the same options and resetter agents, in the
+        same state as this one, including the emulator clock, any running
+        tournament and the random number generator. Its state stack starts
+        empty.
+        
+        Each clone's JS context is built ahead of it on a background thread,
+        so a clone made while the last one's successor is ready only costs 
+        carrying the state across, a few milliseconds in a late game, rather
+        than the tens of milliseconds of a new emulator. Clones made in 
+        quicker succession wait for their contexts to be built.
+        """
+        if self._spare_thread == None:
+            self._startSpareContext()
+        self._spare_thread.join()
+        intp = self._spare_context
+        if self._spare_resetter_js != self._resetter_js:
+            intp.eval(self._resetter_js)
+        
+        emulator = copy.copy(self)
+        emulator._intp = intp
+        emulator._accessors = {}
+        emulator._reset_snapshot = None
+        emulator._spare_thread = None
+        emulator._spare_context = None
+        emulator._spare_resetter_js = None
+        
+        # The state is parsed as JSON, which is quicker than evaluating it
+        exported = self._intp.eval("emuExportState();")
+        intp.eval("emuImportState(JSON.parse({}));".format(json.dumps(exported)))
         
-        # Check for tournament completion
-        if self._tourney_running:
-            # Complete the tournament by running all its rounds instantly
-            if self._time_cs > self._tourney_end_time_cs:
-                self._intp.eval("instantRunTourney();")
-                self._tourney_running = False
+        # The next context is built once this one is no longer being used
+        self._startSpareContext()
+        return emulator
     
     def getStateAsString(self):
         stateString = self._intp.eval("getSaveAsString();")
@@ -226,10 +397,10 @@ class UPEmulator(object):
     
     def saveState(self, filename):
         # Complete any tournaments before saving state
-        tourney_time_remaining_cs = self._tourney_end_time_cs - self._time_cs
-        if self._tourney_running:
+        if self._intp.eval("emuTourneyRunning"):
+            tourney_time_remaining_cs = self._intp.eval("emuTourneyEndTimeCs - emuTimeCs")
             self.advanceTime((tourney_time_remaining_cs+2.0)/100.0)
-        assert not self._tourney_running
+        assert not self._intp.eval("emuTourneyRunning")
         
         # Save
         with open(filename, 'w') as f:
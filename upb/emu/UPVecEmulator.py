@@ -0,0 +1,180 @@
+from py_mini_racer import py_mini_racer
+from os.path import abspath, dirname, join
+from upb.emu.UPEmulator import UPEmulator
+import numpy as np
+import json
+
+class UPVecEmulator(object):
+    """Several independent games hosted in a single JS context.
+
+    Each game is an instance of the game sources wrapped in a closure, so
+    every game has its own copy of the game globals. All games are stepped
+    together in a single call. As with UPEmulator's fast reset, each game's
+    post-warmup state is captured once and restored in place on reset.
+    """
+
+    # Per-game accessors and batched stepping over all games
+    _games_js = """
+    var emuGames = [];
+    var emuBaseMath = Math;
+
+    function emuResetGame(k) {
+        if (emuGames[k]) {
+            emuGames[k].reset();
+        } else {
+            emuGames[k] = emuMakeGame();
+        }
+    }
+
+    function emuStepGames(actionIds, dtCs, obsIds, acIds) {
+        var packed = [];
+        for (var k = 0; k < emuGames.length; k++) {
+            packed.push(emuGames[k].stepFused(actionIds[k], dtCs[k], obsIds, acIds));
+        }
+        return JSON.stringify(packed);
+    }
+    """
+
+    def __init__(self, n_games,
+                 combat_filename=join(dirname(abspath(__file__)),"combat.js"),
+                 globals_filename=join(dirname(abspath(__file__)),"globals.js"),
+                 projects_filename=join(dirname(abspath(__file__)),"projects.js"),
+                 main_filename=join(dirname(abspath(__file__)),"main_pre_drones.js"),
+                 rng_filename=join(dirname(abspath(__file__)),"rng.js"),
+                 coarse_ticks=1,
+                 loop_order='sequential'):
+        if loop_order not in UPEmulator._loop_orders:
+            raise NotImplementedError("No loop order {}.".format(loop_order))
+        self._n_games = n_games
+        self._js_filenames = [rng_filename, combat_filename, globals_filename, projects_filename, main_filename]
+
+        # Game factory that evaluates the game sources as a closure,
+        # populates its registries, sets the coarse-tick mode and loop order
+        # as with UPEmulator and allows the primary main loops to resolve at least
+        # once, under UPEmulator's warmup seed. The game sources are loaded
+        # under the warmup seed too, as with UPEmulator. Each game has its 
+        # own Math, so that each has its own random number generator. The game's globals
+        # are closure variables, so the snapshot functions reach them 
+        # through accessors in place of the global object. A reset restores
+        # the snapshot taken after the warmup, and the random number 
+        # generator carries on from where it was.
+        sources = []
+        for fname in self._js_filenames:
+            with open(fname, "r") as f:
+                sources.append(f.read())
+        accessors_js = ", ".join("get {0}() {{return {0};}}, set {0}(emuValue) {{{0} = emuValue;}}".format(name) 
+                                 for name in self._gameGlobalNames(sources))
+        factory_js = "function emuMakeGame() {{\nvar Math = Object.create(emuBaseMath);\n{}\nvar emuCarriedRngState = emuRngState.slice();\nemuSeed({});\n{}\n{}\nemuCoarseTicks = {};\nemuLoopOrder = \"{}\";\nemuSeed({});\nemuAdvanceTime(50);\nemuSetRngState(emuCarriedRngState);\nemuGlobal = {{{}}};\nvar emuResetSnapshot = emuCaptureGlobals();\nfunction emuReset() {{var rngState = emuRngState.slice(); emuRestoreGlobals(emuResetSnapshot); emuSetRngState(rngState);}}\nreturn {{stepFused: stepFused, observe: emuObserve, takeAction: function(k){{emuActions[k]();}}, advanceTime: emuAdvanceTime, getSaveAsString: getSaveAsString, loadStateFromString: loadStateFromString, seed: emuSeed, reset: emuReset}};\n}}"
+        factory_js = factory_js.format(sources[0], UPEmulator._warmup_seed, "\n".join(sources[1:]), UPEmulator._registriesJs(), 
+                                       int(coarse_ticks), loop_order, UPEmulator._warmup_seed, accessors_js)
+
+        # Set up interpreter
+        self._intp = py_mini_racer.MiniRacer()
+        self._intp.eval(factory_js)
+        self._intp.eval(self._games_js)
+        for k in range(self._n_games):
+            self.reset(k)
+
+    @staticmethod
+    def _gameGlobalNames(sources):
+        """Names of the globals that the game sources declare, other than 
+        functions, from loading them into a context of their own.
+        """
+        intp = py_mini_racer.MiniRacer()
+        for source in sources:
+            intp.eval(source)
+        intp.eval(UPEmulator._registriesJs())
+        names_js = "JSON.stringify(Object.keys(emuGlobal).filter(function(name) {return typeof emuGlobal[name] != \"function\";}));"
+        return json.loads(intp.eval(names_js))
+
+    @property
+    def n_games(self):
+        return self._n_games
+
+    # "Public" members
+    def reset(self, k):
+        self._intp.eval("emuResetGame({});".format(k))
+
+    def quit(self):
+        # Nothing needs to be done here
+        pass
+
+    def game(self, k):
+        """A handler for the k-th game with the same interface as a
+        UPEmulator.
+        """
+        return UPVecEmulatorGame(self, k)
+
+    def stepFused(self, action_names, dt_s, fields, ac_names):
+        """Step every game as with UPEmulator.stepFused.
+
+        :param action_names: the action to take in each game
+        :param dt_s: half the step length in each game
+        :returns: (observations, acs_avail) -- A list of the observations
+            of each game and an (n_games, len(ac_names)) array of action
+            availability.
+        """
+        action_ids = [UPEmulator._action_ids[action_name] for action_name in action_names]
+        dts_cs = [max(int(100.0*dt),1) for dt in dt_s]
+        obs_ids = [UPEmulator._obs_ids[field] for field in fields]
+        ac_ids = [UPEmulator._action_ids[ac_name] for ac_name in ac_names]
+        step_js = "emuStepGames({}, {}, {}, {});".format(action_ids, dts_cs, obs_ids, ac_ids)
+        packed = np.array(json.loads(self._intp.eval(step_js)), dtype=np.float64)
+
+        observations = [UPEmulator._packageObservation(fields, packed[k,:len(fields)].tolist()) for k in range(self._n_games)]
+        acs_avail = packed[:,len(fields):]
+        return observations, acs_avail
+
+    def _evalGame(self, k, expr_js):
+        return json.loads(self._intp.eval("JSON.stringify(emuGames[{}].{});".format(k, expr_js)))
+    
+    def _execGame(self, k, stmt_js):
+        self._intp.eval("emuGames[{}].{};".format(k, stmt_js))
+
+class UPVecEmulatorGame(object):
+    """A single game of a UPVecEmulator."""
+    def __init__(self, vec_emulator, k):
+        self._vec = vec_emulator
+        self._k = k
+
+    def reset(self):
+        self._vec.reset(self._k)
+
+    def quit(self):
+        pass
+
+    def makeObservation(self, fields):
+        obs_ids = [UPEmulator._obs_ids[field] for field in fields]
+        vals = self._vec._evalGame(self._k, "observe({}, [])".format(obs_ids))
+        return UPEmulator._packageObservation(fields, vals)
+
+    def getAvailableActions(self, ac_names):
+        ac_ids = [UPEmulator._action_ids[ac_name] for ac_name in ac_names]
+        acs_avail = self._vec._evalGame(self._k, "observe([], {})".format(ac_ids))
+        return [float(ac) for ac in acs_avail]
+
+    def seed(self, seed):
+        self._vec._execGame(self._k, "seed({})".format(int(seed)))
+    
+    def takeAction(self, action_name):
+        self._vec._execGame(self._k, "takeAction({})".format(UPEmulator._action_ids[action_name]))
+
+    def advanceTime(self, dt_s):
+        dt_cs = max(int(100.0*dt_s),1)
+        self._vec._execGame(self._k, "advanceTime({})".format(dt_cs))
+
+    def stepFused(self, action_name, dt_s, fields, ac_names):
+        dt_cs = max(int(100.0*dt_s),1)
+        obs_ids = [UPEmulator._obs_ids[field] for field in fields]
+        ac_ids = [UPEmulator._action_ids[ac_name] for ac_name in ac_names]
+        step_js = "stepFused({}, {}, {}, {})".format(UPEmulator._action_ids[action_name], dt_cs, obs_ids, ac_ids)
+        packed = self._vec._evalGame(self._k, step_js)
+        observation = UPEmulator._packageObservation(fields, packed[:len(fields)])
+        acs_avail = [float(ac) for ac in packed[len(fields):]]
+        return observation, acs_avail
+    
+    def getStateAsString(self):
+        return self._vec._intp.eval("emuGames[{}].getSaveAsString();".format(self._k))
+    
+    def loadStateFromString(self, stateString):
+        self._vec._execGame(self._k, "loadStateFromString({})".format(stateString))
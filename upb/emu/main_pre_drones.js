@@ -182,6 +182,12 @@ function qComp(){
 
 function manageProjects(){
     
+    //@EMUADDITION
+    if (emuProjectScheduler) {
+        emuManageLiveProjects();
+        return;
+    }
+    
     for(var i = 0; i < projects.length; i++){
         if (projects[i].trigger() && (projects[i].uses > 0)){
             displayProjects(projects[i]);
@@ -3779,6 +3785,8 @@ function refresh() {
     // HOT FIXES
     
     project218.uses = 1;
+    //@EMUADDITION
+    emuLiveProjectsDirty = true;
     
     
     // DEBUG
@@ -4365,7 +4373,9 @@ for(var i=0; i < activeProjects.length; i++){
         saveProjectsUses: projectsUses,
         saveProjectsFlags: projectsFlags,
         saveProjectsActive: projectsActive,
-        saveStratsActive: stratsActive        
+        saveStratsActive: stratsActive,
+        //@EMUADDITION
+        saveRngState: emuRngState.slice()
     }
     
     return JSON.stringify(saveContents);
@@ -5239,6 +5249,8 @@ function load() {
     projects[i].flag = loadProjectsFlags[i]; 
         
     }
+    //@EMUADDITION
+    emuLiveProjectsDirty = true;
     
     for(var i=0; i < projects.length; i++){
     
@@ -5273,6 +5285,12 @@ function loadStateFromString(stateString) {
     var loadProjectsActive = stateContents.saveProjectsActive;
     var loadStratsActive = stateContents.saveStratsActive;
     
+    //@EMUADDITION
+    // Saves from before the generator was added don't have its state
+    if (stateContents.saveRngState !== undefined) {
+        emuSetRngState(stateContents.saveRngState);
+    }
+    
     for(var i=0; i < allStrats.length; i++){
     
     allStrats[i].active = loadStratsActive[i];
@@ -5555,6 +5573,8 @@ function loadStateFromString(stateString) {
     projects[i].flag = loadProjectsFlags[i]; 
         
     }
+    //@EMUADDITION
+    emuLiveProjectsDirty = true;
     
     for(var i=0; i < projects.length; i++){
     
@@ -5574,6 +5594,885 @@ function loadStateFromString(stateString) {
     
 }
 
+//@EMUADDITION
+// In-context snapshots of the mutable game globals. Objects are restored in
+// place so that references shared between globals (e.g. projects and
+// activeProjects) keep pointing at the same objects.
+var emuGlobal = this;
+var emuSnapshots = [];
+var emuUnsnapshotted = ["emuGlobal", "emuSnapshots", "emuUnsnapshotted", "emuAccessors"];
+
+function emuCaptureGlobals() {
+    var values = {};
+    var objects = [];
+    var copies = [];
+    var seen = new Set();
+    var pending = [];
+    
+    var names = Object.keys(emuGlobal);
+    for (var i = 0; i < names.length; i++) {
+        var name = names[i];
+        var value = emuGlobal[name];
+        if (emuUnsnapshotted.indexOf(name) >= 0 || typeof value == "function") {
+            continue;
+        }
+        values[name] = value;
+        if (value !== null && typeof value == "object") {
+            pending.push(value);
+        }
+    }
+    
+    while (pending.length > 0) {
+        var obj = pending.pop();
+        if (seen.has(obj)) {
+            continue;
+        }
+        seen.add(obj);
+        var copy = Array.isArray(obj) ? obj.slice() : Object.assign({}, obj);
+        objects.push(obj);
+        copies.push(copy);
+        for (var key in copy) {
+            var member = copy[key];
+            if (member !== null && typeof member == "object") {
+                pending.push(member);
+            }
+        }
+    }
+    
+    return {values: values, objects: objects, copies: copies};
+}
+
+function emuRestoreGlobals(captured) {
+    var values = captured.values;
+    
+    // Globals created since the capture, e.g. implicit loop variables,
+    // which the state plan may read
+    var names = Object.keys(emuGlobal);
+    for (var i = 0; i < names.length; i++) {
+        var name = names[i];
+        if (!(name in values) && emuUnsnapshotted.indexOf(name) < 0 && typeof emuGlobal[name] != "function") {
+            delete emuGlobal[name];
+            emuStatePlan = null;
+        }
+    }
+    
+    for (var name in values) {
+        emuGlobal[name] = values[name];
+    }
+    emuRestoreObjects(captured.objects, captured.copies);
+}
+
+function emuRestoreObjects(objects, copies) {
+    for (var i = 0; i < objects.length; i++) {
+        var obj = objects[i];
+        var copy = copies[i];
+        if (Array.isArray(obj)) {
+            obj.length = copy.length;
+            for (var j = 0; j < copy.length; j++) {
+                obj[j] = copy[j];
+            }
+        } else {
+            for (var key in obj) {
+                if (obj.hasOwnProperty(key) && !copy.hasOwnProperty(key)) {
+                    delete obj[key];
+                }
+            }
+            Object.assign(obj, copy);
+        }
+    }
+}
+
+function emuSaveSnapshot() {
+    emuSnapshots.push(emuCaptureGlobals());
+    return emuSnapshots.length-1;
+}
+
+function emuLoadSnapshot(handle) {
+    emuRestoreGlobals(emuSnapshots[handle]);
+}
+
+//@EMUADDITION
+// A stack of compact states for lookahead and tree search. A state plan,
+// made on the first push, lists the mutable globals and the non-function
+// members of every object reachable from them, and compiles functions that
+// read them all into a flat array and write them back. In a late game,
+// with over a thousand slots, a push and pop take a few hundred
+// microseconds until V8 optimizes the compiled functions, some thousands
+// of pushes in, and a few tens after, rather than the milliseconds of a
+// snapshot. Objects that aren't in the plan, e.g. new stocks, are copied
+// as by emuCaptureGlobals alongside the flat array, and once enough of
+// them have been copied, the plan is remade. The object graphs of combat,
+// which can't start before probes are launched, are never changed in this
+// game, so are left out of the plan.
+// Globals first created after the plan is made, which are only implicit
+// loop variables once the game is running, aren't captured.
+var emuStaticGlobals = ["grid", "ships"];
+var emuStatePlan = null;
+var emuStateStack = [];
+var emuStateMaxExtras = 1000;
+emuUnsnapshotted.push("emuStaticGlobals", "emuStatePlan", "emuStateStack", "emuStateMaxExtras");
+
+function emuIsStateGlobal(name) {
+    return emuUnsnapshotted.indexOf(name) < 0 && typeof emuGlobal[name] != "function";
+}
+
+function emuMakeStatePlan() {
+    var globalNames = Object.keys(emuGlobal).filter(emuIsStateGlobal);
+    var objects = [];
+    var objectSet = new Set();
+    var pending = [];
+    for (var i = 0; i < globalNames.length; i++) {
+        var value = emuGlobal[globalNames[i]];
+        if (value !== null && typeof value == "object") {
+            objectSet.add(value);
+            if (emuStaticGlobals.indexOf(globalNames[i]) < 0) {
+                pending.push(value);
+            }
+        }
+    }
+    while (pending.length > 0) {
+        var obj = pending.pop();
+        objects.push(obj);
+        for (var key in obj) {
+            var member = obj[key];
+            if (member !== null && typeof member == "object" && !objectSet.has(member)) {
+                objectSet.add(member);
+                pending.push(member);
+            }
+        }
+    }
+
+    // Globals are read and written by name, object members through the
+    // objects held by the compiled functions, and arrays whole
+    var captureJs = [];
+    var restoreJs = [];
+    var isArraySlot = [];
+    var k = 0;
+    for (var i = 0; i < globalNames.length; i++) {
+        captureJs.push("emuVals[" + k + "] = " + globalNames[i] + ";");
+        restoreJs.push(globalNames[i] + " = emuVals[" + k + "];");
+        isArraySlot.push(false);
+        k++;
+    }
+    for (var i = 0; i < objects.length; i++) {
+        var obj = objects[i];
+        if (Array.isArray(obj)) {
+            captureJs.push("emuVals[" + k + "] = emuO" + i + ".slice();");
+            restoreJs.push("emuRestoreArray(emuO" + i + ", emuVals[" + k + "]);");
+            isArraySlot.push(true);
+            k++;
+            continue;
+        }
+        for (var key in obj) {
+            if (!obj.hasOwnProperty(key) || typeof obj[key] == "function") {
+                continue;
+            }
+            var member = "emuO" + i + "[" + JSON.stringify(key) + "]";
+            captureJs.push("emuVals[" + k + "] = " + member + ";");
+            restoreJs.push(member + " = emuVals[" + k + "];");
+            isArraySlot.push(false);
+            k++;
+        }
+    }
+    var objectsJs = objects.map(function(obj, i) {return "var emuO" + i + " = emuObjs[" + i + "];";}).join("\n");
+    var functionsJs = objectsJs + "\nreturn [function(emuVals) {\n" + captureJs.join("\n") + "\n}, function(emuVals) {\n" + restoreJs.join("\n") + "\n}];";
+    var functions = new Function("emuObjs", functionsJs)(objects);
+
+    // Slots mostly hold the same objects as when the plan was made, which
+    // are known to be in it
+    var plannedVals = new Array(k);
+    functions[0](plannedVals);
+    return {
+        capture: functions[0],
+        restore: functions[1],
+        nSlots: k,
+        isArraySlot: isArraySlot,
+        plannedVals: plannedVals,
+        objectSet: objectSet,
+        nExtras: 0
+    };
+}
+
+function emuRestoreArray(arr, copy) {
+    arr.length = copy.length;
+    for (var j = 0; j < copy.length; j++) {
+        arr[j] = copy[j];
+    }
+}
+
+function emuCaptureExtras(plan, vals) {
+    // Objects reachable from the slots that aren't in the plan, and those
+    // reachable from them in turn
+    var objects = [];
+    var copies = [];
+    var pending = [];
+    for (var i = 0; i < plan.nSlots; i++) {
+        var value = vals[i];
+        if (typeof value != "object" || value === null) {
+            continue;
+        }
+        var planned = plan.plannedVals[i];
+        if (plan.isArraySlot[i]) {
+            for (var j = 0; j < value.length; j++) {
+                var member = value[j];
+                if (typeof member == "object" && member !== planned[j] && member !== null && !plan.objectSet.has(member)) {
+                    pending.push(member);
+                }
+            }
+        } else if (value !== planned && !plan.objectSet.has(value)) {
+            pending.push(value);
+        }
+    }
+    if (pending.length == 0) {
+        return null;
+    }
+
+    var seen = new Set();
+    while (pending.length > 0) {
+        var obj = pending.pop();
+        if (seen.has(obj)) {
+            continue;
+        }
+        seen.add(obj);
+        var copy = Array.isArray(obj) ? obj.slice() : Object.assign({}, obj);
+        objects.push(obj);
+        copies.push(copy);
+        for (var key in copy) {
+            var member = copy[key];
+            if (member !== null && typeof member == "object" && !plan.objectSet.has(member)) {
+                pending.push(member);
+            }
+        }
+    }
+    return {objects: objects, copies: copies};
+}
+
+function emuPushState() {
+    if (emuStatePlan == null) {
+        emuStatePlan = emuMakeStatePlan();
+    }
+    var vals = new Array(emuStatePlan.nSlots);
+    emuStatePlan.capture(vals);
+    var extras = emuCaptureExtras(emuStatePlan, vals);
+    emuStateStack.push({plan: emuStatePlan, vals: vals, extras: extras});
+    if (extras != null) {
+        emuStatePlan.nExtras += extras.objects.length;
+        if (emuStatePlan.nExtras > emuStateMaxExtras) {
+            emuStatePlan = null;
+        }
+    }
+    return emuStateStack.length;
+}
+
+function emuRestoreState() {
+    // States are restored by the plans they were captured with, which hold
+    // every object reachable when they were captured
+    var state = emuStateStack[emuStateStack.length-1];
+    state.plan.restore(state.vals);
+    if (state.extras != null) {
+        emuRestoreObjects(state.extras.objects, state.extras.copies);
+    }
+}
+
+function emuPopState(restore) {
+    if (restore) {
+        emuRestoreState();
+    }
+    emuStateStack.pop();
+    return emuStateStack.length;
+}
+
+// States are carried to new JS contexts, as by UPEmulator.clone, in a 
+// compact form. Objects are listed by where they were first reached from
+// the globals, so that those which already exist in the other context, 
+// with their member functions, are written in place, and those that don't
+// are made. The values of the globals and of each object's members follow
+// in a single flat array, with references to objects and values that JSON
+// can't hold listed apart by their indices.
+function emuExportState() {
+    var names = Object.keys(emuGlobal).filter(function(name) {
+        return emuIsStateGlobal(name) && emuStaticGlobals.indexOf(name) < 0;
+    });
+    var ids = new Map();
+    var objects = [];
+    var layout = [];
+    function reach(value, parent, key) {
+        if (value !== null && typeof value == "object" && !ids.has(value)) {
+            ids.set(value, objects.length);
+            objects.push(value);
+            layout.push([parent, key]);
+        }
+    }
+    for (var i = 0; i < names.length; i++) {
+        reach(emuGlobal[names[i]], -1, names[i]);
+    }
+    for (var i = 0; i < objects.length; i++) {
+        for (var key in objects[i]) {
+            reach(objects[i][key], i, key);
+        }
+    }
+
+    // Specials are undefined, functions, which are left as they are, and
+    // NaN and the infinities
+    var values = [];
+    var refs = [];
+    var specials = [];
+    function encode(value) {
+        var i = values.length;
+        values.push(null);
+        if (value === undefined) {
+            specials.push(i, 0);
+        } else if (typeof value == "function") {
+            specials.push(i, 1);
+        } else if (typeof value == "number" && !isFinite(value)) {
+            specials.push(i, value !== value ? 2 : (value > 0 ? 3 : 4));
+        } else if (value !== null && typeof value == "object") {
+            refs.push(i, ids.get(value));
+        } else {
+            values[i] = value;
+        }
+    }
+    for (var i = 0; i < names.length; i++) {
+        encode(emuGlobal[names[i]]);
+    }
+    for (var i = 0; i < objects.length; i++) {
+        var obj = objects[i];
+        if (Array.isArray(obj)) {
+            layout[i].push(obj.length);
+            for (var j = 0; j < obj.length; j++) {
+                encode(obj[j]);
+            }
+        } else {
+            var keys = Object.keys(obj).filter(function(key) {return typeof obj[key] != "function";});
+            layout[i].push(keys);
+            for (var j = 0; j < keys.length; j++) {
+                encode(obj[keys[j]]);
+            }
+        }
+    }
+    return JSON.stringify({names: names, layout: layout, values: values, refs: refs, specials: specials});
+}
+
+function emuImportState(exported) {
+    // Find or make every object before writing any of them
+    var layout = exported.layout;
+    var objects = new Array(layout.length);
+    var found = new Set();
+    for (var i = 0; i < layout.length; i++) {
+        var isArray = typeof layout[i][2] == "number";
+        var parent = layout[i][0] < 0 ? emuGlobal : objects[layout[i][0]];
+        var obj = parent[layout[i][1]];
+        if (obj === null || typeof obj != "object" || Array.isArray(obj) != isArray || found.has(obj)) {
+            obj = isArray ? [] : {};
+        }
+        found.add(obj);
+        objects[i] = obj;
+    }
+
+    var values = exported.values;
+    var keep = {};
+    for (var i = 0; i < exported.refs.length; i += 2) {
+        values[exported.refs[i]] = objects[exported.refs[i+1]];
+    }
+    var specialValues = [undefined, keep, NaN, Infinity, -Infinity];
+    for (var i = 0; i < exported.specials.length; i += 2) {
+        values[exported.specials[i]] = specialValues[exported.specials[i+1]];
+    }
+
+    var v = 0;
+    var names = new Set(exported.names);
+    for (var i = 0; i < exported.names.length; i++, v++) {
+        if (values[v] !== keep) {
+            emuGlobal[exported.names[i]] = values[v];
+        }
+    }
+    var currentNames = Object.keys(emuGlobal);
+    for (var i = 0; i < currentNames.length; i++) {
+        var name = currentNames[i];
+        if (!names.has(name) && emuIsStateGlobal(name) && emuStaticGlobals.indexOf(name) < 0) {
+            delete emuGlobal[name];
+        }
+    }
+
+    for (var i = 0; i < objects.length; i++) {
+        var obj = objects[i];
+        if (typeof layout[i][2] == "number") {
+            obj.length = layout[i][2];
+            for (var j = 0; j < obj.length; j++, v++) {
+                if (values[v] !== keep) {
+                    obj[j] = values[v];
+                }
+            }
+        } else {
+            var keys = layout[i][2];
+            for (var key in obj) {
+                if (obj.hasOwnProperty(key) && typeof obj[key] != "function" && keys.indexOf(key) < 0) {
+                    delete obj[key];
+                }
+            }
+            for (var j = 0; j < keys.length; j++, v++) {
+                obj[keys[j]] = values[v];
+            }
+        }
+    }
+    emuStatePlan = null;
+}
+
+//@EMUADDITION
+// Emulator clock. Interval loops are listed in the order the game sets up 
+// their intervals. With emuLoopOrder "time", their ticks are run as a 
+// single stream in the order they're due, with ticks due at the same time 
+// run in the order listed, as the browser runs them. With "sequential", 
+// each loop is caught up to the current time in turn.
+var emuLoopOrder = "sequential";
+var emuTimeCs = 0;
+var emuIntervalLoops = [intervalLoop1, intervalLoop2, intervalLoop3, intervalLoop4];
+var emuIntervalLoopsCs = [100, 250, 1, 10];
+var emuLoopCounters = [0, 0, 0, 0];
+var emuTourneyRunning = false;
+var emuTourneyEndTimeCs = 0;
+
+// Coarse-tick mode. With emuCoarseTicks > 1, intervalLoop3 is run in 
+// batches of up to emuCoarseTicks ticks by emuCoarseLoop3. In time order, 
+// batches also end at the next tick of any other loop but intervalLoop4.
+var emuCoarseTicks = 1;
+
+// Runs k ticks of intervalLoop3 at once. Operations, creativity, trust and 
+// the quantum clock are still accumulated tick by tick, as they're cheap. 
+// Clip production is applied in a single update unless the wire could run 
+// out or the wire buyer could trigger within the batch, in which case it's 
+// done tick by tick until the wire runs out for good. Milestone, button and
+// project checks run once.
+function emuCoarseLoop3(k) {
+    ticks = ticks + k;
+    milestoneCheck();
+    buttonUpdate();
+    
+    for (var j = 0; j < k; j++) {
+        if (compFlag == 1) {
+            calculateOperations();
+        }
+        if (creativityOn && operations >= (memory*1000)) {
+            calculateCreativity();
+        }
+    }
+    
+    if (qFlag == 1) {
+        qClock = qClock + .01*(k-1);
+        quantumCompute();
+    }
+    
+    updateStats();
+    
+    if (dismantle<4) {
+        var clipsPerTick = clipperBoost*(clipmakerLevel/100) + megaClipperBoost*(megaClipperLevel*5);
+        if (wire - k*clipsPerTick > 1) {
+            clipClick(k*clipsPerTick);
+        } else {
+            for (var j = 0; j < k; j++) {
+                if (wireBuyerFlag==1 && wireBuyerStatus==1 && wire<=1){
+                    buyWire();
+                }
+                
+                // Funds don't change within the batch, so once there's no 
+                // wire left to make clips with, none can be bought either
+                if (wire < 1) {
+                    break;
+                }
+                clipClick(clipperBoost*(clipmakerLevel/100));
+                clipClick(megaClipperBoost*(megaClipperLevel*5));
+            }
+        }
+    }
+    
+    if (humanFlag == 1) {
+        for (var j = 0; j < k; j++) {
+            calculateTrust();
+        }
+        marketing = (Math.pow(1.1,(marketingLvl-1)));
+        demand = (((.8/margin) * marketing * marketingEffectiveness)*demandBoost);
+        demand = demand + ((demand/10)*prestigeU);
+    }
+    
+    manageProjects();
+    milestoneCheck();
+}
+
+function emuAdvanceTime(dtCs) {
+    if (emuLoopOrder == "time") {
+        emuAdvanceTimeOrdered(dtCs);
+    } else {
+        emuAdvanceTimeSequential(dtCs);
+    }
+}
+
+// The tournament completes once its end time has passed, after any ticks 
+// due at the same time
+function emuTourneyDueCs() {
+    return emuTourneyRunning ? emuTourneyEndTimeCs+1 : Infinity;
+}
+
+function emuAdvanceTimeOrdered(dtCs) {
+    var timeCsNext = emuTimeCs + dtCs;
+    var nLoops = emuIntervalLoops.length;
+    while (true) {
+        // The loop with the next tick due
+        var next = -1;
+        var nextDueCs = Infinity;
+        for (var i = 0; i < nLoops; i++) {
+            var dueCs = (emuLoopCounters[i]+1)*emuIntervalLoopsCs[i];
+            if (dueCs < nextDueCs) {
+                next = i;
+                nextDueCs = dueCs;
+            }
+        }
+        
+        var tourneyDueCs = emuTourneyDueCs();
+        if (tourneyDueCs < nextDueCs && tourneyDueCs <= timeCsNext) {
+            emuTimeCs = tourneyDueCs;
+            instantRunTourney();
+            emuTourneyRunning = false;
+            continue;
+        }
+        if (nextDueCs > timeCsNext) {
+            break;
+        }
+        
+        // The loop's ticks are run together up to the next tick of any 
+        // other loop, or the tournament, that's due before them. Coarse
+        // batches take in the ticks of intervalLoop4 that fall inside them,
+        // which are run straight after each batch.
+        var coarse = emuIntervalLoops[next] === intervalLoop3 && emuCoarseTicks > 1;
+        var limitCs = Math.min(timeCsNext, tourneyDueCs);
+        for (var i = 0; i < nLoops; i++) {
+            if (i != next && !(coarse && emuIntervalLoops[i] === intervalLoop4)) {
+                var dueCs = (emuLoopCounters[i]+1)*emuIntervalLoopsCs[i];
+                limitCs = Math.min(limitCs, i < next ? dueCs-1 : dueCs);
+            }
+        }
+        var nTicks = Math.floor(limitCs/emuIntervalLoopsCs[next]) - emuLoopCounters[next];
+        if (coarse) {
+            var loop4 = emuIntervalLoops.indexOf(intervalLoop4);
+            for (var j = 0; j < nTicks; j += emuCoarseTicks) {
+                var k = Math.min(emuCoarseTicks, nTicks-j);
+                emuCoarseLoop3(k);
+                emuLoopCounters[next] += k;
+                var batchEndCs = emuLoopCounters[next]*emuIntervalLoopsCs[next];
+                var nLoop4Ticks = Math.floor(batchEndCs/emuIntervalLoopsCs[loop4]) - emuLoopCounters[loop4];
+                for (var m = 0; m < nLoop4Ticks; m++) {
+                    intervalLoop4();
+                }
+                emuLoopCounters[loop4] += nLoop4Ticks;
+            }
+            nTicks = 0;
+        } else {
+            for (var j = 0; j < nTicks; j++) {
+                emuIntervalLoops[next]();
+            }
+        }
+        emuLoopCounters[next] += nTicks;
+        emuTimeCs = emuLoopCounters[next]*emuIntervalLoopsCs[next];
+    }
+    emuTimeCs = timeCsNext;
+}
+
+function emuAdvanceTimeSequential(dtCs) {
+    var timeCsNext = emuTimeCs + dtCs;
+    for (var i = 0; i < emuIntervalLoops.length; i++) {
+        var loopTimeCs = emuLoopCounters[i]*emuIntervalLoopsCs[i];
+        var itersToAdvance = Math.floor((timeCsNext - loopTimeCs)/emuIntervalLoopsCs[i]);
+        if (emuIntervalLoops[i] === intervalLoop3 && emuCoarseTicks > 1) {
+            for (var j = 0; j < itersToAdvance; j += emuCoarseTicks) {
+                emuCoarseLoop3(Math.min(emuCoarseTicks, itersToAdvance-j));
+            }
+        } else {
+            for (var j = 0; j < itersToAdvance; j++) {
+                emuIntervalLoops[i]();
+            }
+        }
+        emuLoopCounters[i] += itersToAdvance;
+    }
+    emuTimeCs = timeCsNext;
+    
+    // Complete the tournament by running all its rounds instantly
+    if (emuTourneyRunning && emuTimeCs > emuTourneyEndTimeCs) {
+        instantRunTourney();
+        emuTourneyRunning = false;
+    }
+}
+
+function emuRunNewTournament() {
+    if (strategyEngineFlag == 1 && operations>=tourneyCost && tourneyInProg == 0) {
+        // Check we haven't messed something up
+        if (emuTourneyRunning) {
+            throw new Error("Emulator and game tournament logic have become incompatible somehow.");
+        }
+        
+        newTourney();
+        
+        // For the moment, just pick 0, but can be made random or selected in future
+        pick = 0;
+        
+        // The tournament takes 100 ms per round. 
+        // See the setTimeout arguments in "function round(roundNum)".
+        emuTourneyEndTimeCs = emuTimeCs + 10*rounds;
+        emuTourneyRunning = true;
+    }
+}
+
+//@EMUADDITION
+// Project scheduler. Rather than calling the trigger of every project on 
+// every tick, manageProjects only calls those of live projects, which have
+// uses left, in the same order. Projects are retired from the live list 
+// once their uses run out, and the list is rebuilt whenever a project's 
+// uses may have been raised above 0 again, by a project's effect or a load.
+// Snapshots restore the list along with the uses. Triggers and costs have 
+// no side effects, so checking uses first and skipping the costs of active 
+// projects, whose results aren't used, leaves activations unchanged.
+var emuProjectScheduler = true;
+var emuLiveProjects = [];
+var emuLiveProjectsDirty = true;
+
+// Effects can give a project more uses, so the live list is rebuilt after 
+// any of them is run
+function emuRebuildLiveProjectsAfter(project) {
+    var effect = project.effect;
+    project.effect = function() {
+        var result = effect.apply(this, arguments);
+        emuLiveProjectsDirty = true;
+        return result;
+    };
+}
+
+for (var i = 0; i < projects.length; i++) {
+    emuRebuildLiveProjectsAfter(projects[i]);
+}
+
+function emuIsLive(project) {
+    return project.uses > 0;
+}
+
+function emuManageLiveProjects() {
+    if (emuLiveProjectsDirty) {
+        emuLiveProjects = projects.filter(emuIsLive);
+        emuLiveProjectsDirty = false;
+    }
+    
+    // Projects that were live when the list was made may since have had 
+    // their uses set to 0 by a load, so uses are still checked
+    var liveProjects = emuLiveProjects;
+    var nLive = liveProjects.length;
+    var retired = false;
+    for (var i = 0; i < nLive; i++) {
+        var project = liveProjects[i];
+        if (project.uses > 0 && project.trigger()) {
+            displayProjects(project);
+            project.uses = project.uses - 1;
+            activeProjects.push(project);
+            retired = retired || !(project.uses > 0);
+        }
+    }
+    if (retired) {
+        emuLiveProjects = liveProjects.filter(emuIsLive);
+    }
+}
+
+// Actions, observations and action availability by index. These are 
+// populated by the emulator on load.
+var emuActions = [];
+var emuObservers = [];
+var emuAvailability = [];
+
+// Compiled accessors for fixed lists of fields, each returning its values as 
+// a JSON array. These are registered by the emulator as they're needed.
+var emuAccessors = [];
+
+// Returns the fields obsIds followed by the availability of actions acIds as 
+// a single array.
+function emuObserve(obsIds, acIds) {
+    var packed = [];
+    for (var i = 0; i < obsIds.length; i++) {
+        packed.push(emuObservers[obsIds[i]]());
+    }
+    for (var i = 0; i < acIds.length; i++) {
+        packed.push(+emuAvailability[acIds[i]]());
+    }
+    return packed;
+}
+
+// Takes an action and advances time by dtCs either side of observing the 
+// fields obsIds and availability of actions acIds. Returns the observations
+// followed by the availabilities as a single array.
+function stepFused(actionIndex, dtCs, obsIds, acIds) {
+    emuActions[actionIndex]();
+    emuAdvanceTime(dtCs);
+    var packed = emuObserve(obsIds, acIds);
+    emuAdvanceTime(dtCs);
+    return packed;
+}
+
+//@EMUADDITION
+// Resetter agents. Stages are played by the policy networks of the agents 
+// loaded by the emulator, step by step as the environment would play them, 
+// without leaving the JS context. Each stage has its policy, if it has an 
+// agent, the fields it observes with the factors that normalise them, its 
+// actions, half its step length and the conditions for advancing to the 
+// next stage.
+var emuResetterStages = [];
+var emuResetterRngState = [0, 0, 0, 1];
+emuUnsnapshotted.push("emuResetterStages", "emuResetterRngState");
+
+function emuLoadResetter(stages) {
+    for (var s = 0; s < stages.length; s++) {
+        var policy = stages[s].policy;
+        if (policy == null) {
+            continue;
+        }
+        policy.mean = new Float64Array(policy.mean);
+        policy.std = new Float64Array(policy.std);
+        for (var l = 0; l < policy.weights.length; l++) {
+            // Weights are flattened row by row, one row per input
+            var w = policy.weights[l];
+            var flat = new Float64Array(w.length*w[0].length);
+            for (var i = 0; i < w.length; i++) {
+                flat.set(w[i], i*w[0].length);
+            }
+            policy.weights[l] = flat;
+            policy.biases[l] = new Float64Array(policy.biases[l]);
+        }
+    }
+    emuResetterStages = stages;
+}
+
+// The resetter's own generator, so that seeding it doesn't disturb the game's
+function emuResetterRandom() {
+    var gameRngState = emuRngState;
+    emuRngState = emuResetterRngState;
+    var u = emuRandom();
+    emuRngState = gameRngState;
+    return u;
+}
+
+function emuSeedResetter(seed) {
+    var gameRngState = emuRngState;
+    emuRngState = emuResetterRngState;
+    emuSeed(seed);
+    emuRngState = gameRngState;
+}
+
+// Normalised observation and action availability of stage s
+function emuResetterObserve(s) {
+    var stage = emuResetterStages[s];
+    var ob = new Float64Array(stage.obsIds.length);
+    for (var i = 0; i < ob.length; i++) {
+        ob[i] = emuObservers[stage.obsIds[i]]()*stage.obsFactors[i];
+    }
+    var avail = new Array(stage.acIds.length);
+    for (var i = 0; i < avail.length; i++) {
+        avail[i] = +emuAvailability[stage.acIds[i]]() > 0;
+    }
+    return {ob: ob, avail: avail};
+}
+
+// Samples an action from the policy as MlpPolicy does: the observation is 
+// filtered and clipped, passed through the tanh layers, and the action is 
+// picked from the logits of the available actions by the Gumbel-max trick.
+function emuResetterAct(policy, ob, avail) {
+    var x = new Float64Array(ob.length);
+    for (var i = 0; i < ob.length; i++) {
+        x[i] = Math.min(Math.max((ob[i]-policy.mean[i])/policy.std[i], -5.0), 5.0);
+    }
+    var nLayers = policy.weights.length;
+    for (var l = 0; l < nLayers; l++) {
+        var w = policy.weights[l];
+        var b = policy.biases[l];
+        var y = new Float64Array(b);
+        for (var i = 0; i < x.length; i++) {
+            var xi = x[i];
+            var row = i*b.length;
+            for (var j = 0; j < b.length; j++) {
+                y[j] += xi*w[row+j];
+            }
+        }
+        if (l < nLayers-1) {
+            for (var j = 0; j < y.length; j++) {
+                y[j] = Math.tanh(y[j]);
+            }
+        }
+        x = y;
+    }
+    
+    // Unavailable actions can never be chosen, unless none are available
+    var anyAvail = avail.indexOf(true) >= 0;
+    var best = 0;
+    var bestScore = -Infinity;
+    for (var j = 0; j < x.length; j++) {
+        var u = emuResetterRandom();
+        if (anyAvail && !avail[j]) {
+            continue;
+        }
+        var score = x[j] - Math.log(-Math.log(u));
+        if (score > bestScore) {
+            best = j;
+            bestScore = score;
+        }
+    }
+    return best;
+}
+
+// The stage reached from stage s by its conditions for advancing, which 
+// cascade as with UPEnv._update_stage
+function emuResetterUpdateStage(s, finalStage) {
+    if (s == finalStage) {
+        return s;
+    }
+    while (emuResetterStages[s].advance != null) {
+        var advance = emuResetterStages[s].advance;
+        for (var i = 0; i < advance.ids.length; i++) {
+            var value = emuObservers[advance.ids[i]]();
+            if (advance.atLeast[i] ? !(value >= advance.values[i]) : value != advance.values[i]) {
+                return s;
+            }
+        }
+        s++;
+    }
+    return s;
+}
+
+// Plays from stage s until targetStage is reached, the game time passes 
+// maxGameTime, or, with stopOnStageChange, the stage changes. Each step 
+// takes an action, advances time by half a step, observes and checks the 
+// stage, then advances time the rest of the way. The next action is taken 
+// from the observation half way through the step, unless the stage changed,
+// in which case the new stage's observation is made at the end of the step.
+function emuPlayStages(s, targetStage, finalStage, gameTime, maxGameTime, stopOnStageChange) {
+    var seen = emuResetterObserve(s);
+    var nSteps = 0;
+    var stageTimes = [];
+    while (s < targetStage) {
+        var stage = emuResetterStages[s];
+        var ac = emuResetterAct(stage.policy, seen.ob, seen.avail);
+        gameTime += stage.actionInterval;
+        emuActions[stage.acIds[ac]]();
+        emuAdvanceTime(stage.dtCs);
+        seen = emuResetterObserve(s);
+        var sNext = emuResetterUpdateStage(s, finalStage);
+        emuAdvanceTime(stage.dtCs);
+        nSteps++;
+        
+        var stageChanged = sNext != s;
+        if (stageChanged) {
+            s = sNext;
+            stageTimes.push([s, gameTime]);
+            seen = emuResetterObserve(s);
+        }
+        if ((stageChanged && stopOnStageChange) || gameTime > maxGameTime) {
+            break;
+        }
+    }
+    return {stage: s, gameTime: gameTime, nSteps: nSteps, stageTimes: stageTimes};
+}
+
 function load1() {
     
     var loadGame = JSON.parse(localStorage.getItem("saveGame1"));
@@ -5589,6 +6488,8 @@ function load1() {
     projects[i].flag = loadProjectsFlags[i]; 
         
     }
+    //@EMUADDITION
+    emuLiveProjectsDirty = true;
     
     for(var i=0; i < projects.length; i++){
     
@@ -5895,6 +6796,8 @@ function load2() {
     projects[i].flag = loadProjectsFlags[i]; 
         
     }
+    //@EMUADDITION
+    emuLiveProjectsDirty = true;
     
     for(var i=0; i < projects.length; i++){
     
@@ -0,0 +1,53 @@
+//@EMUADDITION
+// Seedable xorshift128+ generator in place of Math.random. Its two 64-bit 
+// words are held as 32-bit halves, high half first, and are part of 
+// snapshots and saves. Unless seeded, it's seeded from the native generator.
+// This is evaluated before the game sources, so that everything they 
+// randomise when loaded, such as the combat ships, is drawn from it.
+var emuNativeRandom = Math.random;
+var emuRngState = [0, 0, 0, 0];
+
+function emuRandom() {
+    var s1h = emuRngState[0], s1l = emuRngState[1];
+    var s0h = emuRngState[2], s0l = emuRngState[3];
+    emuRngState[0] = s0h;
+    emuRngState[1] = s0l;
+    
+    // s1 ^= s1 << 23
+    s1h ^= (s1h << 23) | (s1l >>> 9);
+    s1l ^= s1l << 23;
+    
+    // s1 ^ s0 ^ (s1 >> 17) ^ (s0 >> 26)
+    var th = s1h ^ s0h ^ (s1h >>> 17) ^ (s0h >>> 26);
+    var tl = s1l ^ s0l ^ ((s1l >>> 17) | (s1h << 15)) ^ ((s0l >>> 26) | (s0h << 6));
+    emuRngState[2] = th;
+    emuRngState[3] = tl;
+    
+    // Top 53 bits of the sum of the new s1 and s0
+    var sumL = (tl >>> 0) + (s0l >>> 0);
+    var sumH = (th + s0h + (sumL > 0xFFFFFFFF ? 1 : 0)) >>> 0;
+    return (sumH*2097152 + ((sumL >>> 0) >>> 11))/9007199254740992;
+}
+
+function emuSeed(seed) {
+    // Spread the seed over the state words
+    var x = seed >>> 0;
+    for (var i = 0; i < 4; i++) {
+        x = (x + 0x9E3779B9) | 0;
+        var z = Math.imul(x ^ (x >>> 16), 0x85EBCA6B);
+        z = Math.imul(z ^ (z >>> 13), 0xC2B2AE35);
+        emuRngState[i] = z ^ (z >>> 16);
+    }
+    if ((emuRngState[0] | emuRngState[1] | emuRngState[2] | emuRngState[3]) == 0) {
+        emuRngState[3] = 1;
+    }
+}
+
+function emuSetRngState(state) {
+    for (var i = 0; i < 4; i++) {
+        emuRngState[i] = state[i];
+    }
+}
+
+emuSeed(Math.floor(emuNativeRandom()*4294967296));
+Math.random = emuRandom;
@@ -1,96 +1,91 @@
 from upb.game.UPGameHandler import *
 from upb.emu.UPEmulator import *
+from upb.util.UPStateStore import UPStateStore
+from upb.game.AsyncUPGameHandler import AsyncUPGameHandler
 from gym import Env
 from gym.spaces import Discrete, Box
 import numpy as np
-from datetime import datetime
 import time
+import asyncio
 from collections import OrderedDict
 import pickle
 
-# To microsecond precision
-# @fixme Resets at the month boundary
+# Monotonic, so that action deadlines aren't upset by changes to the clock
 def timeSeconds():
-    dt = datetime.now()
-    time_s = dt.day*86400.0
-    time_s += dt.hour*3600.0
-    time_s += dt.minute*60.0
-    time_s += dt.second
-    time_s += dt.microsecond/1000000.0;
-    return time_s
+    return time.monotonic()
 
 class UPObservationSpace(Box):
-    def __init__(self, observation_names):
-        # Set up approximate ranges for possible observations
-        self._observation_ranges = {
-            'Unsold Inventory': [0, 1.0e3],
-            'Price per Clip': [0, 1.0],
-            'Public Demand': [0, 1.0e3],
-            'Marketing Level': [0, 1.0e2],
-            'Marketing Cost': [0, 1.0e2],
-            'Manufacturing Clips per Second': [0, 1.0e4],
-            'Wire Inches': [0, 1.0e4],
-            'Wire Cost': [0, 1.0e2],
-            'Number of Autoclippers': [0, 1.0e2],
-            'Autoclipper Cost': [0, 1.0e4],
-            'Paperclips': [0, 1.0e6],
-            'Available Funds': [0, 1.0e6],
-            'Processors': [0, 1.0e2],
-            'Memory': [0, 1.0e2],
-            'Trust': [0, 1.0e2],
-            'Next Trust': [0, 1.0e6],
-            'Operations': [0, 1.0e4],
-            'Creativity': [0, 1.0e4],
-            'Investment Bankroll': [0, 1e6],
-            'Stocks': [0, 1e6],
-            'Investment Engine Level': [0, 10],
-            'Investment Engine Upgrade Cost': [0, 1e4],
-            'MegaClipper Cost': [500.0, 1e6],
-            'Number of MegaClippers': [0, 1.0e2],
-            'Riskiness': [1., 7.],
-            'Number of Photonic Chips': [0, 10.],
-            'Latest QOps': [0,1e4],
-            'Photonic Chip 0 Level': [-1., 1.],
-            'Yomi': [0, 1e5],
-            'Tournament Cost': [0, 1e5],
-            'Improved AutoClippers Activated': [0,1.],
-            'Beg for More Wire Activated': [0,1.],
-            'Creativity Activated': [0,1.],
-            'Even Better AutoClippers Activated': [0,1.],
-            'Optimized AutoClippers Activated': [0,1.],
-            'Limerick Activated': [0,1.],
-            'Improved Wire Extrusion Activated': [0,1.],
-            'Optimized Wire Extrusion Activated': [0,1.],
-            'Microlattice Shapecasting Activated': [0,1.],
-            'Quantum Foam Annealment Activated': [0,1.],
-            'New Slogan Activated': [0,1.],
-            'Catchy Jingle Activated': [0,1.],
-            'Lexical Processing Activated': [0,1.],
-            'Combinatory Harmonics Activated': [0,1.],
-            'The Hadwiger Problem Activated': [0,1.],
-            'The Toth Sausage Conjecture Activated': [0,1.],
-            'Hadwiger Clip Diagrams Activated': [0,1.],
-            'Donkey Space Activated': [0,1.],
-            'Algorithmic Trading Activated': [0,1.],
-            'WireBuyer Activated': [0,1.],
-            'Hypno Harmonics Activated': [0,1.],
-            'RevTracker Activated': [0,1.],
-            'Quantum Computing Activated': [0,1.],
-            'Spectral Froth Annealment Activated': [0,1.],
-            'MegaClippers Activated': [0,1.],
-            'Improved MegaClippers Activated': [0,1.],
-            'Strategic Modeling Activated': [0,1.],            
-            'New Strategy: A100 Activated': [0,1.]
-        }
+    # Approximate ranges for possible observations
+    _observation_ranges = {
+        'Unsold Inventory': [0, 1.0e3],
+        'Price per Clip': [0, 1.0],
+        'Public Demand': [0, 1.0e3],
+        'Marketing Level': [0, 1.0e2],
+        'Marketing Cost': [0, 1.0e2],
+        'Manufacturing Clips per Second': [0, 1.0e4],
+        'Wire Inches': [0, 1.0e4],
+        'Wire Cost': [0, 1.0e2],
+        'Number of Autoclippers': [0, 1.0e2],
+        'Autoclipper Cost': [0, 1.0e4],
+        'Paperclips': [0, 1.0e6],
+        'Available Funds': [0, 1.0e6],
+        'Processors': [0, 1.0e2],
+        'Memory': [0, 1.0e2],
+        'Trust': [0, 1.0e2],
+        'Next Trust': [0, 1.0e6],
+        'Operations': [0, 1.0e4],
+        'Creativity': [0, 1.0e4],
+        'Investment Bankroll': [0, 1e6],
+        'Stocks': [0, 1e6],
+        'Investment Engine Level': [0, 10],
+        'Investment Engine Upgrade Cost': [0, 1e4],
+        'MegaClipper Cost': [500.0, 1e6],
+        'Number of MegaClippers': [0, 1.0e2],
+        'Riskiness': [1., 7.],
+        'Number of Photonic Chips': [0, 10.],
+        'Latest QOps': [0,1e4],
+        'Photonic Chip 0 Level': [-1., 1.],
+        'Yomi': [0, 1e5],
+        'Tournament Cost': [0, 1e5],
+        'Improved AutoClippers Activated': [0,1.],
+        'Beg for More Wire Activated': [0,1.],
+        'Creativity Activated': [0,1.],
+        'Even Better AutoClippers Activated': [0,1.],
+        'Optimized AutoClippers Activated': [0,1.],
+        'Limerick Activated': [0,1.],
+        'Improved Wire Extrusion Activated': [0,1.],
+        'Optimized Wire Extrusion Activated': [0,1.],
+        'Microlattice Shapecasting Activated': [0,1.],
+        'Quantum Foam Annealment Activated': [0,1.],
+        'New Slogan Activated': [0,1.],
+        'Catchy Jingle Activated': [0,1.],
+        'Lexical Processing Activated': [0,1.],
+        'Combinatory Harmonics Activated': [0,1.],
+        'The Hadwiger Problem Activated': [0,1.],
+        'The Toth Sausage Conjecture Activated': [0,1.],
+        'Hadwiger Clip Diagrams Activated': [0,1.],
+        'Donkey Space Activated': [0,1.],
+        'Algorithmic Trading Activated': [0,1.],
+        'WireBuyer Activated': [0,1.],
+        'Hypno Harmonics Activated': [0,1.],
+        'RevTracker Activated': [0,1.],
+        'Quantum Computing Activated': [0,1.],
+        'Spectral Froth Annealment Activated': [0,1.],
+        'MegaClippers Activated': [0,1.],
+        'Improved MegaClippers Activated': [0,1.],
+        'Strategic Modeling Activated': [0,1.],            
+        'New Strategy: A100 Activated': [0,1.]
+    }
 
+    def __init__(self, observation_names):
         # Order keys
         self._keys = observation_names
         self._nkeys = len(self._keys)
-        low = np.zeros(self._nkeys)
-        high = np.zeros(self._nkeys)
-        for i in range(self._nkeys):
-            low[i] = self._observation_ranges[self._keys[i]][0]
-            high[i] = self._observation_ranges[self._keys[i]][1]
+        low = np.array([self._observation_ranges[key][0] for key in self._keys], dtype=np.float64)
+        high = np.array([self._observation_ranges[key][1] for key in self._keys], dtype=np.float64)
+        
+        # Observations are normalised by the top of their range
+        self._scale = high.copy()
             
         # Construct
         super(UPObservationSpace, self).__init__(low, high)
@@ -98,26 +93,24 @@ class UPObservationSpace(Box):
     def getPossibleObservations(self):
         return self._keys
         
-    def observationAsArray(self, observation):
-        obs_array = np.zeros(self._nkeys)
-        for i in range(self._nkeys):
-            obs_array[i] = observation[self._keys[i]]
-            # Normalise
-            obs_array[i] /= self._observation_ranges[self._keys[i]][1]
-        return obs_array
+    def observationAsArray(self, observation, out=None, dtype=np.float64):
+        """The normalised observation as an array, written to out if given, 
+        otherwise to a new array of the given dtype.
+        """
+        if out is None:
+            out = np.empty(self._nkeys, dtype=dtype)
+        out[:] = [observation[key] for key in self._keys]
+        np.divide(out, self._scale, out=out)
+        return out
         
     def observationAsOrderedDict(self, obs_array):
-        obs_dict = OrderedDict()
-        for i in range(self._nkeys):
-            obs_dict[self._keys[i]] = obs_array[i]
-            # Denormalise
-            obs_dict[self._keys[i]] *= self._observation_ranges[self._keys[i]][1]
-        return obs_dict
+        # Denormalise
+        return OrderedDict(zip(self._keys, (np.asarray(obs_array)*self._scale).tolist()))
         
     def observationAsString(self, obs_array):
         obs = ""
-        for i in range(self._nkeys):
-            obs += "{}={:1.2g},".format(self._keys[i], obs_array[i]*self._observation_ranges[self._keys[i]][1])
+        for key, val in zip(self._keys, np.asarray(obs_array)*self._scale):
+            obs += "{}={:1.2g},".format(key, val)
         return obs
         
     def getObservationName(self, i):
@@ -357,6 +350,30 @@ class UPEnv(Env):
     _stage_6_projects_ac = ["Activate "+proj for proj in _stage_6_projects]
     _observation_names_stages.append(_core_observation_set_2+_stage_6_projects_obs)
     _action_names_stages.append(_core_action_set_2+_stage_6_projects_ac)
+    
+    # Projects that determine the wire per spool, in order of precedence
+    _wire_per_spool_projects = [
+        ('Quantum Foam Annealment', 173250),
+        ('Spectral Froth Annealment', 15750),
+        ('Microlattice Shapecasting', 5250),
+        ('Optimized Wire Extrusion', 2625),
+        ('Improved Wire Extrusion', 1500)
+    ]
+    
+    # Every observation that stage updates, observations and rewards can 
+    # require within a single step
+    _step_observation_names = ['Paperclips']
+    for names in _observation_names_stages:
+        _step_observation_names += names
+    for projs in [_stage_2_required_projects, _stage_3_required_projects, 
+                  _stage_4_required_projects, _stage_5_required_projects, 
+                  _stage_6_required_projects, [proj for proj, wire in _wire_per_spool_projects]]:
+        _step_observation_names += [proj+" Activated" for proj in projs]
+    _step_observation_names = list(OrderedDict.fromkeys(_step_observation_names))
+    
+    # Spaces of each stage, which are built once and shared
+    _observation_spaces_stages = [UPObservationSpace(names) for names in _observation_names_stages]
+    _action_spaces_stages = [UPActionSpace(names) for names in _action_names_stages]
        
     def __init__(self,
                  url,
@@ -370,32 +387,70 @@ class UPEnv(Env):
                  webdriver_name='Chrome',
                  webdriver_path=None,
                  headless=False,
-                 verbose=False):
+                 state_extraction='html',
+                 availability='buttons',
+                 action_dispatch='clicks',
+                 virtual_clock=False,
+                 time_dilation=None,
+                 driver_pool=None,
+                 verbose=False,
+                 handler=None,
+                 stage_cache=None,
+                 native_resetters=False):
         
         # Set url where the game is hosted
         self._url = url
         
-        # Fresh game handler
+        # Fresh game handler, unless one is supplied
         self._use_emulator = use_emulator
-        if use_emulator:
+        if handler != None:
+            self._handler = handler
+        elif use_emulator:
             self._handler = UPEmulator()
         else:
             self._handler = UPGameHandler(self._url, 
                                           webdriver_name=webdriver_name,
                                           webdriver_path=webdriver_path,
                                           headless=headless, 
-                                          verbose=verbose)
+                                          verbose=verbose,
+                                          state_extraction=state_extraction,
+                                          availability=availability,
+                                          action_dispatch=action_dispatch,
+                                          virtual_clock=virtual_clock,
+                                          time_dilation=time_dilation,
+                                          driver_pool=driver_pool)
+        
+        # Whether game time is driven by the handler, rather than passing in 
+        # real time
+        self._virtual_time = use_emulator or self._handler.virtual_clock
+        
+        # Coroutine versions of the handler's calls, made on first use, and 
+        # real time action deadlines
+        self._async_handler = None
+        self._action_deadline = None
+        self._deadline_stats = {'n_deadlines': 0, 'n_missed': 0, 'total_lateness': 0.0, 'max_lateness': 0.0}
+        
+        # Values fetched for the step in progress
+        self._step_observation = None
+        
+        # Source of initial state choices and, with the emulator, the seed 
+        # of the game for each episode
+        self._np_random = np.random.RandomState()
         
         # Other
         self._episode_length = episode_length
         self._action_rate_speedup = action_rate_speedup
         self._verbose = verbose
         
-        # Initial states
+        # Initial states, either from a state store, which are only read as 
+        # they're needed, or from a pickled list
         self._init_states = None
         if initial_states_filename != None:
-            with open(initial_states_filename, 'rb') as f:
-                self._init_states = pickle.load(f)            
+            if UPStateStore.isStore(initial_states_filename):
+                self._init_states = UPStateStore(initial_states_filename)
+            else:
+                with open(initial_states_filename, 'rb') as f:
+                    self._init_states = pickle.load(f)            
         
         # Parameters for working up to a given stage
         if initial_stage != len(resetter_agents):
@@ -403,6 +458,52 @@ class UPEnv(Env):
         self._initial_stage = initial_stage
         self._final_stage = final_stage
         self._resetter_agents = resetter_agents
+        
+        # States saved during stage advancement to start later advancement 
+        # from, which may be shared with other environments
+        if stage_cache != None and not use_emulator:
+            raise Exception("A stage cache can only be used with the emulator.")
+        self._stage_cache = stage_cache
+        
+        # With the emulator, resetter agents can play their stages inside 
+        # the JS context rather than step by step from Python
+        if native_resetters and not use_emulator:
+            raise Exception("Native resetter agents can only be used with the emulator.")
+        self._native_resetters = native_resetters
+        if native_resetters and initial_stage > 0:
+            self._handler.loadResetterAgents(resetter_agents, self._stageRules())
+    
+    def _stageRules(self):
+        """The observations, actions, action interval and conditions for 
+        advancing to the next stage of every stage, as applied by 
+        _update_stage, for UPEmulator.loadResetterAgents.
+        """
+        required_projects_stages = [self._stage_2_required_projects, self._stage_3_required_projects,
+                                    self._stage_4_required_projects, self._stage_5_required_projects,
+                                    self._stage_6_required_projects]
+        stages = []
+        for stage in range(len(self._observation_names_stages)):
+            if stage == 0:
+                advance = [('Paperclips', 2000, True)]
+            elif stage <= len(required_projects_stages):
+                advance = [(proj+" Activated", 1, False) for proj in required_projects_stages[stage-1]]
+            else:
+                advance = None
+            ob_space = self._observation_spaces_stages[stage]
+            stages.append({
+                'observations': ob_space.getPossibleObservations(),
+                'scales': ob_space._scale.tolist(),
+                'actions': self._action_names_stages[stage],
+                'action_interval': self._action_intervals_stages[stage]/self._action_rate_speedup,
+                'advance': advance
+            })
+        return stages
+    
+    def _setStage(self, stage):
+        self._stage = stage
+        self._observation_names = self._observation_names_stages[self._stage]
+        self._action_names = self._action_names_stages[self._stage]
+        self._desired_action_interval = self._action_intervals_stages[self._stage]/self._action_rate_speedup
     
     def _update_stage(self):
         stage_changed = False
@@ -412,7 +513,7 @@ class UPEnv(Env):
         
         # Update rule for stage 0 -> 1: onset of trust
         if self._stage == 0:
-            observation_from_handler = self._handler.makeObservation(['Paperclips'])
+            observation_from_handler = self._observeFields(['Paperclips'])
             clips = observation_from_handler['Paperclips']
             if clips >= 2000:
                 self._stage = 1
@@ -423,7 +524,7 @@ class UPEnv(Env):
         # Update rule for stage 1 -> 2   
         if self._stage == 1:
             required_projects_obs = [proj+" Activated" for proj in self._stage_2_required_projects]
-            observation_from_handler = self._handler.makeObservation(required_projects_obs)
+            observation_from_handler = self._observeFields(required_projects_obs)
             all_projects_activated = True
             for name, obs in observation_from_handler.items():
                 if obs != 1:
@@ -437,7 +538,7 @@ class UPEnv(Env):
         # Update rule for stage 2 -> 3
         if self._stage == 2:
             required_projects_obs = [proj+" Activated" for proj in self._stage_3_required_projects]
-            observation_from_handler = self._handler.makeObservation(required_projects_obs)
+            observation_from_handler = self._observeFields(required_projects_obs)
             all_projects_activated = True
             for name, obs in observation_from_handler.items():
                 if obs != 1:
@@ -451,7 +552,7 @@ class UPEnv(Env):
         # Update rule for stage 3 -> 4
         if self._stage == 3:
             required_projects_obs = [proj+" Activated" for proj in self._stage_4_required_projects]
-            observation_from_handler = self._handler.makeObservation(required_projects_obs)
+            observation_from_handler = self._observeFields(required_projects_obs)
             all_projects_activated = True
             for name, obs in observation_from_handler.items():
                 if obs != 1:
@@ -465,7 +566,7 @@ class UPEnv(Env):
         # Update rule for stage 4 -> 5
         if self._stage == 4:
             required_projects_obs = [proj+" Activated" for proj in self._stage_5_required_projects]
-            observation_from_handler = self._handler.makeObservation(required_projects_obs)
+            observation_from_handler = self._observeFields(required_projects_obs)
             all_projects_activated = True
             for name, obs in observation_from_handler.items():
                 if obs != 1:
@@ -479,7 +580,7 @@ class UPEnv(Env):
         # Update rule for stage 5 -> 6
         if self._stage == 5:
             required_projects_obs = [proj+" Activated" for proj in self._stage_6_required_projects]
-            observation_from_handler = self._handler.makeObservation(required_projects_obs)
+            observation_from_handler = self._observeFields(required_projects_obs)
             all_projects_activated = True
             for name, obs in observation_from_handler.items():
                 if obs != 1:
@@ -504,11 +605,11 @@ class UPEnv(Env):
             raise Exception("Insufficient number of resetter agents ({}) for target stage ({}).".format(len(agents), target_stage))
         
         # Initial values
-        self._prev_act_time = None
+        self._action_deadline = None
         self._n_steps_taken = 0
         
         # Initial observation
-        ob_space = UPObservationSpace(self._observation_names_stages[self._stage])
+        ob_space = self._observation_spaces_stages[self._stage]
         observation_from_handler = self._handler.makeObservation(ob_space.getPossibleObservations())
         self._prev_observation_from_handler = observation_from_handler        
         ob = ob_space.observationAsArray(observation_from_handler)
@@ -529,6 +630,12 @@ class UPEnv(Env):
         else:
             raise NotImplementedError("No definition for stage 7+.")
         
+        # Advance inside the emulator
+        if self._native_resetters:
+            self._advanceToStageNative(target_stage, max_game_time)
+            print("Completed initial stage advancement after {} seconds.".format(self._game_time))
+            return
+        
         # Advance
         stochastic = True
         prev_stage = self._stage
@@ -539,23 +646,27 @@ class UPEnv(Env):
             ob, rew, done, info = self._step(ac, self._stage)
             ac_avail = info["Available Actions"]
             
-            # Observe in new observation space if stage changed
+            # Observe in new observation space if stage changed, and keep the
+            # state for later advancement
             if prev_stage != self._stage:
-                ob_space = UPObservationSpace(self._observation_names_stages[self._stage])
+                ob_space = self._observation_spaces_stages[self._stage]
                 observation_from_handler = self._handler.makeObservation(ob_space.getPossibleObservations())
                 ob = ob_space.observationAsArray(observation_from_handler)
                 ac_avail = self.getAvailableActions(self._stage)
+                if self._stage_cache != None:
+                    self._stage_cache.add(self._stage, self.getStateAsString(), self._game_time, self._np_random)
             
             # Restart if failed to get to next stage quickly enough
             #~ print(self._game_time)
             if self._game_time > max_game_time:
                 print("WARNING: Timed out in stage {}. Resetting and trying fresh.".format(self._stage))
                 self._n_steps_taken = 0
-                self._prev_act_time = None
+                self._action_deadline = None
                 self._handler.reset()
                 self._stage = 0
                 self._game_time = 0.0
-                ob_space = UPObservationSpace(self._observation_names_stages[self._stage])
+                self._loadCachedStage(target_stage)
+                ob_space = self._observation_spaces_stages[self._stage]
                 observation_from_handler = self._handler.makeObservation(ob_space.getPossibleObservations())
                 self._prev_observation_from_handler = observation_from_handler        
                 ob = ob_space.observationAsArray(observation_from_handler)
@@ -569,10 +680,68 @@ class UPEnv(Env):
         
         print("Completed initial stage advancement after {} seconds.".format(self._game_time))
     
+    def _advanceToStageNative(self, target_stage, max_game_time):
+        """As _advance_to_stage, with the resetter agents playing in the 
+        emulator's JS context, which only returns to keep the state at each
+        stage change for the stage cache or to restart after timing out.
+        """
+        stop_on_stage_change = self._stage_cache != None
+        while self._stage < target_stage:
+            prev_stage = self._stage
+            stage, self._game_time, stage_times = self._handler.playStages(self._stage, target_stage, 
+                                                                           self._final_stage, self._game_time,
+                                                                           max_game_time, stop_on_stage_change, 
+                                                                           self._np_random.randint(2**31))
+            self._setStage(stage)
+            if self._verbose:
+                for stage, game_time in stage_times:
+                    print("Advanced to stage {} after {} seconds.".format(stage, game_time))
+            
+            # Keep the state for later advancement
+            if self._stage != prev_stage and self._stage_cache != None:
+                self._stage_cache.add(self._stage, self.getStateAsString(), self._game_time, self._np_random)
+            
+            # Restart if failed to get to next stage quickly enough
+            if self._game_time > max_game_time:
+                print("WARNING: Timed out in stage {}. Resetting and trying fresh.".format(self._stage))
+                self._handler.reset()
+                self._setStage(0)
+                self._game_time = 0.0
+                self._loadCachedStage(target_stage)
+    
     def _loadInitialState(self):
         if self._init_states != None:
-            init_state = np.random.choice(self._init_states)
+            if isinstance(self._init_states, UPStateStore):
+                init_state = self._init_states.sample(self._np_random)
+            else:
+                init_state = self._np_random.choice(self._init_states)
             self.loadStateFromString(init_state)
+            
+            # Reseed, so episodes from the same initial state don't share 
+            # the generator state it was saved with
+            if self._use_emulator:
+                self._handler.seed(self._np_random.randint(2**31))
+    
+    def _loadCachedStage(self, target_stage):
+        """Load a state from the stage cache to advance to target_stage from,
+        if it offers one.
+        
+        :returns: True if a state was loaded.
+        """
+        if self._stage_cache == None or target_stage == 0:
+            return False
+        cached = self._stage_cache.sample(target_stage, self._np_random)
+        if cached == None:
+            return False
+        stage, state_string, game_time = cached
+        self.loadStateFromString(state_string)
+        self._handler.seed(self._np_random.randint(2**31))
+        self._stage = 0
+        self._update_stage()
+        self._game_time = game_time
+        if self._verbose:
+            print("Starting stage advancement from cached stage {} after {} seconds.".format(self._stage, self._game_time))
+        return True
     
     def _reset(self):
         """
@@ -582,18 +751,25 @@ class UPEnv(Env):
         observation : the initial observation of the space. (Initial reward is assumed to be 0.)
         """
         
+        # Seed the game for this episode. The emulator's generator carries on
+        # through its reset.
+        if self._use_emulator:
+            self._handler.seed(self._np_random.randint(2**31))
+        
         # Reset handler
         self._handler.reset()
+        self._stage = 0
+        self._game_time = 0.0
         
-        # Load an initial state to handler if available and possible
-        self._loadInitialState()
+        # Start from a cached stage if there is one, otherwise load an 
+        # initial state to handler if available and possible
+        if not self._loadCachedStage(self._initial_stage):
+            self._loadInitialState()
         
         # Set correct initial stage
-        self._stage = 0
         self._update_stage()      
         
         # Advance to initial stage
-        self._game_time = 0.0
         if self._initial_stage != 0:
             self._advance_to_stage(self._initial_stage, self._resetter_agents)
         self._desired_action_interval = self._action_intervals_stages[self._initial_stage]/self._action_rate_speedup
@@ -604,15 +780,22 @@ class UPEnv(Env):
         
         # Initial values
         self._prev_observation_from_handler = observation_from_handler
-        self._prev_act_time = None
+        self._action_deadline = None
         self._n_steps_taken = 0
         
         # Return
         return observation
     
+    def _observeFields(self, fields):
+        """Observe from the values fetched for the step in progress if there 
+        are any, otherwise from the handler.
+        """
+        if self._step_observation == None:
+            return self._handler.makeObservation(fields)
+        return OrderedDict([(field, self._step_observation[field]) for field in fields])
+    
     def reward(self):
-        ob_space = UPObservationSpace(self._observation_names_stages[self._stage])
-        observation_from_handler = self._handler.makeObservation(ob_space.getPossibleObservations())
+        observation_from_handler = self._observeFields(self._observation_names_stages[self._stage])
         if self._stage >= 0 and self._stage <= 3:
             reward = self.assetsAndCashReward(observation_from_handler)
             if self._stage == 0:
@@ -647,27 +830,12 @@ class UPEnv(Env):
         return self.cashReward(observation_from_handler) + self.assetsRewardStage5Plus(observation_from_handler)
     
     def _getWirePerSpool(self):
-        wire_obs = [
-            'Quantum Foam Annealment Activated',
-            'Spectral Froth Annealment Activated',
-            'Microlattice Shapecasting Activated',
-            'Optimized Wire Extrusion Activated',
-            'Improved Wire Extrusion Activated'
-        ]
-        obs = self._handler.makeObservation(wire_obs)    
-        if obs['Quantum Foam Annealment Activated'] == 1:
-            wire_per_spool = 173250
-        elif obs['Spectral Froth Annealment Activated'] == 1:
-            wire_per_spool = 15750
-        elif obs['Microlattice Shapecasting Activated'] == 1:
-            wire_per_spool = 5250
-        elif obs['Optimized Wire Extrusion Activated'] == 1:
-            wire_per_spool = 2625
-        elif obs['Improved Wire Extrusion Activated'] == 1:
-            wire_per_spool = 1500
-        else:
-            wire_per_spool = 1000
-        return wire_per_spool
+        wire_obs = [proj+" Activated" for proj, wire in self._wire_per_spool_projects]
+        obs = self._observeFields(wire_obs)
+        for proj, wire in self._wire_per_spool_projects:
+            if obs[proj+" Activated"] == 1:
+                return wire
+        return 1000
     
     def assetsReward(self, observation_from_handler):        
         dassets = 0.0
@@ -739,11 +907,11 @@ class UPEnv(Env):
     
     def observe(self, stage=None):
         if stage == None:
-            observation_from_handler = self._handler.makeObservation(self.observation_space.getPossibleObservations())
+            observation_from_handler = self._observeFields(self.observation_space.getPossibleObservations())
             observation = self.observation_space.observationAsArray(observation_from_handler)
         else:
-            ob_space = UPObservationSpace(self._observation_names_stages[stage])
-            observation_from_handler = self._handler.makeObservation(ob_space.getPossibleObservations())
+            ob_space = self._observation_spaces_stages[stage]
+            observation_from_handler = self._observeFields(ob_space.getPossibleObservations())
             observation = ob_space.observationAsArray(observation_from_handler)
         return observation_from_handler, observation
     
@@ -763,48 +931,146 @@ class UPEnv(Env):
         info : a dictionary containing other diagnostic information from the previous action
         """
         # Timing control
+        time_remaining = self._scheduleAction()
+        if time_remaining > 0:
+            time.sleep(time_remaining)
+        
+        # Act
+        action_for_handler, action_names = self._actionForHandler(action, stage)
+        if self._virtual_time:
+            # Act, advance time half way to resolve purchases, etc., fetch
+            # everything needed for the rest of the step, and advance time 
+            # the rest of the way, all in one call
+            self._step_observation, ac_avail = self._handler.stepFused(action_for_handler, 
+                                                                       self._desired_action_interval/2.0,
+                                                                       self._step_observation_names,
+                                                                       action_names)
+        else:
+            # Act, then fetch everything needed for the rest of the step in
+            # one go
+            self._step_observation, ac_avail = self._handler.actFused(action_for_handler,
+                                                                      self._step_observation_names,
+                                                                      action_names)
+        if self._verbose:
+            print("Took action {}.".format(action_for_handler))
+        
+        return self._completeStep(stage, ac_avail)
+    
+    async def astep(self, action, stage=None, scheduled=False):
+        """As _step, but as a coroutine that waits for the action's deadline
+        and for the browser without blocking, so that agents and other games 
+        can run in the meantime.
+        
+        :param scheduled: Whether adeadline has already been awaited for 
+            this action
+        """
         if self._use_emulator:
-            self._game_time += self._desired_action_interval
-        else:       
-            if self._prev_act_time != None:
-                dt = timeSeconds() - self._prev_act_time
-                time_remaining = self._desired_action_interval - dt
-                if time_remaining > 0:
-                    time.sleep(time_remaining)
-                    self._game_time += self._desired_action_interval
-                else:
-                    print("WARNING: Took {:1.2g} s for step, which is more than the desired {:1.2g} s.".format(dt, self._desired_action_interval))
-                    self._game_time += dt
+            return self._step(action, stage)
+        if self._async_handler == None:
+            self._async_handler = AsyncUPGameHandler(self._handler)
+        
+        # Timing control
+        if not scheduled:
+            await self.adeadline()
         
         # Act
-        self._prev_act_time = timeSeconds();
-        if stage == None:            
-            action_for_handler = self.action_space.actionAsString(action)
+        action_for_handler, action_names = self._actionForHandler(action, stage)
+        if self._virtual_time:
+            self._step_observation, ac_avail = await self._async_handler.stepFused(action_for_handler, 
+                                                                                   self._desired_action_interval/2.0,
+                                                                                   self._step_observation_names,
+                                                                                   action_names)
         else:
-            action_for_handler = UPActionSpace(self._action_names_stages[stage]).actionAsString(action) 
-        self._handler.takeAction(action_for_handler)
+            self._step_observation, ac_avail = await self._async_handler.actFused(action_for_handler,
+                                                                                  self._step_observation_names,
+                                                                                  action_names)
         if self._verbose:
             print("Took action {}.".format(action_for_handler))
         
-        # Advance time half way to resolve purchases, etc.
+        return self._completeStep(stage, ac_avail)
+    
+    async def adeadline(self):
+        """Schedule the next action and wait for its deadline without 
+        blocking, so that the agent can choose the action in the meantime.
+        It's then taken by astep with scheduled=True.
+        """
         if self._use_emulator:
-            self._handler.advanceTime(self._desired_action_interval/2.0)
+            return
+        time_remaining = self._scheduleAction()
+        if time_remaining > 0:
+            await asyncio.sleep(time_remaining)
+    
+    async def areset(self):
+        """As _reset, but as a coroutine that doesn't block while the browser 
+        resets.
+        """
+        if self._use_emulator:
+            return self._reset()
+        if self._async_handler == None:
+            self._async_handler = AsyncUPGameHandler(self._handler)
+        return await self._async_handler.run(self._reset)
+    
+    def _actionForHandler(self, action, stage=None):
+        """:returns: (action_name, action_names) -- The name of action and 
+            those of every action of the stage.
+        """
+        if stage == None:            
+            return self.action_space.actionAsString(action), self._action_names_stages[self._initial_stage]
+        return self._action_spaces_stages[stage].actionAsString(action), self._action_names_stages[stage]
+    
+    def _scheduleAction(self):
+        """Schedule the next action one desired action interval after the 
+        previous one was due, or straight away if that deadline has been 
+        missed, and advance the game time to match.
         
+        :returns: The time in seconds to wait before acting.
+        """
+        if self._virtual_time:
+            self._game_time += self._desired_action_interval
+            return 0.0
+        
+        now = timeSeconds()
+        if self._action_deadline == None:
+            self._action_deadline = now
+            return 0.0
+        prev_deadline = self._action_deadline
+        self._action_deadline += self._desired_action_interval
+        self._deadline_stats['n_deadlines'] += 1
+        lateness = now - self._action_deadline
+        if lateness > 0:
+            print("WARNING: Took {:1.2g} s for step, which is more than the desired {:1.2g} s.".format(now-prev_deadline, self._desired_action_interval))
+            self._deadline_stats['n_missed'] += 1
+            self._deadline_stats['total_lateness'] += lateness
+            self._deadline_stats['max_lateness'] = max(self._deadline_stats['max_lateness'], lateness)
+            self._action_deadline = now
+        self._game_time += self._action_deadline-prev_deadline
+        return self._action_deadline-now
+    
+    def deadlineStats(self):
+        """Statistics of the action deadlines in real time so far, with 
+        lateness in seconds.
+        """
+        stats = dict(self._deadline_stats)
+        stats['mean_lateness'] = stats['total_lateness']/max(stats['n_missed'],1)
+        return stats
+    
+    def _completeStep(self, stage=None, ac_avail=None):
+        """The remainder of a step once the action has been taken, given 
+        action availability if it's already known.
+        """
         # Update stage
         stage_changed = self._update_stage()
         
         # Observe and determine available actions
         observation_from_handler, observation = self.observe(stage)
-        ac_avail = self.getAvailableActions(stage)
+        if ac_avail is None:
+            ac_avail = self.getAvailableActions(stage)
         if self._verbose:
             print(observation_from_handler)
         
         # Get reward
         reward = self.reward()
-        
-        # Advance time the rest of the way
-        if self._use_emulator:
-            self._handler.advanceTime(self._desired_action_interval/2.0)
+        self._step_observation = None
         
         # Update any additional state
         self._prev_observation_from_handler = observation_from_handler    
@@ -830,31 +1096,34 @@ class UPEnv(Env):
             self._handler.save_screenshot(filename)
     
     def getStateAsString(self):
-        if self._use_emulator:
-            return self._handler.getStateAsString()
-        else:
-            raise NotImplementedError("No implementation for state fetching without emulator.")
+        return self._handler.getStateAsString()
             
     def loadStateFromString(self, stateString):
-        if self._use_emulator:
-            self._handler.loadStateFromString(stateString)
-        else:
-            raise NotImplementedError("No implementation for setting state without emulator.")
+        self._handler.loadStateFromString(stateString)
     
     def _close(self):
-        self._handler.quit()
+        if self._async_handler != None:
+            self._async_handler.quit()
+        else:
+            self._handler.quit()
         
     def _render(self, mode='human', close=False):
         return
         
     def _seed(self, seed=None):
-        return []
+        """Seed the choice of initial states and, with the emulator, the 
+        game, from the next reset onwards.
+        """
+        if seed == None:
+            seed = np.random.randint(2**31)
+        self._np_random.seed(seed)
+        return [seed]
     
     def getCurrentActionSpace(self):
-        return UPActionSpace(self._action_names_stages[self.stage])
+        return self._action_spaces_stages[self.stage]
         
     def getCurrentObservationSpace(self):
-        return UPObservationSpace(self._observation_names_stages[self.stage])
+        return self._observation_spaces_stages[self.stage]
     
     @property
     def stage(self):
@@ -862,8 +1131,8 @@ class UPEnv(Env):
     
     @property
     def action_space(self):
-        return UPActionSpace(self._action_names_stages[self._initial_stage])
+        return self._action_spaces_stages[self._initial_stage]
 
     @property
     def observation_space(self):
-        return UPObservationSpace(self._observation_names_stages[self._initial_stage])
+        return self._observation_spaces_stages[self._initial_stage]
@@ -0,0 +1,53 @@
+import numpy as np
+
+class UPStageCache(object):
+    """Game states saved as stage advancement first reaches each stage, so
+    that later resets can start from them instead of replaying the game from
+    the start.
+
+    Each stage has a pool of up to size_per_stage states, along with the
+    game time they were reached at. Once a pool holds a state, it's used
+    with probability 1-refresh_prob, however full it is, so the rest of the
+    resets replay the stage from an earlier one to bring new states into the
+    pool. New states replace old ones in a full pool by the eviction policy,
+    'random' or 'fifo'.
+    """
+    _evictions = ['random', 'fifo']
+
+    def __init__(self, size_per_stage=32, refresh_prob=0.1, eviction='random'):
+        if eviction not in self._evictions:
+            raise NotImplementedError("No eviction policy {}.".format(eviction))
+        self._size_per_stage = size_per_stage
+        self._refresh_prob = refresh_prob
+        self._eviction = eviction
+        self._pools = {}
+        self._n_added = {}
+
+    def nStates(self, stage):
+        return len(self._pools.get(stage, []))
+
+    def add(self, stage, state_string, game_time, rng=np.random):
+        pool = self._pools.setdefault(stage, [])
+        n_added = self._n_added.get(stage, 0)
+        entry = (state_string, game_time)
+        if len(pool) < self._size_per_stage:
+            pool.append(entry)
+        elif self._eviction == 'random':
+            pool[rng.randint(len(pool))] = entry
+        elif self._eviction == 'fifo':
+            pool[n_added % self._size_per_stage] = entry
+        self._n_added[stage] = n_added+1
+
+    def sample(self, target_stage, rng=np.random):
+        """A state to start advancing to target_stage from, trying the
+        latest stages first.
+
+        :returns: (stage, state_string, game_time) -- or None to start from
+            the beginning.
+        """
+        for stage in range(target_stage, 0, -1):
+            pool = self._pools.get(stage, [])
+            if len(pool) > 0 and rng.rand() >= self._refresh_prob:
+                state_string, game_time = pool[rng.randint(len(pool))]
+                return stage, state_string, game_time
+        return None
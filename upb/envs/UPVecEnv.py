@@ -0,0 +1,130 @@
+from upb.envs.UPEnv import UPEnv
+from upb.emu.UPVecEmulator import UPVecEmulator
+import numpy as np
+
+class UPVecEnv(object):
+    """Several games stepped together.
+    
+    The games share a single UPVecEmulator, or the given vec_handler, such as
+    a UPMultiTabGameHandler, and each has its own UPEnv for stage tracking, 
+    rewards and resets. As with UPEnv.step, observations and actions are 
+    those of the initial stage. Games that finish their episode are reset 
+    automatically. A stage cache, if given, is shared by all the games.
+    """
+    def __init__(self,
+                 n_envs,
+                 initial_states_filename=None,
+                 initial_stage=0,
+                 final_stage=None,
+                 resetter_agents=[],
+                 episode_length=None,
+                 action_rate_speedup=1.0,
+                 verbose=False,
+                 stage_cache=None,
+                 vec_handler=None):
+        if vec_handler == None:
+            self._emulator = UPVecEmulator(n_envs)
+        else:
+            if vec_handler.n_games != n_envs:
+                raise Exception("Handler has {} games for {} environments.".format(vec_handler.n_games, n_envs))
+            self._emulator = vec_handler
+        self._envs = []
+        for k in range(n_envs):
+            env = UPEnv(None,
+                        initial_states_filename=initial_states_filename if k == 0 else None,
+                        initial_stage=initial_stage,
+                        final_stage=final_stage,
+                        resetter_agents=resetter_agents,
+                        use_emulator=vec_handler == None,
+                        episode_length=episode_length,
+                        action_rate_speedup=action_rate_speedup,
+                        verbose=verbose,
+                        handler=self._emulator.game(k),
+                        stage_cache=stage_cache)
+            
+            # Share a single copy of the initial states
+            env._init_states = self._envs[0]._init_states if k > 0 else env._init_states
+            self._envs.append(env)
+        
+        self._initial_stage = initial_stage
+        self._action_names = UPEnv._action_names_stages[initial_stage]
+        self._observation_space = UPEnv._observation_spaces_stages[initial_stage]
+        self._action_space = UPEnv._action_spaces_stages[initial_stage]
+    
+    def reset(self):
+        """Reset every game.
+        
+        :returns: obs -- An (n_envs, obs_dim) array of initial observations.
+        """
+        return np.array([env._reset() for env in self._envs])
+    
+    def seed(self, seed=None):
+        """Seed each game's environment, the k-th with seed+k.
+        
+        :returns: The seed of each game's environment.
+        """
+        if seed == None:
+            seed = np.random.randint(2**31-self.n_envs)
+        return [env._seed(seed+k)[0] for k, env in enumerate(self._envs)]
+    
+    def getAvailableActions(self):
+        """:returns: An (n_envs, n_actions) array of action availability."""
+        return np.array([env.getAvailableActions() for env in self._envs])
+    
+    def step(self, actions):
+        """Step every game.
+        
+        :param actions: an (n_envs,) array of actions
+        :returns: (obs, rews, dones, info) -- (n_envs, obs_dim) observations,
+            (n_envs,) rewards and (n_envs,) episode completions, and a 
+            dictionary with the (n_envs, n_actions) array of 'Available 
+            Actions'. Games that are done have been reset, and their 
+            observation and availability are from the start of the next 
+            episode.
+        """
+        # Act and fetch everything needed for the rest of the step in one call
+        action_names = [self._action_space.actionAsString(ac) for ac in actions]
+        dt_s = []
+        for env in self._envs:
+            env._game_time += env._desired_action_interval
+            dt_s.append(env._desired_action_interval/2.0)
+        step_observations, acs_avail = self._emulator.stepFused(action_names, dt_s,
+                                                                UPEnv._step_observation_names,
+                                                                self._action_names)
+        
+        # Complete each game's step
+        obs = np.zeros((self.n_envs,)+self._observation_space.shape)
+        rews = np.zeros(self.n_envs)
+        dones = np.zeros(self.n_envs, dtype=bool)
+        for k, env in enumerate(self._envs):
+            env._step_observation = step_observations[k]
+            obs[k], rews[k], dones[k], info = env._completeStep(None, acs_avail[k])
+            if dones[k]:
+                obs[k] = env._reset()
+                acs_avail[k] = env.getAvailableActions()
+        
+        return obs, rews, dones, {'Available Actions': acs_avail}
+    
+    def close(self):
+        self._emulator.quit()
+    
+    @property
+    def n_envs(self):
+        return len(self._envs)
+    
+    @property
+    def episode_length(self):
+        return self._envs[0]._episode_length
+    
+    @property
+    def envs(self):
+        """The environment of each game, which can also be stepped on its own."""
+        return self._envs
+    
+    @property
+    def action_space(self):
+        return self._action_space
+
+    @property
+    def observation_space(self):
+        return self._observation_space
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+
+class AsyncUPGameHandler(object):
+    """Coroutine versions of the calls to a UPGameHandler.
+
+    The web driver blocks while the browser works, so each call is run on a
+    thread of the handler's own. Awaiting one game's calls leaves the event
+    loop free to run agents and the calls of other games, so one process can
+    drive many live games at once.
+    """
+    def __init__(self, handler):
+        self._handler = handler
+
+        # A web driver can't be used from more than one thread at a time
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def handler(self):
+        """The UPGameHandler, for calls that don't need to be awaited."""
+        return self._handler
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn, which may use the handler, on the handler's thread."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def reset(self):
+        return await self.run(self._handler.reset)
+
+    async def makeObservation(self, fields):
+        return await self.run(self._handler.makeObservation, fields)
+
+    async def getAvailableActions(self, ac_names):
+        return await self.run(self._handler.getAvailableActions, ac_names)
+
+    async def takeAction(self, action_name):
+        return await self.run(self._handler.takeAction, action_name)
+
+    async def observeFused(self, fields, ac_names):
+        return await self.run(self._handler.observeFused, fields, ac_names)
+
+    async def actFused(self, action_name, fields, ac_names):
+        return await self.run(self._handler.actFused, action_name, fields, ac_names)
+
+    async def stepFused(self, action_name, dt_s, fields, ac_names):
+        return await self.run(self._handler.stepFused, action_name, dt_s, fields, ac_names)
+
+    def quit(self):
+        self._executor.shutdown()
+        self._handler.quit()
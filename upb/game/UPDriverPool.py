@@ -0,0 +1,187 @@
+from upb.game.UPGameHandler import UPGameHandler, create_webdriver
+import numpy as np
+import threading
+import time
+
+class UPDriverPool(object):
+    """Web drivers launched ahead of time with the game page loaded, to be
+    handed out to UPGameHandlers instead of each launching its own.
+
+    A background thread keeps n_drivers idle drivers ready, reloads the page
+    of drivers that are released back to the pool, and regularly checks that
+    idle drivers are still alive, replacing any that aren't. Each driver's
+    save from just after its page loaded is kept, so that a handler can
+    start from a fresh game even if the page has been running since.
+    """
+    def __init__(self,
+                 url,
+                 n_drivers,
+                 webdriver_name='Chrome',
+                 webdriver_path=None,
+                 virtual_clock=False,
+                 health_check_interval=10.0):
+        self._url = url
+        self._n_drivers = n_drivers
+        self._webdriver_name = webdriver_name
+        self._webdriver_path = webdriver_path
+        self.virtual_clock = virtual_clock
+        self._health_check_interval = health_check_interval
+
+        # Drivers ready to hand out, and those released to be made ready again
+        self._idle = []
+        self._released = []
+        self._fresh_states = {}
+        self._condition = threading.Condition()
+
+        # Acquire latencies in seconds
+        self._acquire_times = []
+
+        self._stopped = False
+        self._thread = threading.Thread(target=self._maintain)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def acquire(self, timeout=None):
+        """An idle driver with the game page loaded, waiting for one to be
+        ready if there are none.
+        """
+        start_time = time.time()
+        with self._condition:
+            while len(self._idle) == 0:
+                if self._stopped:
+                    raise Exception("Driver pool has been closed.")
+                remaining = None if timeout == None else timeout-(time.time()-start_time)
+                if remaining != None and remaining <= 0:
+                    raise Exception("Timed out waiting for a driver.")
+                self._condition.notify_all()
+                self._condition.wait(remaining)
+            driver = self._idle.pop()
+            self._acquire_times.append(time.time()-start_time)
+            self._condition.notify_all()
+        return driver
+
+    def freshState(self, driver):
+        """The save of driver's game from just after its page was loaded."""
+        with self._condition:
+            return self._fresh_states.get(id(driver))
+
+    def release(self, driver):
+        """Return a driver to the pool, to be reloaded and handed out again."""
+        with self._condition:
+            self._released.append(driver)
+            self._condition.notify_all()
+
+    def discard(self, driver):
+        """Give up on a driver that has stopped working, to be replaced."""
+        with self._condition:
+            self._fresh_states.pop(id(driver), None)
+        self._quitDriver(driver)
+
+    def stats(self):
+        """Acquire latency statistics in seconds, along with the number of
+        drivers idle right now.
+        """
+        with self._condition:
+            times = np.array(self._acquire_times)
+            n_idle = len(self._idle)
+        if len(times) == 0:
+            return {'n_acquired': 0, 'n_idle': n_idle}
+        return {
+            'n_acquired': len(times),
+            'n_idle': n_idle,
+            'mean': times.mean(),
+            'median': np.median(times),
+            'p95': np.percentile(times, 95),
+            'max': times.max()
+        }
+
+    def close(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join()
+        for driver in self._idle+self._released:
+            self._quitDriver(driver)
+        self._idle = []
+        self._released = []
+
+    def _quitDriver(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _prepare(self, driver):
+        """Load the game page in driver and keep its save.
+
+        :returns: True if the driver is working.
+        """
+        try:
+            driver.get(self._url)
+            fresh_state = driver.execute_script(UPGameHandler._get_save_js, UPGameHandler._save_items)
+        except Exception as e:
+            print("WARNING: Failed to load game in pooled driver ({}).".format(e))
+            self._quitDriver(driver)
+            return False
+        with self._condition:
+            self._fresh_states[id(driver)] = fresh_state
+        return True
+
+    def _healthy(self, driver):
+        try:
+            return driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def _maintain(self):
+        last_check_time = time.time()
+        while True:
+            # Work out what needs doing
+            with self._condition:
+                while (not self._stopped and len(self._released) == 0
+                       and len(self._idle) >= self._n_drivers
+                       and time.time()-last_check_time < self._health_check_interval):
+                    self._condition.wait(self._health_check_interval)
+                if self._stopped:
+                    return
+                released = self._released
+                self._released = []
+                n_launch = max(self._n_drivers-len(self._idle)-len(released), 0)
+
+            # Reload released drivers, unless there are already enough idle,
+            # and launch any more that are needed
+            ready = []
+            for driver in released:
+                if len(self._idle)+len(ready) >= self._n_drivers:
+                    self.discard(driver)
+                elif self._prepare(driver):
+                    ready.append(driver)
+            for i in range(n_launch):
+                try:
+                    driver = create_webdriver(self._webdriver_name, self._webdriver_path,
+                                              headless=True, virtual_clock=self.virtual_clock)
+                except Exception as e:
+                    print("WARNING: Failed to launch pooled driver ({}).".format(e))
+                    continue
+                if self._prepare(driver):
+                    ready.append(driver)
+            with self._condition:
+                self._idle += ready
+                self._condition.notify_all()
+
+            # Replace idle drivers that have died
+            if time.time()-last_check_time >= self._health_check_interval:
+                with self._condition:
+                    idle = self._idle
+                    self._idle = []
+                alive = []
+                for driver in idle:
+                    if self._healthy(driver):
+                        alive.append(driver)
+                    else:
+                        print("WARNING: Replacing dead pooled driver.")
+                        self.discard(driver)
+                with self._condition:
+                    self._idle += alive
+                    self._condition.notify_all()
+                last_check_time = time.time()
@@ -8,6 +8,7 @@ import lxml.html
 import http
 from collections import OrderedDict
 import os
+import time
 
 # Global constants
 LOCAL_GAME_URL_TRAIN = "file://"+os.path.join(os.path.dirname(os.path.abspath(__file__)),"index2_train.html")
@@ -47,6 +48,90 @@ UP_PROJECT_IDS = {
     'New Strategy: A100': '60'
 }
 
+# The game's JS globals behind each observation
+UP_OBS_TO_JS = {
+    'Paperclips': 'clips',
+    'Available Funds': 'funds',
+    'Unsold Inventory': 'unsoldClips',
+    'Price per Clip': 'margin',
+    'Public Demand': 'demand',
+    'Marketing Level': 'marketingLvl',
+    'Marketing Cost': 'adCost',
+    'Manufacturing Clips per Second': 'clipRateTracker',
+    'Wire Inches': 'wire',
+    'Wire Cost': 'wireCost',
+    'Autoclipper Cost': 'clipperCost',
+    'Number of Autoclippers': 'clipmakerLevel',
+    'Trust': 'trust',
+    'Next Trust': 'nextTrust',
+    'Processors': 'processors',
+    'Memory': 'memory',
+    'Operations': 'operations',
+    'Creativity': 'creativity',
+    'Investment Bankroll': 'bankroll',
+    'Stocks': 'secTotal',
+    'Investment Engine Level': 'investLevel',
+    'Investment Engine Upgrade Cost': 'investUpgradeCost',
+    'Number of Photonic Chips': 'nextQchip',
+    'Latest QOps': 'latestQops',
+    'Photonic Chip 0 Level': 'qChips[0].value',
+    'Riskiness': 'riskiness',
+    'MegaClipper Cost': 'megaClipperCost',
+    'Number of MegaClippers': 'megaClipperLevel',
+    'Yomi': 'yomi',
+    'Tournament Cost': 'tourneyCost'
+}
+for pname, pid in UP_PROJECT_IDS.items():
+    UP_OBS_TO_JS[pname+' Activated'] = 'project{}.flag'.format(pid)
+
+# The game's own JS for each action, guarded by the conditions that enable its button
+UP_ACTION_TO_JS = {
+    'Do Nothing': '',
+    'Make Paperclip': 'if (wire>=1) {clipClick(1);}',
+    'Lower Price': 'if (margin>.01) {lowerPrice();}',
+    'Raise Price': 'raisePrice();',
+    'Expand Marketing': 'if (funds>=adCost) {buyAds();}',
+    'Buy Wire': 'if (funds>=wireCost) {buyWire();}',
+    'Buy Autoclipper': 'if (funds>=clipperCost) {makeClipper();}',
+    'Add Processor': 'if (trust>processors+memory || swarmGifts > 0) {addProc();}',
+    'Add Memory': 'if (trust>processors+memory || swarmGifts > 0) {addMem();}',
+    'Set Investment Low': 'if (investmentEngineFlag == 1) {riskiness = 7;}',
+    'Set Investment Medium': 'if (investmentEngineFlag == 1) {riskiness = 5;}',
+    'Set Investment High': 'if (investmentEngineFlag == 1) {riskiness = 1;}',
+    'Withdraw': 'if (investmentEngineFlag == 1) {investWithdraw();}',
+    'Deposit': 'if (investmentEngineFlag == 1) {investDeposit();}',
+    'Upgrade Investment Engine': 'if (investmentEngineFlag == 1 && yomi>=investUpgradeCost) {investUpgrade();}',
+    'Quantum Compute': 'if (qFlag == 1) {qComp();}',
+    'Buy MegaClipper': 'if (funds>=megaClipperCost && megaClipperFlag == 1) {makeMegaClipper();}'
+    #~ 'Run New Tournament' # Depends on how tournament rounds are timed, so left to each handler
+}
+for pname, pid in UP_PROJECT_IDS.items():
+    UP_ACTION_TO_JS['Activate '+pname] = 'if (activeProjects.indexOf(project{0}) >= 0 && project{0}.cost() && !project{0}.flag) {{project{0}.effect();}}'.format(pid)
+
+# Expressions of the game's JS globals for whether each action is available
+UP_ACTION_AVAIL_TO_JS = {
+    'Do Nothing': 'true',
+    'Make Paperclip': 'wire>=1',
+    'Lower Price': 'margin>.01',
+    'Raise Price': 'true',
+    'Expand Marketing': 'funds>=adCost',
+    'Buy Wire': 'funds>=wireCost',
+    'Buy Autoclipper': 'funds>=clipperCost',
+    'Add Processor': 'trust>processors+memory || swarmGifts > 0',
+    'Add Memory': 'trust>processors+memory || swarmGifts > 0',
+    'Set Investment Low': 'investmentEngineFlag == 1 && riskiness != 7',
+    'Set Investment Medium': 'investmentEngineFlag == 1 && riskiness != 5',
+    'Set Investment High': 'investmentEngineFlag == 1 && riskiness != 1',
+    'Withdraw': 'investmentEngineFlag == 1',
+    'Deposit': 'investmentEngineFlag == 1',
+    'Upgrade Investment Engine': 'investmentEngineFlag == 1 && yomi>=investUpgradeCost',
+    'Quantum Compute': 'qFlag == 1 && qChips[0].active != 0',
+    'Buy MegaClipper': 'funds>=megaClipperCost && megaClipperFlag == 1',
+    'Run New Tournament': 'strategyEngineFlag == 1 && operations>=tourneyCost && tourneyInProg == 0'
+}
+for pname, pid in UP_PROJECT_IDS.items():
+    UP_ACTION_AVAIL_TO_JS['Activate '+pname] = 'activeProjects.indexOf(project{0}) >= 0 && project{0}.cost() && !project{0}.flag'.format(pid)
+
 class UPGameState(object):
     _scalar_values = {}
     _scalar_values_finders = {
@@ -187,13 +272,175 @@ class UPGameState(object):
     def __str__(self):
         return self._scalar_values.__str__()        
 
+class UPGameStateJs(object):
+    """The same values as UPGameState, read directly from the game's JS 
+    globals in a single script call rather than scraped from the page.
+    """
+    _js_overrides = {
+        # Displayed at ten times its internal value
+        'Public Demand': 'demand*10',
+        # Only updated from the selector periodically by the game
+        'Riskiness': '{"low": 7, "med": 5, "hi": 1}[document.getElementById("investStrat").value]'
+    }
+    _scalar_fields = list(UPGameState._scalar_values_finders.keys())+['Photonic Chip 0 Level', 'Number of Photonic Chips', 'Riskiness']
+    _proj_avail_fields = list(UPGameState._proj_avail_finders.keys())
+    _fields = _scalar_fields+_proj_avail_fields
+    
+    _exprs_js = []
+    for field in _scalar_fields:
+        _exprs_js.append("+({})".format(_js_overrides.get(field, UP_OBS_TO_JS[field])))
+    for field in _proj_avail_fields:
+        _exprs_js.append('document.getElementById("{}") != null'.format(UPGameState._proj_avail_finders[field][1]))
+    _values_js = "[{}]".format(",".join(_exprs_js))
+    
+    def __init__(self, driver, fields=None, values=None):
+        # Values may have been fetched already along with other things
+        if values == None:
+            values = driver.execute_script("return {};".format(self._values_js))
+        self._all_values = dict(zip(self._fields, values))
+        self._scalar_values = {field: self._all_values[field] for field in self._scalar_fields}
+        
+    def get(self, field):
+        return self._all_values[field]
+    
+    def __str__(self):
+        return self._scalar_values.__str__()
+
 class UPGameHandler(object):
+    # The save made by the game's own save(), in the same form as that of 
+    # the emulator's getSaveAsString. It's taken back out of local storage 
+    # so that reloading the page doesn't load it.
+    _save_items = ["saveGame", "saveProjectsUses", "saveProjectsFlags", "saveProjectsActive", "saveStratsActive"]
+    _get_save_js = """
+        save();
+        var saveContents = {};
+        var items = arguments[0];
+        for (var i = 0; i < items.length; i++) {
+            saveContents[items[i]] = JSON.parse(localStorage.getItem(items[i]));
+            localStorage.removeItem(items[i]);
+        }
+        return JSON.stringify(saveContents);
+    """
+    
+    # Loads a save in place through the game's own load(), after undoing 
+    # what load() adds to rather than sets: the active projects and their
+    # buttons, and the strategies and their options in the picker. Returns 
+    # the flags of the projects in arguments[2].
+    _load_save_js = """
+        var saveContents = JSON.parse(arguments[0]);
+        var items = arguments[1];
+        for (var i = 0; i < activeProjects.length; i++) {
+            var button = document.getElementById(activeProjects[i].id);
+            if (button != null) {
+                button.parentNode.removeChild(button);
+            }
+        }
+        activeProjects.length = 0;
+        strats.length = 1;
+        var stratList = document.getElementById("stratPicker");
+        for (var i = stratList.options.length-1; i >= 0; i--) {
+            if (stratList.options[i].value != "10" && stratList.options[i].value != "0") {
+                stratList.remove(i);
+            }
+        }
+        for (var i = 0; i < items.length; i++) {
+            localStorage.setItem(items[i], JSON.stringify(saveContents[items[i]]));
+        }
+        load();
+        for (var i = 0; i < items.length; i++) {
+            localStorage.removeItem(items[i]);
+        }
+        return arguments[2].map(function(pid){return window["project"+pid].flag;});
+    """
+    
+    # Replaces the page's timers and clock with ones that only advance when
+    # upbAdvanceTime(dtMs) is called, running every timer that falls due in
+    # order. Installed before any of the game's scripts run.
+    _virtual_clock_js = """
+        (function() {
+            var timers = {};
+            var nextId = 1;
+            var nowMs = 0;
+            var RealDate = Date;
+            var startMs = RealDate.now();
+            
+            function addTimer(fn, delayMs, args, repeat) {
+                if (typeof fn === "string") {
+                    fn = new Function(fn);
+                }
+                var id = nextId++;
+                delayMs = Math.max(+delayMs || 0, repeat ? 1 : 0);
+                timers[id] = {fn: fn, args: args, delayMs: delayMs, dueMs: nowMs+delayMs, repeat: repeat};
+                return id;
+            }
+            window.setInterval = function(fn, delayMs) {
+                return addTimer(fn, delayMs, Array.prototype.slice.call(arguments, 2), true);
+            };
+            window.setTimeout = function(fn, delayMs) {
+                return addTimer(fn, delayMs, Array.prototype.slice.call(arguments, 2), false);
+            };
+            window.clearInterval = window.clearTimeout = function(id) {
+                delete timers[id];
+            };
+            
+            window.Date = function(a, b, c, d, e, f, g) {
+                switch (arguments.length) {
+                    case 0: return new RealDate(startMs+nowMs);
+                    case 1: return new RealDate(a);
+                    default: return new RealDate(a, b, c === undefined ? 1 : c, d || 0, e || 0, f || 0, g || 0);
+                }
+            };
+            window.Date.prototype = RealDate.prototype;
+            window.Date.now = function() {return startMs+nowMs;};
+            window.Date.parse = RealDate.parse;
+            window.Date.UTC = RealDate.UTC;
+            if (window.performance) {
+                window.performance.now = function() {return nowMs;};
+            }
+            
+            // Timers due at the same time run in the order they were set
+            window.upbAdvanceTime = function(dtMs) {
+                var endMs = nowMs+dtMs;
+                while (true) {
+                    var nextTimer = null;
+                    var nextTimerId = 0;
+                    for (var id in timers) {
+                        var timer = timers[id];
+                        if (timer.dueMs <= endMs && (nextTimer == null || timer.dueMs < nextTimer.dueMs)) {
+                            nextTimer = timer;
+                            nextTimerId = id;
+                        }
+                    }
+                    if (nextTimer == null) {
+                        break;
+                    }
+                    nowMs = nextTimer.dueMs;
+                    if (nextTimer.repeat) {
+                        nextTimer.dueMs += nextTimer.delayMs;
+                    } else {
+                        delete timers[nextTimerId];
+                    }
+                    nextTimer.fn.apply(window, nextTimer.args);
+                }
+                nowMs = endMs;
+            };
+        })();
+    """
+    
     def __init__(self, 
                  url, 
                  webdriver_name='Chrome', 
                  webdriver_path=None, 
                  verbose=False, 
-                 headless=False):
+                 headless=False,
+                 state_extraction='html',
+                 availability='buttons',
+                 action_dispatch='clicks',
+                 fast_reset=False,
+                 virtual_clock=False,
+                 time_dilation=None,
+                 driver_pool=None,
+                 driver=None):
                      
         # Class constants
         self._all_buttons = {
@@ -267,21 +514,86 @@ class UPGameHandler(object):
             #~ 'Run New Tournament': # Implemented in actionAvailable
         }
         
-        # Web driver setup
+        # With a virtual clock, game time only passes in advanceTime, at up 
+        # to time_dilation times real time, or as fast as possible if None
+        self.virtual_clock = virtual_clock
+        self._time_dilation = time_dilation
+        self._advance_wall_time = None
+        
+        # With fast resets, the game's save is captured after the first 
+        # reset loads the page, and loaded in place on every reset after that.
+        # Only what the save holds is reset, so these are opted into, and 
+        # examples/validate_fast_reset.py checks them against reloads
+        self._fast_reset = fast_reset
+        self._reset_state = None
+        
+        # Game progress tracked here
+        self._active_projects = []
+        self._acquired_buttons = {}
+        
+        # Web driver setup, taking warm drivers from a pool if there is one,
+        # or using the given driver
         self._webdriver_name = webdriver_name
         self._webdriver_path = webdriver_path
         self._headless = headless
-        self._setUpWebdriver()
+        self._driver_pool = driver_pool
+        self._given_driver = driver
+        self._driver = None
+        if driver_pool != None and driver_pool.virtual_clock != virtual_clock:
+            raise Exception("Driver pool and handler disagree on whether to use a virtual clock.")
+        # Game state extraction, either by scraping the page ('html') or by
+        # reading the game's JS globals in a single script call ('js')
+        if state_extraction == 'html':
+            self._game_state_class = UPGameState
+        elif state_extraction == 'js':
+            self._game_state_class = UPGameStateJs
+        else:
+            raise NotImplementedError("No state extraction mode {}.".format(state_extraction))
+        
+        # Action availability, either from the state of the page's buttons 
+        # ('buttons') or from the game's JS globals in a single script call
+        # ('js')
+        if availability not in ['buttons', 'js']:
+            raise NotImplementedError("No availability mode {}.".format(availability))
+        self._availability = availability
+        self._avail_js = {}
+        
+        # Actions, either taken by clicking the page's elements ('clicks') or
+        # by calling the game's own functions in a single script call ('js')
+        if action_dispatch not in ['clicks', 'js']:
+            raise NotImplementedError("No action dispatch mode {}.".format(action_dispatch))
+        self._action_dispatch = action_dispatch
+        self._action_js = dict(UP_ACTION_TO_JS)
+        for invest_name, invest_option, riskiness in [("Low", "low", 7), ("Medium", "med", 5), ("High", "hi", 1)]:
+            # The game periodically sets riskiness from the selector
+            self._action_js["Set Investment "+invest_name] = 'if (investmentEngineFlag == 1) {{document.getElementById("investStrat").value = "{}"; riskiness = {};}}'.format(invest_option, riskiness)
+        self._action_js["Run New Tournament"] = 'if (strategyEngineFlag == 1 && operations>=tourneyCost && tourneyInProg == 0) {newTourney(); document.getElementById("stratPicker").value = "0"; pick = 0; runTourney();}'
         
         # Remaining setup
         self._url = url
         self._verbose = verbose
+        self._setUpWebdriver()
         self.reset()
 
     # "Public" functions
     def reset(self):
+        if self._reset_state != None:
+            try:
+                self.loadStateFromString(self._reset_state)
+                self._updateGameState()
+                self._page_loaded = False
+                if not self._fast_reset:
+                    self._reset_state = None
+                return
+            except Exception as e:
+                print("WARNING: Unable to reset in place ({}). Reloading page.".format(e))
+                self._reset_state = None
+        
         try:
-            self._driver.get(self._url)
+            # Drivers from the pool come with the page loaded
+            if not self._page_loaded:
+                self._driver.get(self._url)
+            self._page_loaded = False
         except:
             print("WARNING: Unable to fetch page on reset. Starting new driver.")
             self._setUpWebdriver()
@@ -289,13 +601,49 @@ class UPGameHandler(object):
         self._active_projects = []
         self._acquired_buttons = {}
         self._updateGameState()
+        if self._fast_reset:
+            self._reset_state = self.getStateAsString()
+    
+    def getStateAsString(self):
+        return self._driver.execute_script(self._get_save_js, self._save_items)
+    
+    def loadStateFromString(self, stateString):
+        project_ids = list(UP_PROJECT_IDS.values())
+        flags = self._driver.execute_script(self._load_save_js, stateString, self._save_items, project_ids)
+        
+        # Activated projects are tracked here, and the project buttons are 
+        # replaced by the load
+        self._active_projects = [pname for pname, flag in zip(UP_PROJECT_IDS.keys(), flags) if flag == 1]
+        for ac_name in self._project_buttons.keys():
+            self._acquired_buttons.pop(ac_name, None)
     
     def quit(self):
-        self._driver.quit()
-        self._driver.stop_client()
+        if self._driver_pool != None:
+            self._driver_pool.release(self._driver)
+        else:
+            self._driver.quit()
+            self._driver.stop_client()
     
     def makeObservation(self, fields):
         self._updateGameState()
+        return self._observationFromState(fields)
+    
+    def observeFused(self, fields, ac_names):
+        """Observe and determine action availability from a single fetch of
+        the game state.
+        
+        :returns: (observation, acs_avail) -- The observation as from 
+            makeObservation(fields) and availability as from 
+            getAvailableActions(ac_names).
+        """
+        if self._availability == 'js' and self._game_state_class == UPGameStateJs:
+            values, acs_avail = self._executeScript("return [{}, {}];".format(UPGameStateJs._values_js, self._availJs(ac_names)))
+            self._state = UPGameStateJs(self._driver, values=values)
+            return self._observationFromState(fields), [float(ac) for ac in acs_avail]
+        self._updateGameState()
+        return self._observationFromState(fields), self._availableActionsFromState(ac_names)
+    
+    def _observationFromState(self, fields):
         observation = OrderedDict()
         visible_fields = []
         project_fields = []
@@ -314,7 +662,104 @@ class UPGameHandler(object):
                 observation[field] = 0
         return observation
     
+    def advanceTime(self, dt_s):
+        if not self.virtual_clock:
+            raise Exception("Can only advance time with a virtual clock.")
+        self._holdTimeDilation(dt_s)
+        self._executeScript("upbAdvanceTime({});".format(1000.0*dt_s))
+    
+    def _holdTimeDilation(self, dt_s):
+        """Wait until advancing game time by dt_s would keep it at most 
+        time_dilation times real time since the last advance.
+        """
+        if self._time_dilation != None:
+            if self._advance_wall_time != None:
+                time_remaining = self._advance_wall_time - time.monotonic()
+                if time_remaining > 0:
+                    time.sleep(time_remaining)
+            self._advance_wall_time = max(time.monotonic(), self._advance_wall_time or 0.0) + dt_s/self._time_dilation
+    
+    def stepFused(self, action_name, dt_s, fields, ac_names):
+        """With a virtual clock, take an action, then observe and determine 
+        action availability half way through a step of length 2*dt_s, in a 
+        single script call when every mode is 'js'.
+        
+        :returns: (observation, acs_avail) -- As from observeFused.
+        """
+        if not (self._action_dispatch == 'js' and self._availability == 'js' and self._game_state_class == UPGameStateJs):
+            self.takeAction(action_name)
+            self.advanceTime(dt_s)
+            observation, acs_avail = self.observeFused(fields, ac_names)
+            self.advanceTime(dt_s)
+            return observation, acs_avail
+        if not self.virtual_clock:
+            raise Exception("Can only advance time with a virtual clock.")
+        self._holdTimeDilation(2.0*dt_s)
+        result = self._executeScript(self._fusedJs(action_name, dt_s, ac_names))
+        return self._finishFused(action_name, result, fields)
+    
+    def actFused(self, action_name, fields, ac_names):
+        """Take an action, then observe and determine action availability,
+        in a single script call when every mode is 'js'.
+        
+        :returns: (observation, acs_avail) -- As from observeFused.
+        """
+        if not (self._action_dispatch == 'js' and self._availability == 'js' and self._game_state_class == UPGameStateJs):
+            self.takeAction(action_name)
+            return self.observeFused(fields, ac_names)
+        result = self._executeScript(self._fusedJs(action_name, None, ac_names))
+        return self._finishFused(action_name, result, fields)
+    
+    def _fusedJs(self, action_name, dt_s, ac_names):
+        """A script that takes an action, then observes and determines 
+        action availability, either half way through a step of length 
+        2*dt_s with a virtual clock or straight away if dt_s is None. It 
+        returns [success, values, acs_avail] for _finishFused.
+        """
+        if dt_s == None:
+            return "return [{}, {}, {}];".format(self._actionJs(action_name), UPGameStateJs._values_js, 
+                                                 self._availJs(ac_names))
+        dt_ms = 1000.0*dt_s
+        step_js = "var success = {}; upbAdvanceTime({}); var observed = [success, {}, {}]; upbAdvanceTime({}); return observed;"
+        return step_js.format(self._actionJs(action_name), dt_ms, UPGameStateJs._values_js, self._availJs(ac_names), dt_ms)
+    
+    def _finishFused(self, action_name, result, fields):
+        """Register the result of a _fusedJs script.
+        
+        :returns: (observation, acs_avail) -- As from observeFused.
+        """
+        success, values, acs_avail = result
+        self._registerAction(action_name, success)
+        self._state = UPGameStateJs(self._driver, values=values)
+        return self._observationFromState(fields), [float(ac) for ac in acs_avail]
+    
+    def _actionJs(self, action_name):
+        """An expression that takes the action in the page and evaluates to 
+        whether it was available.
+        """
+        if action_name not in self._action_js:
+            raise Exception("Don't know how to take action {}.".format(action_name))
+        return "(function(){{var available = !!({}); {} return available;}})()".format(UP_ACTION_AVAIL_TO_JS[action_name], 
+                                                                                      self._action_js[action_name])
+    
+    def _registerAction(self, action_name, success):
+        # Register that project has been activated
+        if success:
+            if action_name in self._project_buttons.keys():
+                project_name = action_name[9:]
+                self._active_projects.append(project_name)
+        if self._verbose:
+            if success:
+                print("Took action "+action_name+"!")
+            else:
+                print("ERROR: Failed to take action "+action_name+"!")
+    
     def takeAction(self, action_name):
+        if self._action_dispatch == 'js':
+            success = self._executeScript("return {};".format(self._actionJs(action_name)))
+            self._registerAction(action_name, success)
+            return success
+        
         success = False
         # Buttons
         if action_name in self._all_buttons:
@@ -372,30 +817,36 @@ class UPGameHandler(object):
     
     # "Private" functions
     def _setUpWebdriver(self):
-        if self._webdriver_name == 'Chrome':            
-            self._chrome_options = chrome.options.Options()
-            if self._headless:
-                self._chrome_options.add_argument("--headless")
-            self._driver = webdriver.Chrome(chrome_options=self._chrome_options)
-        elif self._webdriver_name == 'PhantomJS':
-            if self._webdriver_path == None:
-                try:
-                    self._driver = webdriver.PhantomJS()
-                except:
-                    raise Exception("Failed to find phantomjs on system. Need to specify webdriver_path=/path/to/phantomjs.")
-            else:
-                self._driver = webdriver.PhantomJS(self._webdriver_path)
-            if self._headless == False:
-                print("WARNING: Specified not headless, but PhantomJS is headless only.")
+        if self._driver_pool != None:
+            # A dead driver is replaced with a warm one from the pool
+            if self._driver != None:
+                self._driver_pool.discard(self._driver)
+            self._driver = self._driver_pool.acquire()
+            
+            # Unless the game clock is virtual, the page has been running 
+            # since it was loaded, so the game starts from its fresh save
+            self._page_loaded = True
+            if self._fast_reset or not self.virtual_clock:
+                self._reset_state = self._driver_pool.freshState(self._driver)
+                self._page_loaded = self.virtual_clock or self._reset_state != None
+        elif self._given_driver != None:
+            if self._driver != None:
+                raise Exception("Lost the given web driver.")
+            self._driver = self._given_driver
+            self._page_loaded = False
         else:
-            raise NotImplementedError("No implementation for webdriver {}.".format(self._webdriver_name))
+            self._driver = create_webdriver(self._webdriver_name, 
+                                            self._webdriver_path, 
+                                            self._headless, 
+                                            self.virtual_clock)
+            self._page_loaded = False
        
     def _updateGameState(self):
         self._state = self._getGameStateFromPage()
     
     def _getGameStateFromPage(self):
         try:
-            return UPGameState(self._driver)
+            return self._game_state_class(self._driver)
         except http.client.RemoteDisconnected:
             print("ERROR: Disconnected while attempting to fetch game state.")
             print("WARNING: Handling this by resetting. If this was in the middle of a sample path it's going to mess it up a lot.")
@@ -466,8 +917,67 @@ class UPGameHandler(object):
             raise Exception("Don't know how to determine availability of {}.".format(ac_name))
     
     def getAvailableActions(self, ac_names):
-        observation = self.makeObservation(self._avail_observations)
+        if self._availability == 'js':
+            acs_avail = self._executeScript("return {};".format(self._availJs(ac_names)))
+            return [float(ac) for ac in acs_avail]
+        self._updateGameState()
+        return self._availableActionsFromState(ac_names)
+    
+    def _availJs(self, ac_names):
+        """An array expression of the availability of each action, evaluated
+        in the page.
+        """
+        key = tuple(ac_names)
+        if key not in self._avail_js:
+            exprs_js = ["+({})".format(UP_ACTION_AVAIL_TO_JS[name]) for name in ac_names]
+            self._avail_js[key] = "[{}]".format(",".join(exprs_js))
+        return self._avail_js[key]
+    
+    def _executeScript(self, script):
+        try:
+            return self._driver.execute_script(script)
+        except http.client.RemoteDisconnected:
+            print("ERROR: Disconnected while attempting to run script.")
+            print("WARNING: Handling this by resetting. If this was in the middle of a sample path it's going to mess it up a lot.")
+            self.reset()
+            return self._executeScript(script)
+    
+    def _availableActionsFromState(self, ac_names):
+        observation = self._observationFromState(self._avail_observations)
         acs_avail = []
         for ac_name in ac_names:
             acs_avail.append(float(self.actionAvailable(ac_name, observation)))
         return acs_avail
+
+def create_webdriver(webdriver_name='Chrome', webdriver_path=None, headless=False, virtual_clock=False, chrome_arguments=[]):
+    if webdriver_name == 'Chrome':            
+        chrome_options = chrome.options.Options()
+        if headless:
+            chrome_options.add_argument("--headless")
+        for argument in chrome_arguments:
+            chrome_options.add_argument(argument)
+        driver = webdriver.Chrome(chrome_options=chrome_options)
+    elif webdriver_name == 'PhantomJS':
+        if webdriver_path == None:
+            try:
+                driver = webdriver.PhantomJS()
+            except:
+                raise Exception("Failed to find phantomjs on system. Need to specify webdriver_path=/path/to/phantomjs.")
+        else:
+            driver = webdriver.PhantomJS(webdriver_path)
+        if headless == False:
+            print("WARNING: Specified not headless, but PhantomJS is headless only.")
+    else:
+        raise NotImplementedError("No implementation for webdriver {}.".format(webdriver_name))
+    
+    if virtual_clock:
+        if webdriver_name != 'Chrome':
+            raise NotImplementedError("No virtual clock for webdriver {}.".format(webdriver_name))
+        install_virtual_clock(driver)
+    return driver
+
+def install_virtual_clock(driver):
+    """Add the virtual clock to every new document of driver's current tab.
+    The clock has to be in place before the game's scripts set their timers.
+    """
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": UPGameHandler._virtual_clock_js})
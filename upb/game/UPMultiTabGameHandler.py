@@ -0,0 +1,190 @@
+from upb.game.UPGameHandler import UPGameHandler, create_webdriver, install_virtual_clock
+import numpy as np
+import threading
+import time
+
+class UPMultiTabGameHandler(object):
+    """Several independent games, each in its own tab of a single browser.
+
+    Each game has a UPGameHandler, from game(k), that can be used on its own.
+    The tabs run their games at the same time. stepFused dispatches each
+    game's step to its tab, where it runs once the dispatch returns, and only
+    collects the results once every tab has its step, so the tabs' steps run
+    concurrently. WebDriver drives one tab at a time, though, so dispatching
+    and collecting still take a round trip per tab, one after another. Since
+    elements found in one tab can't be used while another is active, every
+    handler is driven by scripts alone, with all of its modes set to 'js'.
+    """
+    # Keep background tabs running at full speed
+    _chrome_arguments = [
+        "--disable-background-timer-throttling",
+        "--disable-renderer-backgrounding",
+        "--disable-backgrounding-occluded-windows"
+    ]
+    
+    # Run a script once the current one has returned, from a message rather
+    # than a timer, which the virtual clock would hold, and keep its result
+    _dispatch_js = """
+        window.upbDispatched = null;
+        var channel = new MessageChannel();
+        channel.port1.onmessage = function() {
+            try {
+                window.upbDispatched = [true, (function() {%s})()];
+            } catch (e) {
+                window.upbDispatched = [false, String(e)];
+            }
+        };
+        channel.port2.postMessage(0);
+    """
+    
+    # Wait for the dispatched script's result
+    _collect_js = """
+        var done = arguments[arguments.length-1];
+        (function wait() {
+            if (window.upbDispatched != null) {
+                var result = window.upbDispatched;
+                window.upbDispatched = null;
+                done(result);
+            } else {
+                var channel = new MessageChannel();
+                channel.port1.onmessage = wait;
+                channel.port2.postMessage(0);
+            }
+        })();
+    """
+
+    def __init__(self,
+                 url,
+                 n_games,
+                 webdriver_name='Chrome',
+                 webdriver_path=None,
+                 headless=True,
+                 verbose=False,
+                 fast_reset=False,
+                 virtual_clock=False,
+                 time_dilation=None):
+        if webdriver_name != 'Chrome':
+            raise NotImplementedError("No multiple tab games for webdriver {}.".format(webdriver_name))
+        self._n_games = n_games
+        self._driver = create_webdriver(webdriver_name, webdriver_path, headless,
+                                        virtual_clock, self._chrome_arguments)
+        self.virtual_clock = virtual_clock
+        self._time_dilation = time_dilation
+        self._prev_step_time = None
+
+        # Open the tabs, each with the virtual clock if there is one. Tabs 
+        # without an opener can each have a renderer process of their own, 
+        # so their scripts can run in parallel
+        self._window_handles = [self._driver.current_window_handle]
+        for k in range(1, n_games):
+            known_handles = set(self._driver.window_handles)
+            self._driver.execute_script("window.open('about:blank', '_blank', 'noopener');")
+            window_handle = [handle for handle in self._driver.window_handles if handle not in known_handles][0]
+            self._driver.switch_to.window(window_handle)
+            if virtual_clock:
+                install_virtual_clock(self._driver)
+            self._window_handles.append(window_handle)
+        self._current_window_handle = self._window_handles[-1]
+        self._lock = threading.Lock()
+
+        # A handler for each tab
+        self._games = []
+        for k in range(n_games):
+            self._games.append(UPGameHandler(url,
+                                             verbose=verbose,
+                                             state_extraction='js',
+                                             availability='js',
+                                             action_dispatch='js',
+                                             fast_reset=fast_reset,
+                                             virtual_clock=virtual_clock,
+                                             time_dilation=time_dilation,
+                                             driver=UPTabDriver(self, k)))
+
+    @property
+    def n_games(self):
+        return self._n_games
+
+    # "Public" members
+    def reset(self, k):
+        self._games[k].reset()
+
+    def quit(self):
+        self._driver.quit()
+
+    def game(self, k):
+        """The UPGameHandler of the k-th game."""
+        return self._games[k]
+
+    def stepFused(self, action_names, dt_s, fields, ac_names):
+        """Step every game as with UPVecEmulator.stepFused.
+
+        With a virtual clock, each game steps as with UPGameHandler.stepFused.
+        Otherwise, steps are held to one every 2*dt_s of real time, and each
+        game acts and observes straight away as with UPGameHandler.actFused.
+
+        :returns: (observations, acs_avail) -- A list of the observations
+            of each game and an (n_games, len(ac_names)) array of action
+            availability.
+        """
+        observations = []
+        acs_avail = np.zeros((self._n_games, len(ac_names)))
+        if not self.virtual_clock:
+            if self._prev_step_time != None:
+                time_remaining = 2.0*max(dt_s) - (time.monotonic()-self._prev_step_time)
+                if time_remaining > 0:
+                    time.sleep(time_remaining)
+            self._prev_step_time = time.monotonic()
+        
+        # Start every game's step before waiting for any of them
+        for k, game in enumerate(self._games):
+            if self.virtual_clock:
+                game._holdTimeDilation(2.0*dt_s[k])
+                step_js = game._fusedJs(action_names[k], dt_s[k], ac_names)
+            else:
+                step_js = game._fusedJs(action_names[k], None, ac_names)
+            self._driverOf(k).execute_script(self._dispatch_js % step_js)
+        
+        for k, game in enumerate(self._games):
+            succeeded, result = self._driverOf(k).execute_async_script(self._collect_js)
+            if not succeeded:
+                raise Exception("Step failed in game {}: {}".format(k, result))
+            observation, acs_avail[k] = game._finishFused(action_names[k], result, fields)
+            observations.append(observation)
+        return observations, acs_avail
+    
+    def _driverOf(self, k):
+        return self._games[k]._driver
+
+    def _switchTo(self, k):
+        window_handle = self._window_handles[k]
+        if window_handle != self._current_window_handle:
+            self._driver.switch_to.window(window_handle)
+            self._current_window_handle = window_handle
+
+class UPTabDriver(object):
+    """The web driver of a UPMultiTabGameHandler, switched to the k-th tab
+    whenever it's used.
+    """
+    def __init__(self, multi_tab_handler, k):
+        self._multi = multi_tab_handler
+        self._k = k
+
+    def __getattr__(self, name):
+        attr = getattr(self._multi._driver, name)
+        if not callable(attr):
+            return attr
+        
+        # Tabs may be driven from different threads, as by AsyncUPGameHandler,
+        # so switching and calling are done together
+        def call(*args, **kwargs):
+            with self._multi._lock:
+                self._multi._switchTo(self._k)
+                return attr(*args, **kwargs)
+        return call
+
+    def quit(self):
+        # The browser is shared, so is only quit with the multiple tab handler
+        pass
+
+    def stop_client(self):
+        pass
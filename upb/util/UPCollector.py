@@ -0,0 +1,191 @@
+from upb.envs.UPEnv import UPEnv
+import multiprocessing as mp
+import numpy as np
+import time
+
+class UPSharedRingBuffer(object):
+    """A fixed number of step records in shared memory, written by one
+    process and read by another.
+
+    Observations and availabilities are padded to the widest stage, with
+    the stage of each record stored alongside.
+    """
+    _fields = ['ob', 'ac_avail', 'ac', 'rew', 'vpred', 'new', 'stage']
+
+    def __init__(self, capacity, ob_dim, n_actions):
+        self._capacity = capacity
+        self._shapes = {
+            'ob': (capacity, ob_dim),
+            'ac_avail': (capacity, n_actions),
+            'ac': (capacity,),
+            'rew': (capacity,),
+            'vpred': (capacity,),
+            'new': (capacity,),
+            'stage': (capacity,)
+        }
+        self._arrays = {field: mp.RawArray('d', int(np.prod(shape))) for field, shape in self._shapes.items()}
+
+        # Total records written and read
+        self._counts = mp.RawArray('q', 2)
+        self._makeViews()
+
+    def _makeViews(self):
+        self._views = {}
+        for field, shape in self._shapes.items():
+            self._views[field] = np.frombuffer(self._arrays[field], dtype=np.float64).reshape(shape)
+        self._counts_view = np.frombuffer(self._counts, dtype=np.int64)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_views']
+        del state['_counts_view']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._makeViews()
+
+    def write(self, ob, ac_avail, ac, rew, vpred, new, stage, stop_event=None):
+        """Write a record, waiting for the reader if the buffer is full.
+
+        :returns: False if stop_event was set while waiting, True otherwise.
+        """
+        while self.n_available >= self._capacity:
+            if stop_event != None and stop_event.is_set():
+                return False
+            time.sleep(1e-3)
+        i = self._counts_view[0] % self._capacity
+        self._views['ob'][i,:] = 0.0
+        self._views['ob'][i,:len(ob)] = ob
+        self._views['ac_avail'][i,:] = 0.0
+        self._views['ac_avail'][i,:len(ac_avail)] = ac_avail
+        self._views['ac'][i] = ac
+        self._views['rew'][i] = rew
+        self._views['vpred'][i] = vpred
+        self._views['new'][i] = new
+        self._views['stage'][i] = stage
+        self._counts_view[0] += 1
+        return True
+
+    def read(self, n, is_alive=None):
+        """Read the next n records, waiting until they've been written.
+        
+        More records than the capacity are read in chunks as the writer
+        frees up space.
+        
+        :param is_alive: if given, called while waiting and an exception is
+            raised if it returns False.
+        :returns: A dictionary of arrays with n rows each.
+        """
+        chunks = []
+        n_remaining = n
+        while n_remaining > 0:
+            n_chunk = min(n_remaining, self._capacity)
+            while self.n_available < n_chunk:
+                if is_alive != None and not is_alive():
+                    raise Exception("Writer stopped before {} records were written.".format(n))
+                time.sleep(1e-3)
+            start = self._counts_view[1]
+            rows = np.arange(start, start+n_chunk) % self._capacity
+            chunks.append({field: self._views[field][rows].copy() for field in self._fields})
+            self._counts_view[1] += n_chunk
+            n_remaining -= n_chunk
+        return {field: np.concatenate([chunk[field] for chunk in chunks]) for field in self._fields}
+
+    @property
+    def n_available(self):
+        return int(self._counts_view[0] - self._counts_view[1])
+
+def _collector_worker(ring, env_kwargs, agents_fn, resetter_agents_fn, seed, stop_event):
+    """Run episodes with the agents, writing every step to the ring."""
+    np.random.seed(seed)
+    agents = agents_fn()
+    resetter_agents = resetter_agents_fn() if resetter_agents_fn != None else []
+    env = UPEnv(None, use_emulator=True, resetter_agents=resetter_agents, **env_kwargs)
+    env._seed(seed)
+
+    stochastic = True
+    new = True
+    ob = env._reset()
+    ac_avail = env.getAvailableActions()
+    stage_old = env.stage
+    while not stop_event.is_set():
+        stage = env.stage
+
+        # Observe again if stage changed
+        if stage > stage_old:
+            observation_from_handler, ob = env.observe(stage)
+            ac_avail = env.getAvailableActions(stage)
+
+        # Act
+        ac, vpred = agents[stage].act(stochastic, ob, ac_avail)
+        ob_next, rew, done, info = env._step(ac, stage=stage)
+        if not ring.write(ob, ac_avail, ac, rew, vpred, new, stage, stop_event):
+            break
+
+        # Update
+        stage_old = stage
+        ob = ob_next
+        ac_avail = info['Available Actions']
+        new = done
+        if done:
+            ob = env._reset()
+            ac_avail = env.getAvailableActions()
+            stage_old = env.stage
+    env._close()
+
+class UPRolloutCollector(object):
+    """Collects steps from emulated games run by a pool of local processes.
+
+    Each worker owns a UPEnv with an emulator, runs its own copy of the
+    agents and writes every step into its own shared memory ring buffer.
+    Agents are created in the workers by calling agents_fn(), which should
+    return one agent per stage, and resetter_agents_fn() if given, which
+    should return the resetter agents for the initial stage.
+    """
+    def __init__(self,
+                 n_workers,
+                 agents_fn,
+                 resetter_agents_fn=None,
+                 capacity=4096,
+                 seed=0,
+                 **env_kwargs):
+        # Widest observations and actions over the stages an episode can visit
+        final_stage = env_kwargs.get('final_stage', None)
+        if final_stage == None:
+            final_stage = len(UPEnv._observation_names_stages)-1
+        initial_stage = env_kwargs.get('initial_stage', 0)
+        stages = range(initial_stage, final_stage+1)
+        ob_dim = max(len(UPEnv._observation_names_stages[stage]) for stage in stages)
+        n_actions = max(len(UPEnv._action_names_stages[stage]) for stage in stages)
+
+        self._rings = [UPSharedRingBuffer(capacity, ob_dim, n_actions) for k in range(n_workers)]
+        self._stop_event = mp.Event()
+        self._workers = []
+        for k in range(n_workers):
+            worker = mp.Process(target=_collector_worker,
+                                args=(self._rings[k], env_kwargs, agents_fn, resetter_agents_fn, seed+k, self._stop_event))
+            worker.daemon = True
+            self._workers.append(worker)
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+
+    def collect(self, n_steps_per_worker):
+        """Collect the next steps from every worker.
+
+        :returns: A dictionary of arrays with n_workers*n_steps_per_worker
+            rows, holding each worker's steps one worker after another.
+        """
+        batches = [ring.read(n_steps_per_worker, worker.is_alive) for ring, worker in zip(self._rings, self._workers)]
+        return {field: np.concatenate([batch[field] for batch in batches]) for field in UPSharedRingBuffer._fields}
+
+    def stop(self):
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.join()
+
+    @property
+    def n_workers(self):
+        return len(self._workers)
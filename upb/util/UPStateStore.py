@@ -0,0 +1,128 @@
+import numpy as np
+import os
+import zlib
+
+class UPStateStore(object):
+    """An append-only library of saved game states on disk.
+
+    States are stored compressed, one after another, in filename. The index,
+    in filename+".idx", has a fixed size record per state with its offset and
+    length in the data file, along with the stage, game time and clips it was
+    saved at. The index is memory mapped and states are only read when
+    they're loaded, so opening a store costs the same however many states it
+    holds.
+
+    A store should only be appended to by one process at a time, but can be
+    read by any number while that happens.
+    """
+    _index_dtype = np.dtype([
+        ('offset', '<u8'),
+        ('length', '<u4'),
+        ('stage', '<i4'),
+        ('game_time', '<f8'),
+        ('clips', '<f8')
+    ])
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._index_filename = filename+".idx"
+
+        # Create an empty store if there isn't one already
+        for fname in [self._filename, self._index_filename]:
+            if not os.path.exists(fname):
+                open(fname, 'ab').close()
+
+        self._index = None
+        self._index_size = -1
+        self._stage_indices = {}
+
+    @classmethod
+    def isStore(cls, filename):
+        return os.path.exists(filename+".idx")
+
+    def _refreshIndex(self):
+        """Remap the index if states have been appended since it was mapped."""
+        index_size = os.path.getsize(self._index_filename)
+        if index_size == self._index_size:
+            return
+
+        # Ignore any partially written record at the end
+        n_states = index_size//self._index_dtype.itemsize
+        if n_states > 0:
+            self._index = np.memmap(self._index_filename, dtype=self._index_dtype, mode='r', shape=(n_states,))
+        else:
+            self._index = np.zeros(0, dtype=self._index_dtype)
+        self._index_size = index_size
+        self._stage_indices = {}
+
+    def __len__(self):
+        self._refreshIndex()
+        return len(self._index)
+
+    @property
+    def index(self):
+        """The memory mapped index, with fields offset, length, stage,
+        game_time and clips.
+        """
+        self._refreshIndex()
+        return self._index
+
+    def append(self, state_string, stage=-1, game_time=np.nan, clips=np.nan):
+        """Append a state, as from UPEnv.getStateAsString.
+
+        :returns: The index of the state in the store.
+        """
+        blob = zlib.compress(state_string.encode('utf-8'))
+
+        # Write the data before its index record, so that readers never see
+        # a record without its data
+        with open(self._filename, 'ab') as f:
+            offset = f.tell()
+            f.write(blob)
+        record = np.array([(offset, len(blob), stage, game_time, clips)], dtype=self._index_dtype)
+        with open(self._index_filename, 'ab') as f:
+            i = f.tell()//self._index_dtype.itemsize
+            f.write(record.tobytes())
+        return i
+
+    def get(self, i):
+        """The i-th state, as a string for UPEnv.loadStateFromString."""
+        record = self.index[i]
+        with open(self._filename, 'rb') as f:
+            f.seek(int(record['offset']))
+            blob = f.read(int(record['length']))
+        return zlib.decompress(blob).decode('utf-8')
+
+    def indicesForStage(self, stage):
+        self._refreshIndex()
+        if stage not in self._stage_indices:
+            self._stage_indices[stage] = np.flatnonzero(self._index['stage'] == stage)
+        return self._stage_indices[stage]
+
+    def sample(self, rng=np.random, stage=None):
+        """A state chosen uniformly at random, from those saved at the given
+        stage if one is given.
+        """
+        if stage == None:
+            n_states = len(self)
+            if n_states == 0:
+                raise Exception("No states in {}.".format(self._filename))
+            return self.get(rng.randint(n_states))
+
+        indices = self.indicesForStage(stage)
+        if len(indices) == 0:
+            raise Exception("No states for stage {} in {}.".format(stage, self._filename))
+        return self.get(indices[rng.randint(len(indices))])
+
+    @classmethod
+    def fromPickle(cls, pickle_filename, filename, stage=-1):
+        """Create a store holding the states of a pickled list of state
+        strings, as previously written by create_states_batch.
+        """
+        import pickle
+        with open(pickle_filename, 'rb') as f:
+            states = pickle.load(f)
+        store = cls(filename)
+        for state_string in states:
+            store.append(state_string, stage=stage)
+        return store
@@ -1,8 +1,15 @@
 from upb.agents.mlp import load_mlp_agent
+from upb.agents.mlp_numpy import load_mlp_agent_numpy
 from upb.envs.UPEnv import UPEnv, UPObservationSpace, UPActionSpace
 from upb.util.visualise import DecisionRenderer
-import pickle
+from upb.util.UPStateStore import UPStateStore
+from concurrent.futures import ThreadPoolExecutor
+import tensorflow as tf
 import numpy as np
+import multiprocessing as mp
+import asyncio
+import queue
+import time
 
 def rollout(env, agents, render_decision_basename=None, callback=None):
     stochastic = True    
@@ -43,23 +50,249 @@ def rollout(env, agents, render_decision_basename=None, callback=None):
         iter_num += 1
         stage_old = stage
 
-def load_agents(initial_stage, agent_filenames, base_name="agent"):
+async def arollout(env, agents, callback=None):
+    """As rollout, but as a coroutine, so that rollouts of many live games
+    can be run at once with asyncio.gather. The agent acts on a thread of
+    the rollout's own, with the default TensorFlow session of the caller, 
+    while the game waits for its action's deadline and other games run.
+    """
+    stochastic = True
+    loop = asyncio.get_event_loop()
+    executor = ThreadPoolExecutor(max_workers=1)
+    session = tf.get_default_session()
+    
+    def act(agent, ob, ac_avail):
+        if session == None:
+            return agent.act(stochastic, ob, ac_avail)
+        with session.as_default():
+            return agent.act(stochastic, ob, ac_avail)
+    
+    ob = await env.areset()
+    ac_avail = env.getAvailableActions()
+    done = False
+    iter_num = 0
+    stage_old = env.stage
+    while not done:
+        stage = env.stage
+        
+        # Observe again if stage changed
+        if stage > stage_old:
+            observation_from_handler, ob = env.observe(stage)
+            ac_avail = np.array(env.getAvailableActions(stage))
+        agent = agents[stage]
+        
+        # Select action, while waiting for its deadline
+        deadline = asyncio.ensure_future(env.adeadline())
+        ac, vpred = await loop.run_in_executor(executor, act, agent, ob, ac_avail)
+        await deadline
+        if iter_num > 0 and callback != None:
+            callback(iter_num, env, agent, ob, ac_avail, ac, vpred, rew, done, info)
+        
+        # Observe
+        ob, rew, done, info = await env.astep(ac, stage=env.stage, scheduled=True)
+        ac_avail = info['Available Actions']
+        
+        # Update            
+        iter_num += 1
+        stage_old = stage
+    executor.shutdown()
+
+def load_agents(initial_stage, agent_filenames, base_name="agent", engine='tf'):
+    """Load the agents of the first initial_stage stages.
+    
+    :param engine: 'tf' for MLPAgents, or 'numpy' for MLPAgentNumpys that act
+        without a TensorFlow session
+    """
     agents = []
     for i in range(initial_stage):
         agent_filename = agent_filenames[i]
         agent_name = base_name+"_{}".format(i)
-        ob_space = UPObservationSpace(UPEnv._observation_names_stages[i])
-        ac_space = UPActionSpace(UPEnv._action_names_stages[i])        
-        agent = load_mlp_agent(agent_filename, agent_name, ob_space, ac_space)
+        if engine == 'tf':
+            ob_space = UPEnv._observation_spaces_stages[i]
+            ac_space = UPEnv._action_spaces_stages[i]
+            agent = load_mlp_agent(agent_filename, agent_name, ob_space, ac_space)
+        elif engine == 'numpy':
+            agent = load_mlp_agent_numpy(agent_filename, agent_name)
+        else:
+            raise NotImplementedError("No agent engine {}.".format(engine))
         agents.append(agent)
     return agents
     
 def create_states_batch(env, agent, n_init_states, filename):
-    init_states = []
+    """Append the final states of n_init_states rollouts to the state store
+    in filename, creating it if needed.
+    """
+    store = UPStateStore(filename)
     for i in range(n_init_states):
         print("Creating init state {}.".format(i))
         rollout(env, agent)
-        env.save_screenshot("")
-        init_states.append(env.getStateAsString())
-    with open(filename, 'wb') as f:
-        pickle.dump(init_states, f)
+        clips = env._observeFields(['Paperclips'])['Paperclips']
+        store.append(env.getStateAsString(), stage=env.stage, game_time=env._game_time, clips=clips)
+
+def _states_worker(agents_fn, env_kwargs, seed, task_queue, result_queue):
+    """Create a state for each stage taken from task_queue, until None is 
+    taken, putting each state with its metadata on result_queue.
+    """
+    agents = agents_fn()
+    rng = np.random.RandomState(seed)
+    envs = {}
+    while True:
+        stage = task_queue.get()
+        if stage == None:
+            break
+        
+        # One environment per stage, with the agents of earlier stages as 
+        # its resetter agents
+        if stage not in envs:
+            envs[stage] = UPEnv(None,
+                                initial_stage=stage,
+                                resetter_agents=agents[:stage],
+                                use_emulator=True,
+                                episode_length=0,
+                                **env_kwargs)
+            envs[stage]._seed(rng.randint(2**31))
+        env = envs[stage]
+        
+        rollout(env, agents)
+        clips = env._observeFields(['Paperclips'])['Paperclips']
+        result_queue.put((stage, env.getStateAsString(), env._game_time, clips))
+    
+    for env in envs.values():
+        env._close()
+
+def create_states_parallel(n_workers, agents_fn, n_init_states, filename_format, stages, seed=0, **env_kwargs):
+    """Create n_init_states initial states for each stage with a pool of 
+    emulator processes, appending each to the state store for its stage as
+    soon as it's made.
+    
+    States already in the stores count towards n_init_states, so an 
+    interrupted run carries on where it left off when run again.
+    
+    :param agents_fn: called once in each worker to create the agents of 
+        every stage, which are reused for all of that worker's states
+    :param filename_format: state store filename with a {} for the stage
+    """
+    stores = {stage: UPStateStore(filename_format.format(stage)) for stage in stages}
+    n_remaining = {stage: max(n_init_states-len(stores[stage].indicesForStage(stage)), 0) for stage in stages}
+    for stage in stages:
+        print("Stage {}: {} states to create.".format(stage, n_remaining[stage]))
+    n_total = sum(n_remaining.values())
+    if n_total == 0:
+        return
+    
+    # Queue every state to create, then a stop signal for each worker
+    task_queue = mp.Queue()
+    result_queue = mp.Queue()
+    for stage in stages:
+        for i in range(n_remaining[stage]):
+            task_queue.put(stage)
+    for k in range(n_workers):
+        task_queue.put(None)
+    
+    workers = []
+    for k in range(n_workers):
+        worker = mp.Process(target=_states_worker,
+                            args=(agents_fn, env_kwargs, seed+k, task_queue, result_queue))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+    
+    # Write states as they arrive. Stages are created roughly one after 
+    # another, so each stage is timed from the arrival of the state before 
+    # its first.
+    last_time = time.perf_counter()
+    stage_start_times = {}
+    n_created = {stage: 0 for stage in stages}
+    for i in range(n_total):
+        while True:
+            try:
+                stage, state_string, game_time, clips = result_queue.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise Exception("All workers stopped with {} states still to create.".format(n_total-i))
+        stores[stage].append(state_string, stage=stage, game_time=game_time, clips=clips)
+        stage_start_times.setdefault(stage, last_time)
+        last_time = time.perf_counter()
+        n_created[stage] += 1
+        if n_created[stage] == n_remaining[stage]:
+            minutes = (last_time-stage_start_times[stage])/60.0
+            print("Stage {}: created {} states, {:1.3g} states per minute.".format(stage, n_created[stage], n_created[stage]/minutes))
+    
+    for worker in workers:
+        worker.join()
+
+def vec_traj_segment_generator(pi, env, horizon, stochastic):
+    """Batch sampler for a UPVecEnv, in place of the traj_segment_generator 
+    of baselines.ppo1.pposgd_simple.
+    
+    Each game contributes horizon/n_envs consecutive steps, and the segment
+    holds these one game after another with the first step of each game 
+    marked as new. No value is bootstrapped across the join between games, 
+    so each game's steps must be whole episodes, and horizon a multiple of 
+    n_envs*episode_length. The policy acts for all the games at once, with 
+    its actBatch, as MLPAgent.actBatch.
+    """
+    n_envs = env.n_envs
+    steps_per_env = horizon//n_envs
+    if steps_per_env*n_envs != horizon:
+        raise Exception("Horizon ({}) must be a multiple of the number of environments ({}).".format(horizon, n_envs))
+    if env.episode_length == None or steps_per_env % env.episode_length != 0:
+        raise Exception("Steps per environment ({}) must be a multiple of the episode length ({}).".format(steps_per_env, env.episode_length))
+    
+    # Initial values
+    obs = env.reset()
+    acs_avail = env.getAvailableActions()
+    news = np.ones(n_envs, dtype=bool)
+    acs = np.zeros(n_envs, dtype=np.int64)
+    cur_ep_ret = np.zeros(n_envs)
+    cur_ep_len = np.zeros(n_envs, dtype=np.int64)
+    
+    while True:
+        seg_obs = np.zeros((n_envs, steps_per_env)+obs.shape[1:])
+        seg_acs_avail = np.zeros((n_envs, steps_per_env)+acs_avail.shape[1:])
+        seg_rews = np.zeros((n_envs, steps_per_env))
+        seg_vpreds = np.zeros((n_envs, steps_per_env))
+        seg_news = np.zeros((n_envs, steps_per_env), dtype=np.int32)
+        seg_acs = np.zeros((n_envs, steps_per_env), dtype=np.int64)
+        seg_prevacs = np.zeros((n_envs, steps_per_env), dtype=np.int64)
+        ep_rets = []
+        ep_lens = []
+        
+        for t in range(steps_per_env):
+            prevacs = acs.copy()
+            acs, vpreds = pi.actBatch(stochastic, obs, acs_avail)
+            seg_obs[:,t] = obs
+            seg_acs_avail[:,t] = acs_avail
+            seg_vpreds[:,t] = vpreds
+            seg_news[:,t] = news
+            seg_acs[:,t] = acs
+            seg_prevacs[:,t] = prevacs
+            
+            obs, rews, news, info = env.step(acs)
+            acs_avail = info['Available Actions']
+            seg_rews[:,t] = rews
+            
+            cur_ep_ret += rews
+            cur_ep_len += 1
+            for k in np.flatnonzero(news):
+                ep_rets.append(float(cur_ep_ret[k]))
+                ep_lens.append(int(cur_ep_len[k]))
+                cur_ep_ret[k] = 0
+                cur_ep_len[k] = 0
+        
+        # Each game's block is whole episodes, so every game has just
+        # finished one and there's no value to bootstrap
+        _, nextvpreds = pi.actBatch(stochastic, obs[-1:], acs_avail[-1:])
+        nextvpred = nextvpreds[0]
+        
+        yield {"ob": seg_obs.reshape((horizon,)+obs.shape[1:]),
+               "ac_avail": seg_acs_avail.reshape((horizon,)+acs_avail.shape[1:]),
+               "rew": seg_rews.reshape(horizon),
+               "vpred": seg_vpreds.reshape(horizon),
+               "new": seg_news.reshape(horizon),
+               "ac": seg_acs.reshape(horizon),
+               "prevac": seg_prevacs.reshape(horizon),
+               "nextvpred": nextvpred*(1-news[-1]),
+               "ep_rets": ep_rets,
+               "ep_lens": ep_lens}